@@ -1,20 +1,29 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, colorchooser, simpledialog, scrolledtext
-from docx import Document
-from docx.shared import Pt, Inches, RGBColor, Cm # Added Cm
-from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
-from docx.enum.style import WD_STYLE_TYPE
-from docx.oxml.ns import qn
-from docx.oxml.shared import OxmlElement
+import importlib
 import os
-import threading
-import json
-import requests
-import re
+import asyncio
 import configparser
-import time 
+import sqlite3
 
 CONFIG_FILE = "config.ini" # Define config file name as a constant
+AI_JOB = ("ai",) # JobController key of the AI analysis; generation jobs use ("generate", output path)
+
+# Numbered module names are not valid identifiers, so load them through importlib
+doc_spec = importlib.import_module("07_doc_spec")
+docx_engine = importlib.import_module("08_docx_engine")
+deepseek_client = importlib.import_module("11_deepseek_client")
+text_chunker = importlib.import_module("13_text_chunker")
+ai_response_cache = importlib.import_module("14_ai_response_cache")
+heading_detector = importlib.import_module("15_heading_detector")
+section_store = importlib.import_module("17_section_store")
+section_tree = importlib.import_module("18_section_tree")
+log_sink = importlib.import_module("19_log_sink")
+export_queue = importlib.import_module("24_export_queue")
+job_control = importlib.import_module("25_job_control")
+async_deepseek = importlib.import_module("26_async_deepseek")
+rate_limiter = importlib.import_module("27_rate_limiter")
+outline_importers = importlib.import_module("28_outline_importers")
 
 class DocxFormatter:
     def __init__(self, root):
@@ -52,11 +61,19 @@ class DocxFormatter:
         self.toc_title = tk.StringVar(value="目 录") 
         self.filename = tk.StringVar()
         
-        self.document_sections = []
+        self.document_sections = section_store.SectionStore() # 按 id 查找、删除、移动均为 O(1)
+        self.section_tree = section_tree.SectionTree(self.document_sections) # 由级别推导的上下级关系
+        self.tree_update_pending = False
         self.document_title = tk.StringVar(value="公文标题示例") 
         
         self.deepseek_api_key = tk.StringVar()
         self.deepseek_model = tk.StringVar(value="deepseek-chat") 
+        self.ai_stream_mode = tk.BooleanVar(value=True) # 流式接收，边解析边导入
+        self.ai_use_cache = tk.BooleanVar(value=True) # 相同文本（块）直接复用上次的识别结果
+        self.ai_local_first = tk.BooleanVar(value=True) # 编号规范的文本先用本地规则识别
+        self.ai_json_mode = tk.BooleanVar(value=True) # 请求 JSON 输出模式，回复按章节结构校验后直接导入
+        self.ai_stream_imported = 0
+        self.ai_stream_replace = False
         
         self.api_dependencies_status = tk.StringVar(value="未检查") 
         
@@ -64,15 +81,50 @@ class DocxFormatter:
         self.progress_bar = None
         self.color_previews = {}
         self.analyze_button = None 
-
-        self.api_session = requests.Session()
+        self.cancel_analyze_button = None
+        self.generate_button = None
+        self.cancel_generate_button = None
+        # 后台任务：可取消，同一输出路径同时只允许一个生成任务
+        self.closing = False # Set before cancelling jobs on exit; workers then stop calling into Tk
+        self.jobs = job_control.JobController(on_change=lambda key, running: self.call_in_main(self.update_job_buttons))
+
+        # AI 请求都在一个后台事件循环中执行，连接复用、并发数由客户端的信号量限制
+        self.ai_loop = async_deepseek.AsyncLoopThread()
+        self.ai_client = None
+        self.ai_client_settings = None
+        self.ai_max_concurrency = deepseek_client.MAX_CONCURRENT_REQUESTS
+        self.ai_connect_timeout = async_deepseek.DEFAULT_CONNECT_TIMEOUT
+        self.ai_read_timeout = async_deepseek.DEFAULT_READ_TIMEOUT
+        # 发送前的 token 预算；同一 API Key 的所有请求共用一个限流器
+        self.ai_requests_per_minute = rate_limiter.DEFAULT_REQUESTS_PER_MINUTE
+        self.ai_tokens_per_minute = rate_limiter.DEFAULT_TOKENS_PER_MINUTE
+        self.ai_max_chunk_tokens = rate_limiter.DEFAULT_MAX_CHUNK_TOKENS
+        self.ai_max_input_tokens = rate_limiter.DEFAULT_MAX_INPUT_TOKENS
 
         self.add_logo = tk.BooleanVar(value=False)
         self.logo_path = tk.StringVar(value="")
         self.logo_position = tk.StringVar(value="left") 
         self.logo_width_cm = tk.DoubleVar(value=2.5) 
 
+        try:
+            self.ai_cache = ai_response_cache.AIResponseCache(ai_response_cache.DEFAULT_CACHE_FILE)
+        except sqlite3.Error as e:
+            self.ai_cache = None
+            print(f"AI 识别缓存不可用: {e}")
+
+        self.log_sink = log_sink.LogSink() # 各线程只写队列，界面定时批量显示
+        self.timing_file = None # [LOG] timing_file：追加每次生成的分阶段计时 JSON
+        self.log_level = tk.StringVar(value="INFO")
+        self.log_view = None
+
+        # 批量导出任务在进程池中并行生成；主界面正在生成的文件暂不导出，避免两个写入者同时写一个文件
+        self.export_queue = export_queue.ExportQueue(log=self.log, busy=lambda path: self.jobs.is_running(("generate", path)))
+        self.export_dir = tk.StringVar(value=os.getcwd())
+        self.export_status = tk.StringVar(value="队列为空")
+        self.export_view = None
+
         # Load API settings first, then UI settings which might depend on config file structure
+        self.load_log_settings()
         self.load_api_settings() 
         self.load_default_ui_settings() # Load UI defaults after variables are initialized
 
@@ -87,12 +139,43 @@ class DocxFormatter:
             if "DEEPSEEK" in config:
                 self.deepseek_api_key.set(config["DEEPSEEK"].get("api_key", ""))
                 self.deepseek_model.set(config["DEEPSEEK"].get("model", "deepseek-chat"))
+                # Optional connection settings of the async client
+                try:
+                    self.ai_max_concurrency = max(1, config["DEEPSEEK"].getint("max_concurrent_requests", fallback=self.ai_max_concurrency))
+                    self.ai_connect_timeout = config["DEEPSEEK"].getfloat("connect_timeout", fallback=self.ai_connect_timeout)
+                    self.ai_read_timeout = config["DEEPSEEK"].getfloat("read_timeout", fallback=self.ai_read_timeout)
+                    # 0 means no limit
+                    self.ai_requests_per_minute = max(0, config["DEEPSEEK"].getint("requests_per_minute", fallback=self.ai_requests_per_minute))
+                    self.ai_tokens_per_minute = max(0, config["DEEPSEEK"].getint("tokens_per_minute", fallback=self.ai_tokens_per_minute))
+                    self.ai_max_chunk_tokens = max(0, config["DEEPSEEK"].getint("max_chunk_tokens", fallback=self.ai_max_chunk_tokens))
+                    self.ai_max_input_tokens = max(0, config["DEEPSEEK"].getint("max_input_tokens", fallback=self.ai_max_input_tokens))
+                except ValueError as e:
+                    print(f"[DEEPSEEK] 连接设置无效，使用默认值: {e}")
         else: 
             # If config file doesn't exist, it will be created by save_api_settings or save_default_ui_settings
             self.deepseek_api_key.set("") # Ensure variables have initial values
             self.deepseek_model.set("deepseek-chat")
 
 
+    def load_log_settings(self):
+        """从配置文件的 [LOG] 段加载日志级别和可选的日志文件（json_lines = true 时写 JSON Lines）
+
+        timing_file 不为空时，每次生成文档的分阶段计时结果作为一行 JSON 追加到该文件。
+        """
+        config = configparser.ConfigParser()
+        if os.path.exists(CONFIG_FILE):
+            config.read(CONFIG_FILE, encoding='utf-8')
+        if "LOG" in config:
+            section = config["LOG"]
+            self.log_level.set(section.get("level", "INFO").upper())
+            self.log_sink.file_path = section.get("file", "").strip() or None
+            self.log_sink.json_lines = section.getboolean("json_lines", fallback=False)
+            self.timing_file = section.get("timing_file", "").strip() or None
+        self.log_sink.level = self.log_level.get()
+
+    def on_log_level_change(self, event=None):
+        self.log_sink.level = self.log_level.get()
+
     def save_api_settings(self):
         """保存 API Key 和模型选择到配置文件"""
         config = configparser.ConfigParser()
@@ -255,7 +338,7 @@ class DocxFormatter:
             
     def check_and_install_dependencies(self):
         """检查依赖项，并在缺失时提示用户手动安装"""
-        dependencies = [("docx", "python-docx"), ("requests", "requests")]
+        dependencies = [("docx", "python-docx")] # AI requests use the standard-library asyncio client
         missing_dependencies = []
         for import_name, install_name in dependencies:
             try:
@@ -274,7 +357,7 @@ class DocxFormatter:
             self.api_dependencies_status.set(f"缺失依赖: {', '.join(missing_dependencies)}")
             # Delay messagebox to ensure main window is fully up
             self.root.after(100, lambda: messagebox.showwarning("依赖缺失", 
-                                   f"以下依赖包未能加载或缺失，请在激活虚拟环境后，通过 pip 手动安装:\n\n{', '.join(missing_dependencies)}\n\n例如: pip install python-docx requests"))
+                                   f"以下依赖包未能加载或缺失，请在激活虚拟环境后，通过 pip 手动安装:\n\n{', '.join(missing_dependencies)}\n\n例如: pip install python-docx"))
 
     def create_widgets(self):
         notebook = ttk.Notebook(self.root)
@@ -283,6 +366,7 @@ class DocxFormatter:
         
         basic_frame = ttk.Frame(notebook); notebook.add(basic_frame, text="基本设置")
         content_frame = ttk.Frame(notebook); notebook.add(content_frame, text="文档内容")
+        export_frame = ttk.Frame(notebook); notebook.add(export_frame, text="批量导出")
         
         header_footer_frame = ttk.Frame(notebook)
         notebook.add(header_footer_frame, text="页眉与页脚")
@@ -342,6 +426,7 @@ class DocxFormatter:
 
         self.setup_ai_tab(ai_frame)
         self.setup_content_tab(content_frame)
+        self.setup_export_tab(export_frame)
         
         self.create_font_settings(title_settings_frame, 0, "文档标题", self.title_font, self.title_size, self.title_bold, self.title_color_val, "title_color")
         self.create_font_settings(title_settings_frame, 1, "一级标题", self.h1_font, self.h1_size, self.h1_bold, self.h1_color_val, "h1_color")
@@ -356,19 +441,30 @@ class DocxFormatter:
         self.indent_entry = ttk.Entry(indent_frame, textvariable=self.indent_chars_str, width=5) 
         self.indent_entry.pack(side=tk.LEFT, padx=5)
         
+        log_controls = ttk.Frame(log_frame); log_controls.pack(fill=tk.X, padx=10, pady=(10, 0))
+        ttk.Label(log_controls, text="显示级别:").pack(side=tk.LEFT)
+        log_level_combo = ttk.Combobox(log_controls, textvariable=self.log_level, values=list(log_sink.LEVELS), width=10, state="readonly")
+        log_level_combo.pack(side=tk.LEFT, padx=5)
+        log_level_combo.bind("<<ComboboxSelected>>", self.on_log_level_change)
+
         self.log_text_widget = tk.Text(log_frame, height=10, width=80, wrap=tk.WORD) 
         self.log_text_widget.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         self.log_text_widget.config(state=tk.DISABLED)
         scrollbar = ttk.Scrollbar(log_frame, command=self.log_text_widget.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.log_text_widget.config(yscrollcommand=scrollbar.set)
+        self.log_view = log_sink.TextLogView(self.root, self.log_text_widget, self.log_sink)
+        self.log_view.start()
         
         self.progress_bar = ttk.Progressbar(self.root, orient="horizontal", length=980, mode="determinate")
         self.progress_bar.pack(pady=10)
         
         button_frame_main = ttk.Frame(self.root) 
         button_frame_main.pack(fill=tk.X, padx=10, pady=10)
-        ttk.Button(button_frame_main, text="生成文档", command=self.generate_document).pack(side=tk.RIGHT, padx=5)
+        self.cancel_generate_button = ttk.Button(button_frame_main, text="取消生成", command=lambda: self.jobs.cancel_all("generate"), state=tk.DISABLED)
+        self.cancel_generate_button.pack(side=tk.RIGHT, padx=5)
+        self.generate_button = ttk.Button(button_frame_main, text="生成文档", command=self.generate_document)
+        self.generate_button.pack(side=tk.RIGHT, padx=5)
         
         self.init_default_sections()
         self.load_default_ui_settings() # Call again after widgets created to update color previews if they weren't ready
@@ -460,6 +556,7 @@ class DocxFormatter:
         tree_scroll = ttk.Scrollbar(left_frame, orient="vertical", command=self.tree.yview); tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.configure(yscrollcommand=tree_scroll.set)
         self.tree.bind('<<TreeviewSelect>>', self.on_tree_select)
+        self.tree_view = section_tree.LazySectionTreeView(self.tree, self.section_tree)
         
         button_frame_tree = ttk.Frame(left_frame); button_frame_tree.pack(fill=tk.X, padx=5, pady=5)
         ttk.Button(button_frame_tree, text="添加章节", command=self.add_section_dialog).pack(side=tk.LEFT, padx=2)
@@ -467,6 +564,8 @@ class DocxFormatter:
         ttk.Button(button_frame_tree, text="删除章节", command=self.delete_section).pack(side=tk.LEFT, padx=2)
         ttk.Button(button_frame_tree, text="上移", command=lambda: self.move_section(-1)).pack(side=tk.LEFT, padx=2)
         ttk.Button(button_frame_tree, text="下移", command=lambda: self.move_section(1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame_tree, text="全部折叠", command=self.tree_view.collapse).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame_tree, text="导入大纲", command=self.import_outline_file).pack(side=tk.LEFT, padx=2)
         
         ttk.Label(right_frame, text="章节标题:").pack(anchor=tk.W, padx=5, pady=5)
         self.section_title_var = tk.StringVar()
@@ -501,7 +600,7 @@ class DocxFormatter:
         ttk.Radiobutton(dialog, text="三级", variable=level_var, value=3).grid(row=1, column=1, sticky=tk.E)
         def on_confirm():
             title = title_var.get().strip(); level = level_var.get()
-            if title: self.add_section(level, title); dialog.destroy()
+            if title: self.tree_view.reveal(self.add_section(level, title)); dialog.destroy()
             else: messagebox.showwarning("警告", "章节标题不能为空", parent=dialog)
         ttk.Button(dialog, text="确定", command=on_confirm).grid(row=2, column=1, sticky=tk.E, padx=10, pady=10)
         ttk.Button(dialog, text="取消", command=dialog.destroy).grid(row=2, column=0, sticky=tk.W, padx=10, pady=10)
@@ -528,18 +627,31 @@ class DocxFormatter:
         ttk.Button(dialog, text="取消", command=dialog.destroy).grid(row=2, column=0, sticky=tk.W, padx=10, pady=10)
         dialog.wait_window()
     
-    def add_section(self, level, title, content=""):
-        section_id = f"section_{time.time_ns()}_{title.replace(' ','_')}"
-        section = {'id': section_id, 'level': level, 'title': title, 'content': content}
-        self.document_sections.append(section); self.update_tree(); return section['id']
+    def add_section(self, level, title, content="", refresh=True):
+        section = self.document_sections.add(level, title, content)
+        if refresh: self.update_tree()
+        return section.id
+
+    def add_sections(self, items):
+        """批量添加 (level, title, content) 章节，只刷新一次树"""
+        section_ids = [self.add_section(level, title, content, refresh=False) for level, title, content in items]
+        self.update_tree()
+        return section_ids
+
+    def schedule_tree_update(self):
+        """合并短时间内的多次刷新请求（流式导入时每个章节都会触发）"""
+        if self.tree_update_pending: return
+        self.tree_update_pending = True
+        def run():
+            self.tree_update_pending = False
+            self.update_tree()
+        self.root.after_idle(run)
     
     def update_tree(self):
         current_selection = self.tree.selection()
         current_focus = self.tree.focus()
 
-        for item in self.tree.get_children(): self.tree.delete(item)
-        for i, section in enumerate(self.document_sections):
-            self.tree.insert("", tk.END, section['id'], text=str(i+1), values=(section['title'], f"级别{section['level']}"))
+        self.tree_view.refresh() # Only changed rows of expanded levels touch the widget
         
         if current_selection and self.tree.exists(current_selection[0]):
             self.tree.selection_set(current_selection[0])
@@ -548,9 +660,7 @@ class DocxFormatter:
 
 
     def find_section_by_id(self, section_id):
-        for section in self.document_sections:
-            if section['id'] == section_id: return section
-        return None
+        return self.document_sections.get(section_id)
     
     def setup_ai_tab(self, parent):
         ttk.Label(parent, text="粘贴您的文本内容，AI 将自动识别标题结构：").pack(anchor=tk.W, padx=10, pady=5)
@@ -560,137 +670,156 @@ class DocxFormatter:
         self.ai_status_var = tk.StringVar(value="准备就绪")
         status_label = ttk.Label(button_frame_ai, textvariable=self.ai_status_var)
         status_label.pack(side=tk.LEFT, padx=5)
+        self.cancel_analyze_button = ttk.Button(button_frame_ai, text="取消", command=lambda: self.jobs.cancel(AI_JOB), state=tk.DISABLED)
+        self.cancel_analyze_button.pack(side=tk.RIGHT, padx=5)
         self.analyze_button = ttk.Button(button_frame_ai, text="识别标题并导入", command=self.analyze_with_deepseek)
         self.analyze_button.pack(side=tk.RIGHT, padx=5)
+        ttk.Checkbutton(button_frame_ai, text="流式识别（边接收边导入）", variable=self.ai_stream_mode).pack(side=tk.RIGHT, padx=5)
+        ttk.Checkbutton(button_frame_ai, text="JSON 输出模式", variable=self.ai_json_mode).pack(side=tk.RIGHT, padx=5)
+        ttk.Checkbutton(button_frame_ai, text="使用本地缓存", variable=self.ai_use_cache).pack(side=tk.RIGHT, padx=5)
+        ttk.Checkbutton(button_frame_ai, text="优先本地规则识别", variable=self.ai_local_first).pack(side=tk.RIGHT, padx=5)
 
         tip_frame = ttk.LabelFrame(parent, text="使用说明"); tip_frame.pack(fill=tk.X, padx=10, pady=10)
         tips = ("1. 粘贴您的文本内容到上方文本框中\n2. 点击「识别标题并导入」按钮\n3. AI 将分析文本，识别各级标题\n"
                 "4. 识别出的标题结构将自动导入到「文档内容」选项卡中\n5. 您可以在「文档内容」选项卡进一步编辑调整\n\n"
-                "提示：标题识别最适合结构化文档，如学术论文、报告等带有明确章节标题的文本\n\n"
+                "提示：标题识别最适合结构化文档，如学术论文、报告等带有明确章节标题的文本\n"
+                "编号规范的文本（如 一、（一）1. 或 1 / 1.1 / 1.1.1、第X章）会直接在本地识别，无需联网\n\n"
                 "注意：首次使用时需要联网安装必要的依赖包。\n请确保您已经安装了 Python 并设置了正确的 DeepSeek API Key。")
         ttk.Label(tip_frame, text=tips, justify=tk.LEFT).pack(padx=10, pady=10)
     
     def analyze_with_deepseek(self):
-        api_key = self.deepseek_api_key.get()
-        if not api_key: messagebox.showerror("错误", "请先设置 DeepSeek API Key"); return
         text = self.ai_input_text.get(1.0, tk.END).strip()
         if not text: messagebox.showerror("错误", "请输入要分析的文本"); return
+
+        if self.ai_local_first.get():
+            result = heading_detector.detect_sections(text)
+            if result.confident:
+                self.log(f"本地规则识别成功（{result.summary()}），无需调用 DeepSeek API")
+                self.import_ai_sections(result.sections)
+                return
+            self.log(f"本地规则识别置信度不足（{result.summary()}），改用 DeepSeek 分析")
+
+        api_key = self.deepseek_api_key.get()
+        if not api_key: messagebox.showerror("错误", "请先设置 DeepSeek API Key"); return
         
         if self.api_dependencies_status.get().startswith("缺失依赖"):
             messagebox.showwarning("依赖缺失", f"AI 功能所需依赖包缺失或检查失败: {self.api_dependencies_status.get().split(': ')[1]}\n请先确保依赖已正确安装。")
             return
         
+        if self.jobs.is_running(AI_JOB): return # The button is disabled while running; guards a queued double click
+
+        try: # Oversize input is rejected here, before anything is sent
+            chunks = rate_limiter.plan_chunks(text, self.ai_max_chunk_tokens, self.ai_max_input_tokens)
+        except rate_limiter.InputTooLargeError as e:
+            self.handle_ai_error(str(e)); return
+
+        if self.ai_stream_mode.get():
+            # 流式模式下章节会陆续导入，因此需在请求开始前确认是否替换现有内容
+            self.ai_stream_replace = False
+            if self.document_sections:
+                if not messagebox.askyesno("确认", "是否清空现有文档内容，并导入AI识别的章节？"):
+                    self.ai_status_var.set("导入已取消"); return
+                self.ai_stream_replace = True
+            self.ai_stream_imported = 0
+            worker = self.run_deepseek_stream_analysis
+        else:
+            worker = self.run_deepseek_analysis
+
+        # Tk variables are read here on the main thread; the worker and the event loop only see this snapshot
+        options = {"api_key": api_key, "model": self.deepseek_model.get(), "json_mode": self.ai_json_mode.get(),
+                   "use_cache": self.ai_use_cache.get()}
         self.ai_status_var.set("正在分析中...") 
-        if self.analyze_button: self.analyze_button.config(state=tk.DISABLED) 
-        self.root.update_idletasks() 
-        threading.Thread(target=self.run_deepseek_analysis, args=(text,), daemon=True).start()
+        self.jobs.start(AI_JOB, worker, chunks, options)
+        self.update_job_buttons()
+
+    def update_job_buttons(self):
+        """按后台任务的运行状态启用/禁用生成、分析及对应的取消按钮（主线程调用）"""
+        if not self.root.winfo_exists(): return
+        generating = bool(self.jobs.running_keys("generate"))
+        analyzing = self.jobs.is_running(AI_JOB)
+        for button, enabled in ((self.generate_button, not generating), (self.cancel_generate_button, generating),
+                                (self.analyze_button, not analyzing), (self.cancel_analyze_button, analyzing)):
+            if button: button.config(state=tk.NORMAL if enabled else tk.DISABLED)
+
+    def on_ai_cancelled(self):
+        self.ai_status_var.set("分析已取消")
+        self.log("AI 分析已取消")
     
-    def run_deepseek_analysis(self, text):
+    def get_ai_client(self, api_key):
+        """返回异步 DeepSeek 客户端；API Key 与连接设置不变时复用同一个（保持连接池）"""
+        settings = (api_key, self.ai_max_concurrency, self.ai_connect_timeout, self.ai_read_timeout,
+                    self.ai_requests_per_minute, self.ai_tokens_per_minute)
+        if self.ai_client is None or self.ai_client_settings != settings:
+            if self.ai_client is not None:
+                self.ai_loop.call_soon(self.ai_client.close)
+            self.ai_client = async_deepseek.AsyncDeepSeekClient(settings[0], max_concurrency=settings[1], connect_timeout=settings[2],
+                                                                read_timeout=settings[3], log=self.log,
+                                                                limiter=rate_limiter.limiter_for(settings[0], settings[4], settings[5]))
+            self.ai_client_settings = settings
+        return self.ai_client
+
+    def run_deepseek_analysis(self, cancel, chunks, options):
         self.log("run_deepseek_analysis: 线程开始")
-        api_key = self.deepseek_api_key.get()
-        selected_model = self.deepseek_model.get() 
-        self.log(f"run_deepseek_analysis: 使用模型: {selected_model}")
-
-        api_url = "https://api.deepseek.com/chat/completions"
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-        system_message_content = "你是一个专业的文本分析助手，负责识别文本中的标题结构，并严格按照用户指定的JSON格式返回结果。"
-        user_prompt_content = f"""
-请分析以下文本，识别其中的标题结构。将结果按如下JSON格式返回：
-```json
-[
-    {{"level": 1, "title": "一级标题1", "content": "一级标题1下的正文内容"}},
-    {{"level": 2, "title": "二级标题1.1", "content": "二级标题1.1下的正文内容"}},
-    {{"level": 1, "title": "一级标题2", "content": "一级标题2下的正文内容"}},
-    ...
-]
-```
-规则：
-1. level 表示标题级别，1为一级标题，2为二级标题，3为三级标题。
-2. 识别标题时考虑格式特征，如数字编号（例如 1. 第一个, 1.1 小节, (一) 部分, A. 点）, 字体大小, 缩进等。
-3. content 是标题下的正文内容，直到下一个同级或更高级别的标题出现之前的所有文本。如果标题下直接是子标题，则其 content 可以为空字符串。
-4. 仅返回JSON格式，不要有其他解释文字或Markdown标记之外的内容。
-5. 确保JSON是有效的，所有字符串都用双引号括起来。
-以下是要分析的文本：
-{text}
-"""
-        data = {"model": selected_model, "messages": [{"role": "system", "content": system_message_content}, {"role": "user", "content": user_prompt_content}]}
-        
-        max_retries = 3; backoff_factor = 0.5; request_timeout = 120 
-        final_error_message = "AI分析失败，请检查网络连接和API Key。"
-
-        for attempt in range(max_retries):
-            self.log(f"run_deepseek_analysis: 尝试 {attempt + 1}/{max_retries} - 开始请求模型 {selected_model}")
-            try:
-                response = self.api_session.post(api_url, headers=headers, json=data, timeout=request_timeout)
-                self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - 收到响应，状态码: {response.status_code}")
-
-                if response.status_code == 200:
-                    result = response.json()
-                    if not result.get('choices') or not result['choices'][0].get('message') or not result['choices'][0]['message'].get('content'):
-                        self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - API响应结构错误: {result}")
-                        final_error_message = "AI未能生成有效响应内容或响应结构错误。"
-                        if attempt == max_retries - 1: self.root.after(0, lambda msg=final_error_message: self.handle_ai_error(msg))
-                        raise requests.exceptions.RequestException("API响应结构错误")
-
-                    text_response = result['choices'][0]['message']['content']
-                    if not text_response.strip():
-                        self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - API返回空content")
-                        final_error_message = "AI未能生成响应或响应为空。"
-                        if attempt == max_retries - 1: self.root.after(0, lambda msg=final_error_message: self.handle_ai_error(msg))
-                        raise requests.exceptions.RequestException("API返回空内容")
-
-                    self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - 收到有效响应内容")
-                    json_match = re.search(r'```json\s*([\s\S]*?)\s*```', text_response, re.DOTALL)
-                    json_str = json_match.group(1).strip() if json_match else text_response.strip()
-                    
-                    try:
-                        sections = json.loads(json_str)
-                        self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - JSON解析成功，识别到 {len(sections)} 个章节。")
-                        self.root.after(0, self.import_ai_sections, sections) 
-                        return 
-                    except json.JSONDecodeError as json_e:
-                        self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - JSON解析错误: {json_e}. 内容: {json_str[:300]}...")
-                        final_error_message = f"AI返回的JSON格式无效: {json_e}"
-                        if attempt == max_retries - 1: self.root.after(0, lambda msg=final_error_message: self.handle_ai_error(msg))
-                        raise requests.exceptions.RequestException("JSON解析错误")
-                
-                elif response.status_code >= 500: 
-                    self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - API服务器错误 {response.status_code}: {response.text[:200]}")
-                    final_error_message = f"AI请求失败(服务器错误)，错误码：{response.status_code}"
-                    if attempt == max_retries - 1: self.root.after(0, lambda r=response, msg=final_error_message: self.handle_ai_error(f"{msg}\n详情: {r.text[:200]}..."))
-                
-                else: 
-                    self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - API客户端错误 {response.status_code}: {response.text[:200]}")
-                    error_detail = ""
-                    try:
-                        error_json = response.json()
-                        error_detail = error_json.get("error", {}).get("message", response.text[:200])
-                    except json.JSONDecodeError:
-                        error_detail = response.text[:200]
-                    final_error_message = f"AI请求失败(客户端错误)，错误码：{response.status_code}"
-                    self.root.after(0, lambda msg=final_error_message, detail=error_detail: self.handle_ai_error(f"{msg}\n详情: {detail}"))
-                    return 
-
-            except requests.exceptions.Timeout as timeout_e:
-                self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - 请求超时: {str(timeout_e)}")
-                final_error_message = f"网络请求超时: {str(timeout_e)}"
-                if attempt == max_retries - 1: self.root.after(0, lambda msg=final_error_message: self.handle_ai_error(msg))
-            except requests.exceptions.RequestException as req_e: 
-                self.log(f"run_deepseek_analysis: 尝试 {attempt + 1} - 网络或请求错误: {str(req_e)}")
-                final_error_message = f"网络或请求错误: {str(req_e)}"
-                if attempt == max_retries - 1: self.root.after(0, lambda msg=final_error_message: self.handle_ai_error(msg))
-            
-            if attempt < max_retries - 1:
-                wait_time = backoff_factor * (2 ** attempt)
-                self.log(f"run_deepseek_analysis: 等待 {wait_time:.2f} 秒后重试...")
-                time.sleep(wait_time)
-            elif attempt == max_retries -1: 
-                self.log(f"run_deepseek_analysis: 所有 {max_retries} 次尝试均失败。最终错误: {final_error_message}")
-        
+        client = self.get_ai_client(options["api_key"])
+        cache = self.ai_cache if options["use_cache"] else None
+        try:
+            if len(chunks) == 1:
+                sections = self.ai_loop.run(self.request_ai_sections(client, options, chunks[0], cache), cancel)
+            else:
+                self.log(f"run_deepseek_analysis: 文本较长，已切分为 {len(chunks)} 块并发分析")
+                self.call_in_main(self.ai_status_var.set, f"正在并发分析 {len(chunks)} 个文本块...")
+                sections = self.ai_loop.run(self.request_chunked_ai_sections(client, options, chunks, cache), cancel)
+            cancel.check() # Do not import results the user no longer wants
+            self.call_in_main(self.import_ai_sections, sections)
+        except deepseek_client.AIAnalysisError as e:
+            self.call_in_main(self.handle_ai_error, str(e))
+        except job_control.Cancelled:
+            self.call_in_main(self.on_ai_cancelled)
         self.log("run_deepseek_analysis: 线程结束")
-        if self.analyze_button and self.analyze_button.cget('state') == tk.DISABLED:
-             self.root.after(0, lambda: self.analyze_button.config(state=tk.NORMAL))
 
+    async def request_chunked_ai_sections(self, client, options, chunks, cache):
+        """在事件循环中并发识别各文本块（并发数由客户端的信号量限制），按原文顺序拼接并去重"""
+        tasks = [asyncio.ensure_future(self.request_ai_sections(client, options, chunk, cache, f"块 {i+1}/{len(chunks)}"))
+                 for i, chunk in enumerate(chunks)]
+        try:
+            for done, future in enumerate(asyncio.as_completed(tasks), 1):
+                await future
+                self.call_in_main(self.ai_status_var.set, f"已完成 {done}/{len(chunks)} 个文本块")
+        except BaseException: # A failed chunk or a cancellation stops the others
+            for task in tasks: task.cancel()
+            raise
+        merged = text_chunker.merge_chunk_sections([task.result() for task in tasks])
+        self.log(f"run_deepseek_analysis: 分块结果已合并，共 {len(merged)} 个章节")
+        return merged
+
+    async def request_ai_sections(self, client, options, text, cache, label=""):
+        """非流式识别一段文本（先查本地缓存），返回章节列表；失败时抛出 AIAnalysisError"""
+        tag = f"run_deepseek_analysis[{label}]" if label else "run_deepseek_analysis"
+        model = options["model"]
+        self.log(f"{tag}: 使用模型: {model}")
+        if cache:
+            cached_sections = await asyncio.to_thread(self.read_ai_cache, cache, model, text, tag)
+            if cached_sections is not None:
+                return cached_sections
+        sections, complete = await client.analyze(model, text, tag, json_mode=options["json_mode"])
+        if cache and complete: # Sections recovered from a defective reply are not cached
+            await asyncio.to_thread(self.write_ai_cache, cache, model, text, sections, tag)
+        return sections
+
+    def read_ai_cache(self, cache, model, text, tag):
+        try:
+            cached_sections = cache.get(model, deepseek_client.PROMPT_VERSION, text)
+        except sqlite3.Error as e:
+            self.log(f"{tag}: 读取缓存失败: {e}"); return None
+        if cached_sections is not None:
+            self.log(f"{tag}: 命中本地缓存，直接使用 {len(cached_sections)} 个章节")
+        return cached_sections
+
+    def write_ai_cache(self, cache, model, text, sections, tag):
+        try:
+            cache.put(model, deepseek_client.PROMPT_VERSION, text, sections)
+        except sqlite3.Error as e:
+            self.log(f"{tag}: 写入缓存失败: {e}")
 
     def import_ai_sections(self, sections_data):
         try:
@@ -699,62 +828,151 @@ class DocxFormatter:
             
             if self.document_sections:
                 if messagebox.askyesno("确认", "是否清空现有文档内容，并导入AI识别的章节？"):
-                    self.document_sections = []; self.current_section_id = None
+                    self.document_sections.clear(); self.current_section_id = None
                     self.section_title_var.set(""); self.section_content_text.delete(1.0, tk.END)
                 else:
                     self.ai_status_var.set("导入已取消")
-                    if self.analyze_button: self.analyze_button.config(state=tk.NORMAL)
                     return
 
-            imported_count = 0
+            items = []
             for section_item in sections_data:
-                if not isinstance(section_item, dict): 
-                    self.log(f"跳过无效的章节项目 (非字典): {section_item}"); continue
-                title = section_item.get('title', f'未命名标题 {imported_count+1}')
-                level = section_item.get('level')
-                content = section_item.get('content', '')
-
-                if not title or level is None:
-                    self.log(f"跳过无效的章节项目 (缺少标题或级别): {section_item}"); continue
-                try:
-                    level = int(level)
-                    if not (1 <= level <= 3):
-                        self.log(f"跳过无效的章节项目 (级别超出范围1-3): {section_item}"); continue
-                except ValueError:
-                    self.log(f"跳过无效的章节项目 (级别非整数): {section_item}"); continue
-                
-                self.add_section(level=level, title=title, content=content)
-                imported_count +=1
-            
-            self.update_tree()
-            
-            try: # Find the "文档内容" tab by its text attribute
-                target_tab_text = "文档内容"
-                target_tab_index = -1
-                for i, tab_id in enumerate(self.notebook.tabs()):
-                    if self.notebook.tab(tab_id, "text") == target_tab_text:
-                        target_tab_index = i
-                        break
-                if target_tab_index != -1:
-                    self.notebook.select(target_tab_index)
-                else:
-                    self.log(f"无法找到名为 '{target_tab_text}' 的标签页。")
-            except Exception as e:
-                self.log(f"切换到文档内容标签页时出错: {e}")
-
+                normalized = self.normalize_ai_section(section_item, len(items))
+                if normalized: items.append(normalized)
+            self.add_sections(items)
+            imported_count = len(items)
+            self.select_content_tab()
 
             self.ai_status_var.set(f"成功导入 {imported_count} 个章节")
             messagebox.showinfo("成功", f"已成功识别并导入 {imported_count} 个章节")
         except Exception as e: 
             self.handle_ai_error(f"导入章节时出错: {str(e)}\n原始数据: {str(sections_data)[:200]}...")
         finally: 
-            if self.analyze_button: self.analyze_button.config(state=tk.NORMAL)
+            self.update_job_buttons() # Re-enabled by the job's on_change once it has really finished
     
+    def normalize_ai_section(self, section_item, imported_count):
+        """校验 AI 返回的单个章节，返回 (level, title, content)；无效时记录日志并返回 None"""
+        if not isinstance(section_item, dict): 
+            self.log(f"跳过无效的章节项目 (非字典): {section_item}"); return None
+        title = section_item.get('title', f'未命名标题 {imported_count+1}')
+        level = section_item.get('level')
+        content = section_item.get('content', '')
+
+        if not title or level is None:
+            self.log(f"跳过无效的章节项目 (缺少标题或级别): {section_item}"); return None
+        try:
+            level = int(level)
+            if not (1 <= level <= 3):
+                self.log(f"跳过无效的章节项目 (级别超出范围1-3): {section_item}"); return None
+        except ValueError:
+            self.log(f"跳过无效的章节项目 (级别非整数): {section_item}"); return None
+        return level, title, content
+
+    def select_content_tab(self):
+        try: # Find the "文档内容" tab by its text attribute
+            target_tab_text = "文档内容"
+            target_tab_index = -1
+            for i, tab_id in enumerate(self.notebook.tabs()):
+                if self.notebook.tab(tab_id, "text") == target_tab_text:
+                    target_tab_index = i
+                    break
+            if target_tab_index != -1:
+                self.notebook.select(target_tab_index)
+            else:
+                self.log(f"无法找到名为 '{target_tab_text}' 的标签页。")
+        except Exception as e:
+            self.log(f"切换到文档内容标签页时出错: {e}")
+
+    def run_deepseek_stream_analysis(self, cancel, chunks, options):
+        """流式分析：长文本按块在事件循环中并发请求，各块中每个章节对象一闭合就按原文顺序导入"""
+        self.log("run_deepseek_stream_analysis: 线程开始")
+        if len(chunks) > 1:
+            self.log(f"run_deepseek_stream_analysis: 文本较长，已切分为 {len(chunks)} 块并发分析")
+        stitcher = text_chunker.SectionStitcher(len(chunks), lambda item: self.call_in_main(self.import_ai_section_item, item))
+        totals = {"tokens": 0, "sections": 0}
+        client = self.get_ai_client(options["api_key"])
+        cache = self.ai_cache if options["use_cache"] else None
+
+        def on_progress(new_tokens, new_sections): # Called on the event loop thread only
+            totals["tokens"] += new_tokens; totals["sections"] += new_sections
+            self.call_in_main(self.ai_status_var.set, f"正在接收... 已收到 {totals['tokens']} 个 token，{totals['sections']} 个章节")
+
+        async def stream_chunk(index):
+            label = f"块 {index+1}/{len(chunks)}" if len(chunks) > 1 else ""
+            try:
+                await self.stream_ai_sections(client, options, chunks[index], cache, lambda item: stitcher.add(index, item), on_progress, label)
+            finally:
+                stitcher.finish_chunk(index) # Release later chunks even if this one failed
+
+        async def stream_all():
+            results = await asyncio.gather(*(stream_chunk(i) for i in range(len(chunks))), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException) and not isinstance(result, deepseek_client.AIAnalysisError):
+                    raise result
+            return [str(result) for result in results if isinstance(result, deepseek_client.AIAnalysisError)]
+
+        cancelled = False
+        try:
+            errors = self.ai_loop.run(stream_all(), cancel)
+        except job_control.Cancelled:
+            errors, cancelled = [], True
+
+        if stitcher.duplicates:
+            self.log(f"run_deepseek_stream_analysis: 已去除分块重叠产生的 {stitcher.duplicates} 个重复章节")
+        self.log("run_deepseek_stream_analysis: 线程结束")
+        self.call_in_main(self.finish_ai_stream_import, "\n".join(errors) or None, cancelled)
+
+    async def stream_ai_sections(self, client, options, text, cache, on_section, on_progress, label=""):
+        """流式识别一段文本（先查本地缓存），每解析出一个章节调用 on_section；失败时抛出 AIAnalysisError"""
+        tag = f"run_deepseek_stream_analysis[{label}]" if label else "run_deepseek_stream_analysis"
+        model = options["model"]
+        self.log(f"{tag}: 使用模型: {model}")
+        if cache:
+            cached_sections = await asyncio.to_thread(self.read_ai_cache, cache, model, text, tag)
+            if cached_sections is not None:
+                for section_item in cached_sections: on_section(section_item)
+                on_progress(0, len(cached_sections))
+                return len(cached_sections)
+
+        sections, complete = await client.stream_sections(model, text, on_section, on_progress, tag, json_mode=options["json_mode"])
+        if cache and complete: # Only cache complete, cleanly parsed arrays
+            await asyncio.to_thread(self.write_ai_cache, cache, model, text, sections, tag)
+        return len(sections)
+
+    def import_ai_section_item(self, section_item):
+        """流式模式下导入单个章节（在主线程中调用）"""
+        normalized = self.normalize_ai_section(section_item, self.ai_stream_imported)
+        if not normalized: return
+        if self.ai_stream_imported == 0:
+            if self.ai_stream_replace: # Replace existing content only once the first valid section has arrived
+                self.document_sections.clear(); self.current_section_id = None
+                self.section_title_var.set(""); self.section_content_text.delete(1.0, tk.END)
+            self.select_content_tab()
+        level, title, content = normalized
+        self.add_section(level=level, title=title, content=content, refresh=False)
+        self.schedule_tree_update()
+        self.ai_stream_imported += 1
+
+    def finish_ai_stream_import(self, error_msg, cancelled=False):
+        self.update_job_buttons()
+        if cancelled:
+            self.log(f"AI 分析已取消，已导入 {self.ai_stream_imported} 个章节")
+            self.ai_status_var.set(f"分析已取消（已导入 {self.ai_stream_imported} 个章节）")
+            return
+        if error_msg and not self.ai_stream_imported:
+            self.handle_ai_error(error_msg); return
+        if error_msg:
+            self.log(f"AI错误: {error_msg}", level="ERROR")
+            self.ai_status_var.set(f"已导入 {self.ai_stream_imported} 个章节（传输中断）")
+            messagebox.showwarning("部分导入", f"{error_msg}\n\n已导入 {self.ai_stream_imported} 个章节。")
+        else:
+            self.ai_status_var.set(f"成功导入 {self.ai_stream_imported} 个章节")
+            messagebox.showinfo("成功", f"已成功识别并导入 {self.ai_stream_imported} 个章节")
+
     def handle_ai_error(self, error_msg):
         self.ai_status_var.set("发生错误")
-        self.log(f"AI错误: {error_msg}") 
+        self.log(f"AI错误: {error_msg}", level="ERROR")
         messagebox.showerror("AI 分析错误", error_msg)
-        if self.analyze_button: self.analyze_button.config(state=tk.NORMAL) 
+        self.update_job_buttons()
             
     def on_tree_select(self, event):
         selected_items = self.tree.selection()
@@ -785,23 +1003,42 @@ class DocxFormatter:
         if not selected: messagebox.showinfo("提示", "请先选择要删除的章节"); return
         section_id = selected[0]
         section_to_delete = self.find_section_by_id(section_id)
-        if messagebox.askyesno("确认", f"确定要删除章节 '{section_to_delete['title'] if section_to_delete else ''}' 吗？"):
-            self.document_sections = [s for s in self.document_sections if s['id'] != section_id]
+        if not section_to_delete: return
+        subsection_count = len(self.section_tree.subtree(section_id)) - 1
+        prompt = f"确定要删除章节 '{section_to_delete['title']}'" + (f" 及其 {subsection_count} 个下级章节吗？" if subsection_count else " 吗？")
+        if messagebox.askyesno("确认", prompt):
+            removed_ids = self.section_tree.delete_subtree(section_id)
             self.update_tree()
-            if self.current_section_id == section_id:
+            if self.current_section_id in removed_ids:
                 self.current_section_id = None; self.section_title_var.set(""); self.section_level_var.set(1); self.section_content_text.delete(1.0, tk.END)
     
+    def import_outline_file(self):
+        """从 Markdown、编号纯文本或已有 .docx 文件导入章节结构（不调用 AI）"""
+        path = filedialog.askopenfilename(title="选择大纲文件", filetypes=[("大纲文件", "*.md *.markdown *.txt *.docx"), ("所有文件", "*.*")])
+        if not path: return
+        if self.document_sections and not messagebox.askyesno("确认", "是否清空现有文档内容，并导入大纲文件中的章节？"):
+            return
+        stats = outline_importers.ImportStats()
+        try:
+            records = list(outline_importers.iter_outline_file(path, stats))
+        except (OSError, ValueError) as e:
+            messagebox.showerror("导入失败", f"无法读取大纲文件: {e}")
+            return
+        if not records:
+            messagebox.showinfo("提示", "文件中没有可导入的内容"); return
+        self.document_sections.clear(); self.current_section_id = None
+        self.section_title_var.set(""); self.section_content_text.delete(1.0, tk.END)
+        self.add_sections((record['level'], record['title'], record['content']) for record in records)
+        if stats.title: self.document_title.set(stats.title)
+        self.log(f"已从 {os.path.basename(path)} 导入 {len(records)} 个章节（{stats.summary()}）")
+        messagebox.showinfo("成功", f"已导入 {len(records)} 个章节")
+
     def move_section(self, direction):
         selected = self.tree.selection()
         if not selected: messagebox.showinfo("提示", "请先选择要移动的章节"); return
         section_id = selected[0]
-        for i, section_item in enumerate(self.document_sections):
-            if section_item['id'] == section_id:
-                new_pos = i + direction
-                if 0 <= new_pos < len(self.document_sections):
-                    self.document_sections[i], self.document_sections[new_pos] = self.document_sections[new_pos], self.document_sections[i]
-                    self.update_tree(); self.tree.selection_set(section_id); self.tree.focus(section_id)
-                break
+        if section_id in self.document_sections and self.section_tree.move_subtree(section_id, direction): # Subsections move along
+            self.update_tree(); self.tree.selection_set(section_id); self.tree.focus(section_id)
     
     def create_font_settings(self, parent, r_idx, lbl_txt, fnt_var, sz_var, bld_var, clr_tk_var, clr_key):
         frame = ttk.LabelFrame(parent, text=lbl_txt); frame.grid(row=r_idx, column=0, columnspan=3, sticky="ew", padx=10, pady=10)
@@ -836,41 +1073,44 @@ class DocxFormatter:
                 self.color_previews[color_key_name].config(bg=chosen_color[1])
             else: self.log(f"警告：未找到颜色预览 {color_key_name}")
     
-    def log(self, message):
-        if hasattr(self, 'log_text_widget') and self.log_text_widget:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-            
-            def _log(): # Use root.after to ensure thread safety for UI updates
-                self.log_text_widget.config(state=tk.NORMAL)
-                self.log_text_widget.insert(tk.END, f"[{timestamp}] {message}\n")
-                self.log_text_widget.see(tk.END)
-                self.log_text_widget.config(state=tk.DISABLED)
-            
-            if self.root.winfo_exists(): # Check if root window still exists
-                 self.root.after(0, _log)
-        else: print(f"LOG (widget not ready or root destroyed): {message}")
+    def log(self, message, level=None):
+        """可在任意线程调用；消息进入队列，由 log_view 定时批量写入日志控件"""
+        self.log_sink.emit(message, level)
     
+    def call_in_main(self, callback, *args):
+        """可在任意线程调用：把 callback 交给主线程执行；窗口正在关闭时直接丢弃"""
+        if self.closing: return
+        try:
+            self.root.after(0, callback, *args)
+        except (RuntimeError, tk.TclError):
+            pass # The main loop has already stopped
+
     def update_progress(self, value):
-        if self.progress_bar and self.root.winfo_exists(): 
-            self.root.after(0, lambda: self.progress_bar.config(value=value))
+        if self.progress_bar:
+            self.call_in_main(lambda: self.progress_bar.config(value=value))
 
-    def generate_document(self):
+    def validate_generation_inputs(self):
+        """检查文件名、章节和 Logo 设置，有问题时弹出提示并返回 False"""
         self.save_current_section() 
-        if not self.filename.get(): messagebox.showerror("错误", "请输入文件名称"); return
-        if not self.document_sections: messagebox.showerror("错误", "文档内容为空，请至少添加一个章节"); return
+        if not self.filename.get(): messagebox.showerror("错误", "请输入文件名称"); return False
+        if not self.document_sections: messagebox.showerror("错误", "文档内容为空，请至少添加一个章节"); return False
         
         if self.add_logo.get():
             try:
                 width = float(self.logo_width_cm.get())
                 if width <= 0:
                     messagebox.showerror("错误", "Logo 宽度必须为正数。")
-                    return
-            except ValueError:
+                    return False
+            except (ValueError, tk.TclError):
                 messagebox.showerror("错误", "Logo 宽度必须是一个有效的数字。")
-                return
+                return False
             if not self.logo_path.get() or not os.path.exists(self.logo_path.get()):
                  messagebox.showerror("错误", "请选择一个有效的 Logo 图片路径。")
-                 return
+                 return False
+        return True
+
+    def generate_document(self):
+        if not self.validate_generation_inputs(): return
 
         # Prompt for save directory in the main thread before starting the generation thread
         save_dir = filedialog.askdirectory(title="选择保存文档的文件夹")
@@ -880,311 +1120,154 @@ class DocxFormatter:
             return
             
         doc_path = os.path.join(save_dir, f"{self.filename.get().strip()}.docx")
-        
-        # Disable generate button during generation
-        # Assuming self.generate_button is the main generate button
-        # You might need to find it or pass it if it's not a direct attribute
-        # For now, let's assume there's a way to disable it.
-        # Example: if hasattr(self, 'main_generate_button'): self.main_generate_button.config(state=tk.DISABLED)
-
-        threading.Thread(target=self.generate_document_thread, args=(doc_path,), daemon=True).start()
-    
-    def apply_header_settings(self, document):
-        if not self.add_logo.get() or not self.logo_path.get():
-            self.log("未选择添加 Logo 或未指定 Logo 图片路径，跳过页眉 Logo 设置。")
-            return
-
-        logo_path_str = self.logo_path.get()
-        if not os.path.exists(logo_path_str):
-            self.log(f"Logo 图片路径无效: {logo_path_str}")
+        job_key = ("generate", os.path.abspath(doc_path))
+        if self.jobs.is_running(job_key) or self.export_queue.is_busy(doc_path):
+            messagebox.showwarning("提示", f"该文件正在生成中，请等待完成或先取消:\n{doc_path}")
             return
-
-        self.log(f"开始添加 Logo 到页眉: {logo_path_str}")
-        position = self.logo_position.get()
-        try:
-            width_cm_val = float(self.logo_width_cm.get())
-            if width_cm_val <=0:
-                self.log(f"Logo 宽度无效 ({width_cm_val}cm)，将使用默认宽度 2.5cm。")
-                width_cm_val = 2.5
-        except ValueError:
-            self.log(f"Logo 宽度值无效，将使用默认宽度 2.5cm。")
-            width_cm_val = 2.5
-
-
-        for section in document.sections:
-            header = section.header
-            
-            while header.paragraphs:
-                p_to_remove = header.paragraphs[0]
-                header._element.remove(p_to_remove._element)
-
-            logo_paragraph = header.add_paragraph()
-
-            if position == "left":
-                logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            elif position == "center":
-                logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            elif position == "right":
-                logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            else: 
-                logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                self.log(f"未知的 Logo 位置 '{position}'，默认为左对齐。")
-            
-            try:
-                run = logo_paragraph.add_run()
-                run.add_picture(logo_path_str, width=Cm(width_cm_val))
-                self.log(f"Logo 已添加到页眉，位置: {position}, 宽度: {width_cm_val}cm")
-            except FileNotFoundError:
-                self.log(f"错误: Logo 文件未找到于 '{logo_path_str}'。Logo 未添加。")
-            except Exception as e:
-                self.log(f"添加 Logo 图片时出错: {e}")
-
-    def generate_document_thread(self, doc_path): # doc_path is now passed as argument
         try:
-            # Clear log widget from main thread using root.after
-            if self.log_text_widget and self.root.winfo_exists():
-                self.root.after(0, lambda: [
-                    self.log_text_widget.config(state=tk.NORMAL),
-                    self.log_text_widget.delete(1.0, tk.END),
-                    self.log_text_widget.config(state=tk.DISABLED)
-                ])
-
-            self.log("开始文档生成过程..."); self.update_progress(5)
-            self.log(f"文档将保存至: {doc_path}"); self.update_progress(10)
-            
-            doc = Document(); self.log("已创建新文档..."); self.update_progress(15)
-            
-            self.log("设置文档页面格式...")
-            for sec in doc.sections: 
-                sec.page_height,sec.page_width=Inches(11.69),Inches(8.27) 
-                sec.left_margin,sec.right_margin,sec.top_margin,sec.bottom_margin=Inches(1.25),Inches(1.0),Inches(1.0),Inches(1.0) 
-            self.update_progress(20)
-
-            self.log("应用页眉设置...")
-            self.apply_header_settings(doc)
-            self.update_progress(25) 
-            
-            self.log("创建文档样式...")
-            self.create_style(doc,'DocTitleStyle','文档标题',self.title_font.get(),self.title_size.get(),self.title_bold.get(),self.title_color_val.get()); self.update_progress(30)
-            self.create_style(doc,'Heading1Style','一级标题',self.h1_font.get(),self.h1_size.get(),self.h1_bold.get(),self.h1_color_val.get(),level=1); self.update_progress(40)
-            self.create_style(doc,'Heading2Style','二级标题',self.h2_font.get(),self.h2_size.get(),self.h2_bold.get(),self.h2_color_val.get(),level=2); self.update_progress(50)
-            self.create_style(doc,'Heading3Style','三级标题',self.h3_font.get(),self.h3_size.get(),self.h3_bold.get(),self.h3_color_val.get(),level=3); self.update_progress(60)
-            
-            self.log("创建正文样式...")
-            n_style=doc.styles['Normal']; n_style.font.name=self.normal_font.get(); n_style.font.size=Pt(self.normal_size.get()); n_style.font.bold=self.normal_bold.get()
-            n_style.font.color.rgb=self.rgb_from_hex(self.normal_color_val.get()); 
-            
-            # Ensure East Asian font for Normal style as well
-            rFonts_normal = n_style.element.rPr.get_or_add_rFonts()
-            rFonts_normal.set(qn('w:eastAsia'),self.normal_font.get())
-            
-            try: 
-                indent_chars_val = int(self.indent_entry.get()) # Get from the Entry widget
-            except ValueError: 
-                self.log("警告：首行缩进字符数无效，默认为0。"); indent_chars_val=0
-            
-            # Use a more standard indent calculation: font size * number of characters
-            # For Chinese characters, this is a reasonable approximation.
-            indent_val = Pt(indent_chars_val * self.normal_size.get()) if indent_chars_val > 0 else Pt(0)
+            spec = self.build_document_spec()
+        except tk.TclError as e: # e.g. a non-integer font size in an IntVar
+            messagebox.showerror("错误", f"样式设置无效: {e}")
+            return
 
-            n_style.paragraph_format.first_line_indent = indent_val
-            n_style.paragraph_format.line_spacing_rule=WD_LINE_SPACING.ONE_POINT_FIVE; self.update_progress(70)
-            
-            self.log("添加文档内容..."); self.log("添加文档标题...")
-            title_p=doc.add_paragraph(self.document_title.get(),style='DocTitleStyle'); title_p.alignment=WD_ALIGN_PARAGRAPH.CENTER; self.update_progress(75)
-            
-            self.log("添加目录..."); self.add_toc(doc,self.toc_title.get()); doc.add_page_break(); self.update_progress(80)
-            self.log("添加文档主体内容..."); self.add_user_document_content(doc); self.update_progress(90)
-            
-            self.log("保存文档..."); doc.save(doc_path); self.update_progress(100)
-            self.log(f"文档已成功保存至 {doc_path}"); self.log("请在Word中打开文档，右键点击目录，选择'更新域'或按F9更新目录。")
-            if self.root.winfo_exists():
-                self.root.after(0,lambda: messagebox.showinfo("成功",f"文档已成功生成并保存至:\n{doc_path}\n\n请在Word中打开文档后，右键点击目录，选择'更新域'更新目录。"))
-        except Exception as e:
-            err_msg=f"生成文档时发生错误:\n{str(e)}"; self.log(f"错误: {str(e)}")
-            import traceback
-            self.log(f"Traceback: {traceback.format_exc()}")
-            if self.root.winfo_exists():
-                self.root.after(0,lambda em=err_msg: messagebox.showerror("错误",em)); 
-            self.update_progress(0)
-        finally:
-            # Re-enable generate button
-            # if hasattr(self, 'main_generate_button') and self.root.winfo_exists(): 
-            #    self.root.after(0, lambda: self.main_generate_button.config(state=tk.NORMAL))
-            pass # Placeholder for re-enabling button if needed
-
-    def add_user_document_content(self, document):
-        self.log("开始添加用户定义的文档内容...")
-        for sec_item in self.document_sections:
-            self.log(f"添加章节: {sec_item['title']} (级别 {sec_item['level']})"); style_name='Normal'
-            if sec_item['level']==1: style_name='Heading1Style'
-            elif sec_item['level']==2: style_name='Heading2Style'
-            elif sec_item['level']==3: style_name='Heading3Style'
-            
-            try: 
-                p = document.add_paragraph(sec_item['title'],style=style_name)
-                if style_name.startswith('Heading'):
-                    p.paragraph_format.first_line_indent = None 
-            except KeyError: 
-                self.log(f"警告：样式 '{style_name}' 未找到，使用 Normal 样式替代。"); 
-                p = document.add_paragraph(sec_item['title'],style='Normal')
-
-            if sec_item['content']:
-                content_paragraphs = re.split(r'\n\s*\n', sec_item['content'].strip())
-                for para_text in content_paragraphs:
-                    if para_text.strip():
-                        lines = para_text.splitlines()
-                        if lines:
-                            first_line_para = document.add_paragraph(style='Normal')
-                            # Add the first line with potential indent from 'Normal' style
-                            first_line_para.add_run(lines[0].strip())
-                            
-                            # For subsequent lines of the same original paragraph, add them without indent
-                            # by adding them as runs to the same paragraph, or as new paragraphs
-                            # where first_line_indent is explicitly removed or a non-indented style is used.
-                            for line_text in lines[1:]:
-                                if line_text.strip():
-                                     # Simplest: add as a new paragraph with Normal style.
-                                     # If Normal style has first_line_indent, this might not be desired for continuation lines.
-                                     # A more complex approach would be to create a 'BodyTextContinuation' style without indent.
-                                     # Or, add a soft line break (Shift+Enter) if supported, or just new paragraphs.
-                                     document.add_paragraph(line_text.strip(), style='Normal') 
-        self.log("所有用户定义的内容已添加完成")
+        if self.log_view: self.log_view.clear() # Cleared here so no message of the new run is lost
+        self.jobs.start(job_key, self.generate_document_thread, doc_path, spec) # Single flight per output path
+        self.update_job_buttons()
     
-    def create_style(self,document,style_id,style_name_ui,font_name,font_size_pt,is_bold,color_hex,level=None):
+    def setup_export_tab(self, parent):
+        dir_frame = ttk.Frame(parent); dir_frame.pack(fill=tk.X, padx=10, pady=(10, 5))
+        ttk.Label(dir_frame, text="输出文件夹:").pack(side=tk.LEFT)
+        ttk.Entry(dir_frame, textvariable=self.export_dir).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Button(dir_frame, text="浏览", command=self.choose_export_dir).pack(side=tk.LEFT)
+
+        button_frame = ttk.Frame(parent); button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="加入当前文档", command=self.queue_current_document).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="导入描述文件...", command=self.queue_spec_files).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="开始导出", command=self.start_export_queue).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消选中", command=self.cancel_selected_exports).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="重试选中", command=self.retry_selected_exports).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="清除已结束", command=self.clear_finished_exports).pack(side=tk.LEFT, padx=5)
+
+        tree_frame = ttk.Frame(parent); tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        tree = ttk.Treeview(tree_frame, columns=("name", "state", "progress", "detail"), show="headings", selectmode="extended")
+        for column, text, width, stretch in (("name", "文件", 220, True), ("state", "状态", 80, False),
+                                             ("progress", "进度", 60, False), ("detail", "耗时/错误", 360, True)):
+            tree.heading(column, text=text, anchor=tk.W)
+            tree.column(column, width=width, stretch=stretch, anchor=tk.W)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tree_scroll = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.configure(yscrollcommand=tree_scroll.set)
+
+        summary_frame = ttk.Frame(parent); summary_frame.pack(fill=tk.X, padx=10, pady=(5, 10))
+        export_progress = ttk.Progressbar(summary_frame, orient="horizontal", mode="determinate")
+        export_progress.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Label(summary_frame, textvariable=self.export_status, width=40).pack(side=tk.LEFT, padx=(10, 0))
+        self.export_view = export_queue.ExportQueueView(self.root, tree, self.export_queue, export_progress, self.export_status)
+
+    def choose_export_dir(self):
+        selected = filedialog.askdirectory(title="选择批量导出的输出文件夹", initialdir=self.export_dir.get() or None)
+        if selected: self.export_dir.set(selected)
+
+    def export_output_path(self, filename):
+        return os.path.join(self.export_dir.get().strip() or os.getcwd(), f"{filename}.docx")
+
+    def queue_current_document(self):
+        """把当前界面上的文档（内容与样式快照）加入导出队列"""
+        if not self.validate_generation_inputs(): return
         try:
-            self.log(f"创建样式: {style_name_ui}, 字体: {font_name}, 大小: {font_size_pt}pt, 加粗: {is_bold}, 颜色: {color_hex}")
-            try: style=document.styles[style_id]
-            except KeyError: style=document.styles.add_style(style_id,WD_STYLE_TYPE.PARAGRAPH)
-            
-            style.name = style_name_ui
-            style.hidden = False
-            style.quick_style = True 
-
-            font=style.font
-            font.name = font_name
-            try:
-                font.size = Pt(float(font_size_pt)) 
-            except ValueError:
-                self.log(f"字号 '{font_size_pt}' 无效，将使用默认值 12pt for style {style_id}")
-                font.size = Pt(12)
-
-            font.bold = is_bold
-            font.color.rgb = self.rgb_from_hex(color_hex)
-            
-            rpr = font.element.get_or_add_rPr() # Ensure rPr exists
-            rpr_fonts = rpr.get_or_add_rFonts() # Ensure rFonts exists
-
-            rpr_fonts.set(qn('w:eastAsia'),font_name)
-            rpr_fonts.set(qn('w:ascii'),font_name) 
-            rpr_fonts.set(qn('w:hAnsi'),font_name)
-            
-            p_fmt=style.paragraph_format
-            if level: 
-                try: 
-                    base_style_name=f'Heading {level}'
-                    style.base_style = document.styles[base_style_name] if base_style_name in document.styles else document.styles['Normal']
-                except KeyError: 
-                    self.log(f"警告: 内置标题样式 'Heading {level}' 未找到，基于 Normal 创建。")
-                    style.base_style=document.styles['Normal']
-                
-                style.next_paragraph_style=document.styles['Normal']
-                pPr = style.element.get_or_add_pPr()
-                
-                # Remove existing outlineLvl if present before adding new one to avoid duplicates
-                existing_outlineLvl = pPr.find(qn('w:outlineLvl'))
-                if existing_outlineLvl is not None:
-                    pPr.remove(existing_outlineLvl)
-
-                outlineLvl = OxmlElement('w:outlineLvl')
-                outlineLvl.set(qn('w:val'), str(level - 1)) 
-                pPr.append(outlineLvl)
-
-                p_fmt.space_before = Pt(12 if level == 1 else (8 if level == 2 else 6))
-                p_fmt.space_after = Pt(6 if level == 1 else (4 if level == 2 else 2))
-                p_fmt.line_spacing_rule = WD_LINE_SPACING.SINGLE 
-                p_fmt.alignment=WD_ALIGN_PARAGRAPH.LEFT
-                p_fmt.keep_with_next = True 
-                p_fmt.keep_together = True 
-                p_fmt.first_line_indent = None 
-
-            elif style_id == 'DocTitleStyle': 
-                p_fmt.space_before=Pt(18)
-                p_fmt.space_after=Pt(18)
-                p_fmt.alignment=WD_ALIGN_PARAGRAPH.CENTER
-                p_fmt.line_spacing_rule = WD_LINE_SPACING.SINGLE
-                p_fmt.keep_with_next = True
-            
-            return style
-        except Exception as e: 
-            self.log(f"创建样式 '{style_name_ui}' 时出错: {str(e)}")
-            import traceback
-            self.log(f"Traceback: {traceback.format_exc()}")
-            return None
-    
-    def rgb_from_hex(self,hex_color_str):
-        hex_color_str=hex_color_str.lstrip('#')
-        if len(hex_color_str)==6: 
-            try:
-                return RGBColor(int(hex_color_str[0:2],16),int(hex_color_str[2:4],16),int(hex_color_str[4:6],16))
-            except ValueError:
-                self.log(f"警告：无效的十六进制颜色值在 '{hex_color_str}' 中，使用黑色。")
-                return RGBColor(0,0,0)
-        else: self.log(f"警告：无效的十六进制颜色字符串 '{hex_color_str}'，使用黑色。"); return RGBColor(0,0,0)
-    
-    def add_toc(self,document,toc_main_title="目录"):
+            spec = self.build_document_spec()
+        except tk.TclError as e:
+            messagebox.showerror("错误", f"样式设置无效: {e}")
+            return
+        self.export_queue.add(spec, self.export_output_path(spec.filename))
+        self.log(f"已加入导出队列: {spec.filename}")
+        self.export_view.refresh()
+
+    def queue_spec_files(self):
+        """导入 JSON/YAML 文档描述文件或大纲文件，每个描述一个任务；未指定的样式字段取当前界面设置"""
+        paths = filedialog.askopenfilenames(title="选择文档描述文件",
+                                            filetypes=[("文档描述", "*.json *.jsonl *.yaml *.yml"), ("大纲文件", "*.md *.markdown *.txt *.docx"), ("所有文件", "*.*")])
+        if not paths: return
         try:
-            self.log(f"添加目录标题: {toc_main_title}")
-            p_title=document.add_paragraph(); 
-            p_title.alignment=WD_ALIGN_PARAGRAPH.CENTER
-            run_title=p_title.add_run(toc_main_title)
-            run_title.font.name=self.h1_font.get() 
+            base_style = self.build_document_spec().style
+        except tk.TclError as e:
+            messagebox.showerror("错误", f"样式设置无效: {e}")
+            return
+        added, errors = 0, []
+        for path in paths:
             try:
-                toc_title_size = self.h1_size.get()
-                run_title.font.size=Pt(toc_title_size if toc_title_size > 16 else 16)
-            except tk.TclError: # Handle case where h1_size might not be a valid int yet
-                 run_title.font.size=Pt(16)
-                 self.log("警告: H1字号无效，目录标题字号设为16pt")
-
-            run_title.font.bold=True # TOC title usually bold
-            run_title.font.color.rgb = self.rgb_from_hex(self.h1_color_val.get()) 
-            
-            rpr_title = run_title.font.element.get_or_add_rPr()
-            rpr_fonts_title = rpr_title.get_or_add_rFonts()
-            rpr_fonts_title.set(qn('w:eastAsia'),self.h1_font.get())
-            
-            p_title.paragraph_format.space_before = Pt(12)
-            p_title.paragraph_format.space_after=Pt(12)
-
-            self.log("添加目录字段")
-            paragraph = document.add_paragraph()
-            run = paragraph.add_run()
-            fldChar_begin = OxmlElement('w:fldChar')
-            fldChar_begin.set(qn('w:fldCharType'), 'begin')
-            
-            instrText = OxmlElement('w:instrText')
-            instrText.set(qn('xml:space'), 'preserve')
-            instrText.text = r' TOC \o "1-3" \h \z \u ' 
-            
-            fldChar_separate = OxmlElement('w:fldChar')
-            fldChar_separate.set(qn('w:fldCharType'), 'separate')
-
-            fldChar_end = OxmlElement('w:fldChar')
-            fldChar_end.set(qn('w:fldCharType'), 'end')
-
-            run._r.append(fldChar_begin)
-            run._r.append(instrText)
-            run._r.append(fldChar_separate)
-            run._r.append(fldChar_end)
-            
-            self.log("目录添加完成"); return paragraph
-        except Exception as e: 
-            self.log(f"添加目录时出错: {str(e)}")
-            import traceback
-            self.log(f"Traceback: {traceback.format_exc()}")
-            return None
+                for spec_dict in doc_spec.load_spec_file(path):
+                    spec = doc_spec.DocumentSpec.from_dict(spec_dict, base_style)
+                    if os.path.abspath(self.export_output_path(spec.filename)) == os.path.abspath(path):
+                        raise ValueError("输出文件与大纲文件相同，请选择其他输出文件夹")
+                    self.export_queue.add(spec, self.export_output_path(spec.filename))
+                    added += 1
+            except (OSError, ValueError, TypeError, RuntimeError) as e:
+                errors.append(f"{os.path.basename(path)}: {e}")
+        self.export_view.refresh()
+        self.log(f"从 {len(paths)} 个文件导入 {added} 个导出任务")
+        if errors:
+            messagebox.showwarning("部分文件导入失败", "\n".join(errors))
+
+    def start_export_queue(self):
+        export_dir = self.export_dir.get().strip()
+        try:
+            os.makedirs(export_dir, exist_ok=True)
+        except OSError as e:
+            messagebox.showerror("错误", f"无法创建输出文件夹: {e}")
+            return
+        submitted = self.export_queue.start()
+        if submitted:
+            self.log(f"开始批量导出 {submitted} 个文档（{self.export_queue.max_workers} 个进程）")
+        self.export_view.start()
+
+    def cancel_selected_exports(self):
+        for job_id in self.export_view.selected_job_ids():
+            self.export_queue.cancel(job_id)
+        self.export_view.refresh()
+
+    def retry_selected_exports(self):
+        for job_id in self.export_view.selected_job_ids():
+            self.export_queue.retry(job_id)
+        self.export_view.start()
+
+    def clear_finished_exports(self):
+        self.export_queue.remove_finished()
+        self.export_view.refresh()
+
+    def build_document_spec(self):
+        """在主线程中把界面上的设置快照为纯数据的文档描述，供后台线程/进程使用"""
+        style = doc_spec.StyleSpec(
+            title_font=self.title_font.get(), title_size=self.title_size.get(), title_color=self.title_color_val.get(), title_bold=self.title_bold.get(),
+            h1_font=self.h1_font.get(), h1_size=self.h1_size.get(), h1_color=self.h1_color_val.get(), h1_bold=self.h1_bold.get(),
+            h2_font=self.h2_font.get(), h2_size=self.h2_size.get(), h2_color=self.h2_color_val.get(), h2_bold=self.h2_bold.get(),
+            h3_font=self.h3_font.get(), h3_size=self.h3_size.get(), h3_color=self.h3_color_val.get(), h3_bold=self.h3_bold.get(),
+            normal_font=self.normal_font.get(), normal_size=self.normal_size.get(), normal_color=self.normal_color_val.get(), normal_bold=self.normal_bold.get(),
+            indent_chars=self.indent_entry.get(), # Get from the Entry widget
+            add_logo=self.add_logo.get(), logo_path=self.logo_path.get(), logo_position=self.logo_position.get(), logo_width_cm=self.logo_width_cm.get())
+        return doc_spec.DocumentSpec(self.filename.get().strip(), self.document_title.get(), self.toc_title.get(),
+                                     self.document_sections, style)
+
+    def generate_document_thread(self, cancel, doc_path, spec): # doc_path and spec are prepared in the main thread
+        try:
+            saved_path, err_msg = docx_engine.generate_document(spec, doc_path, log=self.log, progress=self.update_progress, cancel=cancel,
+                                                                timing_path=self.timing_file)
+        except job_control.Cancelled:
+            self.log("文档生成已取消，未写入文件。", level="WARNING")
+            self.update_progress(0)
+            return
+        if saved_path:
+            self.call_in_main(lambda: messagebox.showinfo("成功",f"文档已成功生成并保存至:\n{doc_path}\n\n目录已生成，页码为估算值；如需精确页码，可在Word中右键点击目录选择'更新域'。"))
+        else:
+            self.call_in_main(lambda em=err_msg: messagebox.showerror("错误",em))
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = DocxFormatter(root)
     root.mainloop()
+    app.closing = True
+    app.jobs.cancel_all()
+    app.ai_loop.stop()
+    app.export_queue.shutdown()
+    app.log_sink.close()
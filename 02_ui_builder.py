@@ -95,6 +95,10 @@ def create_content_tab(parent_tab, section_editor_vars, callbacks):
     ttk.Button(button_area, text="删除", command=callbacks['on_delete_section'], width=6).pack(side=tk.LEFT, padx=2)
     ttk.Button(button_area, text="上移", command=callbacks['on_move_up'], width=6).pack(side=tk.LEFT, padx=2)
     ttk.Button(button_area, text="下移", command=callbacks['on_move_down'], width=6).pack(side=tk.LEFT, padx=2)
+    if 'on_import_outline' in callbacks:
+        ttk.Button(button_area, text="导入", command=callbacks['on_import_outline'], width=6).pack(side=tk.LEFT, padx=2)
+    if 'on_collapse_all' in callbacks:
+        ttk.Button(button_area, text="折叠", command=callbacks['on_collapse_all'], width=6).pack(side=tk.LEFT, padx=2)
 
     # --- Right Frame Content (Section Editor) ---
     editor_frame = ttk.Frame(right_frame, padding="5 5 5 5")
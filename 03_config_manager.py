@@ -1,4 +1,7 @@
 import tkinter as tk
+import importlib
+
+doc_spec = importlib.import_module("07_doc_spec")
 
 class StyleConfig:
     def __init__(self):
@@ -72,6 +75,21 @@ class StyleConfig:
             }
         return {}
 
+    def to_style_spec(self):
+        """把当前界面变量快照为纯数据的 StyleSpec，生成文档时不再访问 Tk 变量"""
+        return doc_spec.StyleSpec(
+            title_font=self.title_font_var.get(), title_size=self.title_size_var.get(),
+            title_bold=self.title_bold_var.get(), title_color=self.title_color_hex,
+            h1_font=self.h1_font_var.get(), h1_size=self.h1_size_var.get(),
+            h1_bold=self.h1_bold_var.get(), h1_color=self.h1_color_hex,
+            h2_font=self.h2_font_var.get(), h2_size=self.h2_size_var.get(),
+            h2_bold=self.h2_bold_var.get(), h2_color=self.h2_color_hex,
+            h3_font=self.h3_font_var.get(), h3_size=self.h3_size_var.get(),
+            h3_bold=self.h3_bold_var.get(), h3_color=self.h3_color_hex,
+            normal_font=self.normal_font_var.get(), normal_size=self.normal_size_var.get(),
+            normal_bold=self.normal_bold_var.get(), normal_color=self.normal_color_hex,
+            indent_chars=self.indent_chars_var.get())
+
     def set_color_hex(self, color_hex_attr_name, value):
         if hasattr(self, color_hex_attr_name):
             setattr(self, color_hex_attr_name, value)
@@ -1,56 +1,57 @@
+import importlib
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+section_store = importlib.import_module("17_section_store")
+section_tree = importlib.import_module("18_section_tree")
+
 class ContentManager:
     def __init__(self):
-        self.document_sections = []
+        self.document_sections = section_store.SectionStore()
+        self.section_tree = section_tree.SectionTree(self.document_sections)
         self.tree_widget = None
-        self.next_section_id_counter = 0
+        self.tree_view = None
 
     def set_tree_widget(self, tree_widget):
         self.tree_widget = tree_widget
+        self.tree_view = section_tree.LazySectionTreeView(tree_widget, self.section_tree)
 
     def init_default_sections(self):
         """初始化一些默认的章节结构作为示例"""
         self.add_section(level=1, title="第一章 背景介绍", content="这里是背景介绍内容。")
 
-    def _generate_section_id(self):
-        new_id = f"section_{self.next_section_id_counter}"
-        self.next_section_id_counter += 1
-        return new_id
-
-    def add_section(self, level, title, content=""):
-        """添加一个新章节并更新UI"""
-        section_id = self._generate_section_id()
-        section = {
-            'id': section_id,
-            'level': level,
-            'title': title,
-            'content': content
-        }
-        self.document_sections.append(section)
+    def add_section(self, level, title, content="", refresh=True):
+        """添加一个新章节并更新UI（refresh=False 时由调用方统一刷新）"""
+        section = self.document_sections.add(level, title, content)
+        if refresh:
+            self.update_tree_ui()
+        return section.id
+
+    def add_sections(self, items):
+        """批量添加 (level, title, content) 章节，全部添加后只刷新一次树形视图"""
+        section_ids = [self.add_section(level, title, content, refresh=False) for level, title, content in items]
         self.update_tree_ui()
-        return section_id
+        return section_ids
+
+    def import_sections(self, records, replace=False):
+        """从导入器产出的 {level, title, content} 记录批量加载章节（只遍历一次，最后刷新一次树形视图）
+
+        replace=True 时先清空现有章节；返回导入的章节数。
+        """
+        if replace:
+            self.document_sections.clear()
+        section_ids = self.add_sections((record['level'], record['title'], record.get('content', "")) for record in records)
+        return len(section_ids)
 
     def update_tree_ui(self):
-        """更新树形视图"""
+        """更新树形视图（只改动发生变化的行）"""
         if not self.tree_widget:
             return
-        # 清空树形视图
-        for item in self.tree_widget.get_children():
-            self.tree_widget.delete(item)
-        
-        # 填充树形视图
-        for i, section in enumerate(self.document_sections):
-            self.tree_widget.insert("", tk.END, section['id'], text=str(i+1), 
-                                    values=(section['title'], f"级别{section['level']}"))
+        self.tree_view.refresh()
 
     def get_section_by_id(self, section_id):
         """根据ID查找章节"""
-        for section in self.document_sections:
-            if section['id'] == section_id:
-                return section
-        return None
+        return self.document_sections.get(section_id)
 
     def edit_section_attributes(self, section_id, new_title, new_level):
         """编辑章节的标题和级别，并更新UI"""
@@ -73,32 +74,28 @@ class ContentManager:
         return False
 
     def delete_section(self, section_id):
-        """删除选中的章节并更新UI"""
-        section_to_delete = self.get_section_by_id(section_id)
-        if section_to_delete:
-            self.document_sections = [s for s in self.document_sections if s['id'] != section_id]
+        """删除选中的章节及其全部下级章节并更新UI，返回被删除的 id 列表"""
+        removed_ids = self.section_tree.delete_subtree(section_id)
+        if removed_ids:
             self.update_tree_ui()
-            return True
-        return False
+        return removed_ids
 
     def move_section(self, section_id, direction):
-        """上移或下移章节并更新UI"""
-        for i, section in enumerate(self.document_sections):
-            if section['id'] == section_id:
-                new_pos = i + direction
-                if 0 <= new_pos < len(self.document_sections):
-                    # 交换位置
-                    self.document_sections[i], self.document_sections[new_pos] = \
-                        self.document_sections[new_pos], self.document_sections[i]
-                    self.update_tree_ui()
-                    # 重新选中移动的项
-                    if self.tree_widget:
-                        self.tree_widget.selection_set(section_id)
-                        self.tree_widget.focus(section_id) # 确保它可见
-                    return True
-                break
+        """与同级章节交换位置（下级章节一起移动）并更新UI"""
+        if section_id in self.document_sections and self.section_tree.move_subtree(section_id, direction):
+            self.update_tree_ui()
+            # 重新选中移动的项
+            if self.tree_widget:
+                self.tree_widget.selection_set(section_id)
+                self.tree_widget.focus(section_id) # 确保它可见
+            return True
         return False
 
+    def collapse_all(self):
+        """折叠树形视图中的全部节点"""
+        if self.tree_view:
+            self.tree_view.collapse()
+
     def get_all_sections(self):
         """获取所有章节数据的列表副本"""
         return list(self.document_sections) # 返回副本以防外部修改 
\ No newline at end of file
@@ -1,18 +1,29 @@
-from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
 from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
+import importlib
 import os
 
+style_template_cache = importlib.import_module("10_style_template_cache")
+streaming_docx = importlib.import_module("21_streaming_docx")
+toc_builder = importlib.import_module("22_toc_builder")
+
 class DocxWriter:
     def __init__(self, style_config, content_manager, log_callback, progress_callback):
+        # style_config 可以是界面的 StyleConfig，也可以是纯数据的 StyleSpec（无界面运行）
         self.style_config = style_config
         self.content_manager = content_manager
         self.log = log_callback
         self.update_progress = progress_callback
 
+    def _style_spec(self):
+        """获取样式快照；StyleConfig 在此处一次性读取 Tk 变量"""
+        if hasattr(self.style_config, 'to_style_spec'):
+            return self.style_config.to_style_spec()
+        return self.style_config
+
     def _convert_hex_to_rgb(self, hex_color):
         """将十六进制颜色值转换为RGB对象"""
         hex_color = hex_color.lstrip('#')
@@ -72,63 +83,73 @@ class DocxWriter:
             self.log(f"创建样式 '{style_name}' 时出错: {str(e)}")
             return None
 
-    def _create_styles_in_document(self, document):
+    def _setup_page(self, document):
+        self.log("设置文档页面格式...")
+        for section_props in document.sections:
+            section_props.page_height = Inches(11.69)
+            section_props.page_width = Inches(8.27)
+            section_props.left_margin = Inches(1)
+            section_props.right_margin = Inches(1)
+            section_props.top_margin = Inches(1)
+            section_props.bottom_margin = Inches(0.8)
+
+    def _create_styles_in_document(self, document, sc):
         self.log("创建文档样式...")
-        sc = self.style_config
 
         # 文档标题样式
         self._create_or_get_style(document, 'Title', '文档标题', 
-                                  sc.title_font_var.get(), sc.title_size_var.get(), 
-                                  sc.title_bold_var.get(), sc.title_color_hex, sc.title_font_var.get())
+                                  sc.title_font, sc.title_size, 
+                                  sc.title_bold, sc.title_color, sc.title_font)
         self.update_progress(30)
 
         # 一级标题样式
         self._create_or_get_style(document, 'Heading1', '一级标题', 
-                                  sc.h1_font_var.get(), sc.h1_size_var.get(), 
-                                  sc.h1_bold_var.get(), sc.h1_color_hex, sc.h1_font_var.get(), level=1)
+                                  sc.h1_font, sc.h1_size, 
+                                  sc.h1_bold, sc.h1_color, sc.h1_font, level=1)
         self.update_progress(40)
 
         # 二级标题样式
         self._create_or_get_style(document, 'Heading2', '二级标题', 
-                                  sc.h2_font_var.get(), sc.h2_size_var.get(), 
-                                  sc.h2_bold_var.get(), sc.h2_color_hex, sc.h2_font_var.get(), level=2)
+                                  sc.h2_font, sc.h2_size, 
+                                  sc.h2_bold, sc.h2_color, sc.h2_font, level=2)
         self.update_progress(50)
 
         # 三级标题样式
         self._create_or_get_style(document, 'Heading3', '三级标题', 
-                                  sc.h3_font_var.get(), sc.h3_size_var.get(), 
-                                  sc.h3_bold_var.get(), sc.h3_color_hex, sc.h3_font_var.get(), level=3)
+                                  sc.h3_font, sc.h3_size, 
+                                  sc.h3_bold, sc.h3_color, sc.h3_font, level=3)
         self.update_progress(60)
 
         # 正文样式
         self.log("创建正文样式...")
         normal_style = document.styles['Normal']
-        normal_style.font.name = sc.normal_font_var.get()
-        normal_style.font.size = Pt(sc.normal_size_var.get())
-        normal_style.font.bold = sc.normal_bold_var.get()
-        normal_style.font.color.rgb = self._convert_hex_to_rgb(sc.normal_color_hex)
-        normal_style._element.rPr.rFonts.set(qn('w:eastAsia'), sc.normal_font_var.get())
+        normal_style.font.name = sc.normal_font
+        normal_style.font.size = Pt(sc.normal_size)
+        normal_style.font.bold = sc.normal_bold
+        normal_style.font.color.rgb = self._convert_hex_to_rgb(sc.normal_color)
+        normal_style._element.rPr.rFonts.set(qn('w:eastAsia'), sc.normal_font)
         
         try:
-            indent_val = int(sc.indent_chars_var.get())
-            normal_style.paragraph_format.first_line_indent = Pt(indent_val * sc.normal_size_var.get()) 
+            indent_val = int(sc.indent_chars)
+            normal_style.paragraph_format.first_line_indent = Pt(indent_val * sc.normal_size) 
         except ValueError:
-            self.log(f"错误: 首行缩进字符数 '{sc.indent_chars_var.get()}' 不是有效数字。将不设置首行缩进。")
+            self.log(f"错误: 首行缩进字符数 '{sc.indent_chars}' 不是有效数字。将不设置首行缩进。")
             normal_style.paragraph_format.first_line_indent = None
         normal_style.paragraph_format.line_spacing_rule = WD_LINE_SPACING.ONE_POINT_FIVE
+        toc_builder.add_toc_styles(document)
         self.update_progress(70)
 
-    def _add_table_of_contents(self, document, toc_title_str):
+    def _add_table_of_contents(self, document, toc_title_str, sc):
         try:
             self.log(f"添加目录标题: {toc_title_str}")
             p = document.add_paragraph()
             p.alignment = WD_ALIGN_PARAGRAPH.CENTER
             run = p.add_run(toc_title_str)
             # Apply H1 style attributes for TOC title as per original logic for font consistency
-            run.font.name = self.style_config.h1_font_var.get()
-            run.font.size = Pt(self.style_config.h1_size_var.get()) # Using H1 size for TOC title as in original
-            run.font.bold = self.style_config.h1_bold_var.get()
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), self.style_config.h1_font_var.get())
+            run.font.name = sc.h1_font
+            run.font.size = Pt(sc.h1_size) # Using H1 size for TOC title as in original
+            run.font.bold = sc.h1_bold
+            run._element.rPr.rFonts.set(qn('w:eastAsia'), sc.h1_font)
             
             self.log("添加目录字段")
             p = document.add_paragraph()
@@ -154,10 +175,13 @@ class DocxWriter:
             r_element.append(fldChar3)
             
             self.log("目录添加完成")
+            return p
         except Exception as e:
             self.log(f"添加目录时出错: {str(e)}")
+            return None
 
-    def _add_user_defined_content(self, document):
+    def _add_user_defined_content(self, writer, toc=None):
+        """writer 为 BodyWriter 或 StreamingBodyWriter（流式保存时正文直接写入文件）；toc 为 TocBuilder 时同时收集目录条目"""
         self.log("开始添加用户定义的文档内容...")
         all_sections = self.content_manager.get_all_sections()
         
@@ -166,16 +190,19 @@ class DocxWriter:
             style_name = f"Heading{section['level']}" if section['level'] in [1,2,3] else 'Normal'
             
             try:
-                document.add_paragraph(section['title'], style=style_name)
+                writer.style_id(style_name)
             except KeyError:
                 self.log(f"警告: 样式 '{style_name}' 未找到，将使用Normal样式添加标题 '{section['title']}'")
-                document.add_paragraph(section['title'], style='Normal')
+                style_name = 'Normal'
+            bookmark = toc.heading(section['level'], section['title']) if toc else None
+            writer.add_paragraph(section['title'], style_name, bookmark=bookmark)
 
             if section['content']:
                 # Ensure content is a string and not None
                 content_text = str(section['content']).strip()
                 if content_text: # Only add paragraph if there's actual content
-                    document.add_paragraph(content_text, style='Normal')
+                    writer.add_paragraph(content_text, 'Normal')
+                    if toc: toc.paragraph(content_text)
         
         self.log("所有用户定义的内容已添加完成")
 
@@ -183,28 +210,23 @@ class DocxWriter:
         try:
             self.log("开始文档生成过程...")
             self.update_progress(5)
+            sc = self._style_spec()
             
             doc_path = os.path.join(output_dir, f"{filename_str}.docx")
             self.log(f"文档将保存至: {doc_path}")
             self.update_progress(10)
             
-            document = Document()
+            def build_template(template_document):
+                self._setup_page(template_document)
+                self.update_progress(20)
+                self._create_styles_in_document(template_document, sc)
+                # Progress already updated within _create_styles_in_document
+
+            # 同一样式组合只构建一次，之后从缓存的模板克隆
+            cache_key = style_template_cache.style_cache_key(sc, kind="docx_writer")
+            document = style_template_cache.default_cache.new_document(cache_key, build_template)
             self.log("已创建新文档...")
-            self.update_progress(15)
-            
-            self.log("设置文档页面格式...")
-            doc_sections = document.sections
-            for section_props in doc_sections:
-                section_props.page_height = Inches(11.69)
-                section_props.page_width = Inches(8.27)
-                section_props.left_margin = Inches(1)
-                section_props.right_margin = Inches(1)
-                section_props.top_margin = Inches(1)
-                section_props.bottom_margin = Inches(0.8)
-            self.update_progress(20)
-            
-            self._create_styles_in_document(document)
-            # Progress already updated within _create_styles_in_document
+            self.update_progress(70)
             
             self.log("添加文档标题...")
             if document_title_str:
@@ -212,19 +234,18 @@ class DocxWriter:
                 # Alignment already handled by style
             self.update_progress(75)
             
-            self._add_table_of_contents(document, toc_title_str)
+            toc_paragraph = self._add_table_of_contents(document, toc_title_str, sc)
             document.add_page_break()
             self.update_progress(80)
             
-            self._add_user_defined_content(document)
-            self.update_progress(90)
-            
-            self.log("保存文档...")
-            document.save(doc_path)
+            self.log("添加正文并流式保存文档...")
+            toc = toc_builder.TocBuilder(sc)
+            streaming_docx.save_streaming(document, doc_path, lambda writer: self._add_user_defined_content(writer, toc),
+                                          finalize=lambda d: toc.render(toc_paragraph))
             self.update_progress(100)
             
             self.log(f"文档已成功保存至 {doc_path}")
-            self.log("请在Word中打开文档，右键点击目录，选择'更新域'或按F9更新目录。")
+            self.log("目录页码为估算值，如需精确页码，可在Word中右键点击目录选择'更新域'或按F9。")
             return doc_path, None # path, error
         except Exception as e:
             error_message = f"生成文档时发生错误: {str(e)}"
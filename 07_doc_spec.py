@@ -0,0 +1,133 @@
+import configparser
+import importlib
+import json
+import os
+
+try:
+    import yaml
+except ImportError:  # YAML 为可选依赖，未安装时仅支持 JSON
+    yaml = None
+
+outline_importers = importlib.import_module("28_outline_importers")
+
+# 与 config.ini 中 DEFAULT_UI_SETTINGS 区域的键名保持一致
+STYLE_DEFAULTS = {
+    "title_font": "黑体", "title_size": 22, "title_color": "#000000", "title_bold": True,
+    "h1_font": "黑体", "h1_size": 18, "h1_color": "#000000", "h1_bold": True,
+    "h2_font": "楷体", "h2_size": 16, "h2_color": "#000000", "h2_bold": True,
+    "h3_font": "宋体", "h3_size": 14, "h3_color": "#000000", "h3_bold": True,
+    "normal_font": "仿宋", "normal_size": 12, "normal_color": "#000000", "normal_bold": False,
+    "indent_chars": "2",
+    "add_logo": False, "logo_path": "", "logo_position": "left", "logo_width_cm": 2.5,
+}
+
+_INT_KEYS = {"title_size", "h1_size", "h2_size", "h3_size", "normal_size"}
+_BOOL_KEYS = {"title_bold", "h1_bold", "h2_bold", "h3_bold", "normal_bold", "add_logo"}
+_FLOAT_KEYS = {"logo_width_cm"}
+
+
+class StyleSpec:
+    """纯数据的样式配置，不依赖 Tkinter，可在服务器或定时任务中使用"""
+
+    def __init__(self, **overrides):
+        for key, default_val in STYLE_DEFAULTS.items():
+            setattr(self, key, default_val)
+        unknown = set(overrides) - set(STYLE_DEFAULTS)
+        if unknown:
+            raise ValueError(f"未知的样式字段: {', '.join(sorted(unknown))}")
+        for key, value in overrides.items():
+            setattr(self, key, value)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in STYLE_DEFAULTS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**(data or {}))
+
+    def merged(self, overrides):
+        """返回应用了覆盖项的新样式对象（不修改自身）"""
+        data = self.to_dict()
+        data.update(overrides or {})
+        return StyleSpec(**data)
+
+    @classmethod
+    def from_config(cls, config_path):
+        """从 config.ini 的 DEFAULT_UI_SETTINGS 区域读取样式，缺失的键使用内置默认值"""
+        spec = cls()
+        if not config_path or not os.path.exists(config_path):
+            return spec
+        config = configparser.ConfigParser()
+        config.read(config_path, encoding='utf-8')
+        if "DEFAULT_UI_SETTINGS" not in config:
+            return spec
+        settings = config["DEFAULT_UI_SETTINGS"]
+        for key, default_val in STYLE_DEFAULTS.items():
+            if key not in settings:
+                continue
+            try:
+                if key in _INT_KEYS: value = settings.getint(key)
+                elif key in _BOOL_KEYS: value = settings.getboolean(key)
+                elif key in _FLOAT_KEYS: value = settings.getfloat(key)
+                else: value = settings.get(key)
+            except ValueError:
+                value = default_val
+            setattr(spec, key, value)
+        return spec
+
+
+class DocumentSpec:
+    """一份待生成文档的完整描述：文件名、标题、目录标题、章节列表和样式"""
+
+    def __init__(self, filename, document_title="公文标题示例", toc_title="目 录", sections=None, style=None):
+        self.filename = filename
+        self.document_title = document_title
+        self.toc_title = toc_title
+        self.sections = [dict(s) for s in (sections or [])]
+        self.style = style if style is not None else StyleSpec()
+
+    def to_dict(self):
+        return {
+            "filename": self.filename,
+            "document_title": self.document_title,
+            "toc_title": self.toc_title,
+            "sections": [dict(s) for s in self.sections],
+            "style": self.style.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data, base_style=None):
+        """从字典构建文档描述；data['style'] 中的字段覆盖 base_style"""
+        if not data.get("filename"):
+            raise ValueError("文档描述缺少 filename 字段")
+        style = (base_style or StyleSpec()).merged(data.get("style"))
+        sections = []
+        for i, item in enumerate(data.get("sections") or []):
+            if not isinstance(item, dict) or not item.get("title") or item.get("level") is None:
+                raise ValueError(f"文档 '{data['filename']}' 的第 {i+1} 个章节缺少 title 或 level")
+            sections.append({'level': int(item["level"]), 'title': item["title"], 'content': item.get("content", "")})
+        return cls(data["filename"], data.get("document_title", "公文标题示例"),
+                   data.get("toc_title", "目 录"), sections, style)
+
+
+def load_spec_file(path):
+    """读取 JSON/JSONL/YAML 文件，返回其中的文档描述字典列表（文件可包含单个对象或对象列表）
+
+    Markdown、纯文本和 .docx 大纲文件转换为一个文档描述。
+    """
+    if outline_importers.is_outline_file(path):
+        return [outline_importers.load_outline_spec(path)]
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        if path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise RuntimeError("读取 YAML 文档描述需要 PyYAML，请运行: pip install pyyaml")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, dict):
+        return [data]
+    if isinstance(data, list):
+        return data
+    raise ValueError(f"文档描述文件格式不正确: {path}")
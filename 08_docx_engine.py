@@ -0,0 +1,458 @@
+from docx.shared import Pt, Inches, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn
+from docx.oxml.shared import OxmlElement
+import importlib
+import os
+import re
+import traceback
+
+style_template_cache = importlib.import_module("10_style_template_cache")
+body_writer = importlib.import_module("20_body_writer")
+streaming_docx = importlib.import_module("21_streaming_docx")
+toc_builder = importlib.import_module("22_toc_builder")
+image_cache = importlib.import_module("23_image_cache")
+pipeline_timing = importlib.import_module("32_pipeline_timing")
+
+# 无界面文档生成流程：只依赖纯数据的 StyleSpec / 章节字典，不依赖 Tkinter
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+def rgb_from_hex(hex_color_str, log=_noop):
+    hex_color_str = hex_color_str.lstrip('#')
+    if len(hex_color_str) == 6:
+        try:
+            return RGBColor(int(hex_color_str[0:2], 16), int(hex_color_str[2:4], 16), int(hex_color_str[4:6], 16))
+        except ValueError:
+            log(f"警告：无效的十六进制颜色值在 '{hex_color_str}' 中，使用黑色。")
+            return RGBColor(0, 0, 0)
+    else: log(f"警告：无效的十六进制颜色字符串 '{hex_color_str}'，使用黑色。"); return RGBColor(0, 0, 0)
+
+
+def setup_page(document):
+    """A4 纸张与页边距"""
+    for sec in document.sections:
+        sec.page_height, sec.page_width = Inches(11.69), Inches(8.27)
+        sec.left_margin, sec.right_margin, sec.top_margin, sec.bottom_margin = Inches(1.25), Inches(1.0), Inches(1.0), Inches(1.0)
+
+
+def apply_header_settings(document, style, log=_noop):
+    if not style.add_logo or not style.logo_path:
+        log("未选择添加 Logo 或未指定 Logo 图片路径，跳过页眉 Logo 设置。")
+        return
+
+    logo_path_str = style.logo_path
+    if not os.path.exists(logo_path_str):
+        log(f"Logo 图片路径无效: {logo_path_str}")
+        return
+
+    log(f"开始添加 Logo 到页眉: {logo_path_str}")
+    position = style.logo_position
+    try:
+        width_cm_val = float(style.logo_width_cm)
+        if width_cm_val <= 0:
+            log(f"Logo 宽度无效 ({width_cm_val}cm)，将使用默认宽度 2.5cm。")
+            width_cm_val = 2.5
+    except (TypeError, ValueError):
+        log(f"Logo 宽度值无效，将使用默认宽度 2.5cm。")
+        width_cm_val = 2.5
+
+    # Read and parse the file once; every section header shares one image part
+    try:
+        logo_image = image_cache.default_cache.get(logo_path_str, width_cm_val)
+    except FileNotFoundError:
+        log(f"错误: Logo 文件未找到于 '{logo_path_str}'。Logo 未添加。")
+        return
+    except Exception as e:
+        log(f"添加 Logo 图片时出错: {e}")
+        return
+
+    for section in document.sections:
+        header = section.header
+
+        while header.paragraphs:
+            p_to_remove = header.paragraphs[0]
+            header._element.remove(p_to_remove._element)
+
+        logo_paragraph = header.add_paragraph()
+
+        if position == "left":
+            logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+        elif position == "center":
+            logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        elif position == "right":
+            logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        else:
+            logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            log(f"未知的 Logo 位置 '{position}'，默认为左对齐。")
+
+        try:
+            run = logo_paragraph.add_run()
+            image_cache.add_picture(run, logo_image, width_cm_val)
+            log(f"Logo 已添加到页眉，位置: {position}, 宽度: {width_cm_val}cm")
+        except Exception as e:
+            log(f"添加 Logo 图片时出错: {e}")
+
+
+def create_style(document, style_id, style_name_ui, font_name, font_size_pt, is_bold, color_hex, level=None, log=_noop):
+    try:
+        log(f"创建样式: {style_name_ui}, 字体: {font_name}, 大小: {font_size_pt}pt, 加粗: {is_bold}, 颜色: {color_hex}")
+        try: style = document.styles[style_id]
+        except KeyError: style = document.styles.add_style(style_id, WD_STYLE_TYPE.PARAGRAPH)
+
+        style.name = style_name_ui
+        style.hidden = False
+        style.quick_style = True
+
+        font = style.font
+        font.name = font_name
+        try:
+            font.size = Pt(float(font_size_pt))
+        except ValueError:
+            log(f"字号 '{font_size_pt}' 无效，将使用默认值 12pt for style {style_id}")
+            font.size = Pt(12)
+
+        font.bold = is_bold
+        font.color.rgb = rgb_from_hex(color_hex, log)
+
+        rpr = font.element.get_or_add_rPr() # Ensure rPr exists
+        rpr_fonts = rpr.get_or_add_rFonts() # Ensure rFonts exists
+
+        rpr_fonts.set(qn('w:eastAsia'), font_name)
+        rpr_fonts.set(qn('w:ascii'), font_name)
+        rpr_fonts.set(qn('w:hAnsi'), font_name)
+
+        p_fmt = style.paragraph_format
+        if level:
+            try:
+                base_style_name = f'Heading {level}'
+                style.base_style = document.styles[base_style_name] if base_style_name in document.styles else document.styles['Normal']
+            except KeyError:
+                log(f"警告: 内置标题样式 'Heading {level}' 未找到，基于 Normal 创建。")
+                style.base_style = document.styles['Normal']
+
+            style.next_paragraph_style = document.styles['Normal']
+            pPr = style.element.get_or_add_pPr()
+
+            # Remove existing outlineLvl if present before adding new one to avoid duplicates
+            existing_outlineLvl = pPr.find(qn('w:outlineLvl'))
+            if existing_outlineLvl is not None:
+                pPr.remove(existing_outlineLvl)
+
+            outlineLvl = OxmlElement('w:outlineLvl')
+            outlineLvl.set(qn('w:val'), str(level - 1))
+            pPr.append(outlineLvl)
+
+            p_fmt.space_before = Pt(12 if level == 1 else (8 if level == 2 else 6))
+            p_fmt.space_after = Pt(6 if level == 1 else (4 if level == 2 else 2))
+            p_fmt.line_spacing_rule = WD_LINE_SPACING.SINGLE
+            p_fmt.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            p_fmt.keep_with_next = True
+            p_fmt.keep_together = True
+            p_fmt.first_line_indent = None
+
+        elif style_id == 'DocTitleStyle':
+            p_fmt.space_before = Pt(18)
+            p_fmt.space_after = Pt(18)
+            p_fmt.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            p_fmt.line_spacing_rule = WD_LINE_SPACING.SINGLE
+            p_fmt.keep_with_next = True
+
+        return style
+    except Exception as e:
+        log(f"创建样式 '{style_name_ui}' 时出错: {str(e)}")
+        log(f"Traceback: {traceback.format_exc()}")
+        return None
+
+
+def create_normal_style(document, style, log=_noop):
+    log("创建正文样式...")
+    n_style = document.styles['Normal']; n_style.font.name = style.normal_font; n_style.font.size = Pt(style.normal_size); n_style.font.bold = style.normal_bold
+    n_style.font.color.rgb = rgb_from_hex(style.normal_color, log)
+
+    # Ensure East Asian font for Normal style as well
+    rFonts_normal = n_style.element.rPr.get_or_add_rFonts()
+    rFonts_normal.set(qn('w:eastAsia'), style.normal_font)
+
+    try:
+        indent_chars_val = int(style.indent_chars)
+    except (TypeError, ValueError):
+        log("警告：首行缩进字符数无效，默认为0。"); indent_chars_val = 0
+
+    # Use a more standard indent calculation: font size * number of characters
+    # For Chinese characters, this is a reasonable approximation.
+    indent_val = Pt(indent_chars_val * style.normal_size) if indent_chars_val > 0 else Pt(0)
+
+    n_style.paragraph_format.first_line_indent = indent_val
+    n_style.paragraph_format.line_spacing_rule = WD_LINE_SPACING.ONE_POINT_FIVE
+    return n_style
+
+
+def _timer(timer):
+    """未传入计时器时使用一个只在本次调用中记录的计时器"""
+    return timer if timer is not None else pipeline_timing.PipelineTimer()
+
+
+def create_document_styles(document, style, log=_noop, timer=None):
+    """在文档中创建文档标题、一至三级标题和正文样式；每个样式的创建作为一个计时阶段"""
+    timer = _timer(timer)
+    log("创建文档样式...")
+    with timer.span("create_style:DocTitleStyle"):
+        create_style(document, 'DocTitleStyle', '文档标题', style.title_font, style.title_size, style.title_bold, style.title_color, log=log)
+    with timer.span("create_style:Heading1Style"):
+        create_style(document, 'Heading1Style', '一级标题', style.h1_font, style.h1_size, style.h1_bold, style.h1_color, level=1, log=log)
+    with timer.span("create_style:Heading2Style"):
+        create_style(document, 'Heading2Style', '二级标题', style.h2_font, style.h2_size, style.h2_bold, style.h2_color, level=2, log=log)
+    with timer.span("create_style:Heading3Style"):
+        create_style(document, 'Heading3Style', '三级标题', style.h3_font, style.h3_size, style.h3_bold, style.h3_color, level=3, log=log)
+    with timer.span("create_style:Normal"):
+        create_normal_style(document, style, log)
+    with timer.span("create_style:TOC", styles=toc_builder.TOC_LEVELS):
+        toc_builder.add_toc_styles(document)
+
+
+def add_toc(document, toc_main_title, style, log=_noop):
+    try:
+        log(f"添加目录标题: {toc_main_title}")
+        p_title = document.add_paragraph()
+        p_title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run_title = p_title.add_run(toc_main_title)
+        run_title.font.name = style.h1_font
+        try:
+            toc_title_size = float(style.h1_size)
+            run_title.font.size = Pt(toc_title_size if toc_title_size > 16 else 16)
+        except (TypeError, ValueError): # Handle case where h1_size is not a valid number
+            run_title.font.size = Pt(16)
+            log("警告: H1字号无效，目录标题字号设为16pt")
+
+        run_title.font.bold = True # TOC title usually bold
+        run_title.font.color.rgb = rgb_from_hex(style.h1_color, log)
+
+        rpr_title = run_title.font.element.get_or_add_rPr()
+        rpr_fonts_title = rpr_title.get_or_add_rFonts()
+        rpr_fonts_title.set(qn('w:eastAsia'), style.h1_font)
+
+        p_title.paragraph_format.space_before = Pt(12)
+        p_title.paragraph_format.space_after = Pt(12)
+
+        log("添加目录字段")
+        paragraph = document.add_paragraph()
+        run = paragraph.add_run()
+        fldChar_begin = OxmlElement('w:fldChar')
+        fldChar_begin.set(qn('w:fldCharType'), 'begin')
+
+        instrText = OxmlElement('w:instrText')
+        instrText.set(qn('xml:space'), 'preserve')
+        instrText.text = r' TOC \o "1-3" \h \z \u '
+
+        fldChar_separate = OxmlElement('w:fldChar')
+        fldChar_separate.set(qn('w:fldCharType'), 'separate')
+
+        fldChar_end = OxmlElement('w:fldChar')
+        fldChar_end.set(qn('w:fldCharType'), 'end')
+
+        run._r.append(fldChar_begin)
+        run._r.append(instrText)
+        run._r.append(fldChar_separate)
+        run._r.append(fldChar_end)
+
+        log("目录添加完成"); return paragraph
+    except Exception as e:
+        log(f"添加目录时出错: {str(e)}")
+        log(f"Traceback: {traceback.format_exc()}")
+        return None
+
+
+def add_user_document_content(document, sections, log=_noop, toc=None, cancel=None):
+    # Builds the w:p elements directly, same XML as add_paragraph
+    write_user_document_content(body_writer.BodyWriter(document), sections, log, toc, cancel)
+
+
+def write_user_document_content(writer, sections, log=_noop, toc=None, cancel=None, span=None):
+    """按章节写入标题和正文段落；writer 为 BodyWriter 或 StreamingBodyWriter
+
+    toc 为 TocBuilder 时在同一遍扫描中为标题加书签并估算页码。
+    cancel 为取消令牌时每个章节之前检查一次，已取消则抛出 Cancelled。
+    span 为计时阶段时每个章节之后按写入的段落数推进进度，最后记录章节、段落和文字块数。
+    """
+    log("开始添加用户定义的文档内容...")
+    start_paragraphs, start_runs = writer.paragraph_count, writer.run_count
+    section_count = reported = 0
+    for sec_item in sections:
+        if cancel is not None: cancel.check()
+        if span is not None and section_count:
+            written = writer.paragraph_count - start_paragraphs
+            span.advance(written - reported); reported = written
+        section_count += 1
+        log(f"添加章节: {sec_item['title']} (级别 {sec_item['level']})", "DEBUG"); style_name = 'Normal'
+        if sec_item['level'] == 1: style_name = 'Heading1Style'
+        elif sec_item['level'] == 2: style_name = 'Heading2Style'
+        elif sec_item['level'] == 3: style_name = 'Heading3Style'
+
+        try:
+            writer.style_id(style_name)
+        except KeyError:
+            log(f"警告：样式 '{style_name}' 未找到，使用 Normal 样式替代。");
+            style_name = 'Normal'
+        bookmark = toc.heading(sec_item['level'], sec_item['title']) if toc else None
+        writer.add_paragraph(sec_item['title'], style_name, bookmark=bookmark)
+
+        if sec_item['content']:
+            content_paragraphs = re.split(r'\n\s*\n', sec_item['content'].strip())
+            for para_text in content_paragraphs:
+                if para_text.strip():
+                    lines = para_text.splitlines()
+                    if lines:
+                        # The first line keeps the 'Normal' first-line indent
+                        writer.add_paragraph(lines[0].strip(), 'Normal', force_run=True)
+                        if toc: toc.paragraph(lines[0].strip())
+
+                        # Subsequent lines of the same original paragraph become their own Normal paragraphs
+                        for line_text in lines[1:]:
+                            if line_text.strip():
+                                writer.add_paragraph(line_text.strip(), 'Normal')
+                                if toc: toc.paragraph(line_text.strip())
+    if span is not None:
+        span.add("sections", section_count)
+        span.add("paragraphs", writer.paragraph_count - start_paragraphs)
+        span.add("runs", writer.run_count - start_runs)
+    log("所有用户定义的内容已添加完成")
+
+
+def header_cache_key(style):
+    """页眉 Logo 对应的模板缓存键部分（文件签名、位置、宽度）；不添加 Logo 或文件不存在时返回 None"""
+    if not style.add_logo or not style.logo_path:
+        return None
+    signature = image_cache.file_signature(style.logo_path)
+    if signature is None:
+        return None
+    return [*signature, style.logo_position, str(style.logo_width_cm)]
+
+
+def template_cached(style, template_cache=None, include_header=False):
+    """new_styled_document 使用的样式模板是否已缓存（用于预估进度）"""
+    template_cache = template_cache or style_template_cache.default_cache
+    header_key = header_cache_key(style) if include_header else None
+    return template_cache.contains(style_template_cache.style_cache_key(style, header=header_key))
+
+
+def new_styled_document(style, log=_noop, timer=None, template_cache=None, include_header=False):
+    """返回已设置页面和样式的新文档；相同样式只构建一次，之后从模板缓存克隆
+
+    include_header=True 时页眉 Logo 也构建进模板，同一 Logo 的文档直接克隆出已含图片的页眉。
+    页面设置、各样式和页眉分别作为 timer 中的计时阶段（命中缓存时没有这些阶段）。
+    """
+    timer = _timer(timer)
+    template_cache = template_cache or style_template_cache.default_cache
+    header_key = header_cache_key(style) if include_header else None
+    built = []
+
+    def build(document):
+        log("设置文档页面格式...")
+        with timer.span("page_setup"):
+            setup_page(document)
+        create_document_styles(document, style, log, timer)
+        if header_key is not None:
+            log("应用页眉设置...")
+            with timer.span("header"):
+                apply_header_settings(document, style, log)
+        built.append(True)
+
+    doc = template_cache.new_document(style_template_cache.style_cache_key(style, header=header_key), build)
+    if not built:
+        log("使用已缓存的样式模板（页面格式、样式" + ("与页眉 Logo " if header_key is not None else "") + "无需重新创建）")
+    if include_header and header_key is None:
+        log("应用页眉设置...")
+        with timer.span("header"):
+            apply_header_settings(doc, style, log) # Only logs why no logo is added
+    return doc
+
+
+def build_document_head(spec, log=_noop, timer=None, template_cache=None):
+    """构建正文之前的部分（页眉、文档标题、目录域和分页符），返回 (document, 目录域段落)"""
+    timer = _timer(timer)
+    with timer.span("template") as span:
+        doc = new_styled_document(spec.style, log, timer, template_cache, include_header=True); log("已创建新文档...")
+        if not any(child.parent is span and child.name == "page_setup" for child in timer.spans):
+            span.add("cached")
+
+    with timer.span("head"):
+        log("添加文档内容..."); log("添加文档标题...")
+        title_p = doc.add_paragraph(spec.document_title, style='DocTitleStyle'); title_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+        log("添加目录...")
+        with timer.span("add_toc"):
+            toc_paragraph = add_toc(doc, spec.toc_title, spec.style, log)
+        doc.add_page_break()
+    return doc, toc_paragraph
+
+
+def _render_toc(toc, toc_paragraph, timer):
+    with timer.span("toc_entries", entries=len(toc.entries)):
+        toc.render(toc_paragraph)
+
+
+def build_document(spec, log=_noop, timer=None, template_cache=None, cancel=None):
+    """按文档描述构建 python-docx Document 对象（不保存），目录条目已预先生成"""
+    timer = _timer(timer)
+    doc, toc_paragraph = build_document_head(spec, log, timer, template_cache)
+    toc = toc_builder.TocBuilder(spec.style)
+    log("添加文档主体内容...")
+    with timer.span("body") as span:
+        write_user_document_content(body_writer.BodyWriter(doc), spec.sections, log, toc, cancel, span)
+    log(f"生成目录条目（{len(toc.entries)} 条，页码为估算值）..."); _render_toc(toc, toc_paragraph, timer)
+    return doc
+
+
+def generate_document(spec, doc_path, log=_noop, progress=_noop, streaming=True, cancel=None, timing_path=None):
+    """无界面生成并保存文档，返回 (doc_path, None) 或 (None, error_message)
+
+    streaming=True 时正文边生成边压缩写入文件（内存占用与文档长度无关），输出与一次性保存相同。
+    目录条目在写正文的同一遍中收集，作为目录域的缓存结果写入，打开文档即可看到目录。
+    cancel 为取消令牌时在各阶段和每个章节之间检查，取消后抛出 Cancelled，不会留下写了一半的文件。
+    各阶段的耗时和计数在完成后写入日志，进度按各阶段实际完成的工作量推进；
+    timing_path 不为空时把计时结果作为一行 JSON 追加到该文件。
+    """
+    timer = pipeline_timing.PipelineTimer(progress)
+    pipeline_timing.plan_generation(timer, spec.sections, template_cached=template_cached(spec.style, include_header=True))
+    try:
+        log("开始文档生成过程...")
+        log(f"文档将保存至: {doc_path}")
+
+        if streaming:
+            doc, toc_paragraph = build_document_head(spec, log, timer)
+            if cancel is not None: cancel.check()
+            toc = toc_builder.TocBuilder(spec.style)
+            log("添加文档主体内容并流式保存文档...")
+
+            def write_body(writer):
+                with timer.span("body") as span:
+                    write_user_document_content(writer, spec.sections, log, toc, cancel, span)
+
+            streaming_docx.save_streaming(doc, doc_path, write_body, finalize=lambda document: _render_toc(toc, toc_paragraph, timer), timer=timer)
+        else:
+            doc = build_document(spec, log, timer, cancel=cancel)
+            if cancel is not None: cancel.check()
+            log("保存文档...")
+            with timer.span("save") as span:
+                doc.save(doc_path)
+                span.add("bytes", os.path.getsize(doc_path))
+        timer.finish()
+        log(f"文档已成功保存至 {doc_path}"); log("目录页码为估算值，如需精确页码，可在Word中右键点击目录选择'更新域'或按F9。")
+        for line in timer.summary_lines():
+            log(line)
+        if timing_path:
+            try:
+                timer.append_json(timing_path, document=doc_path, streaming=streaming)
+            except OSError as e:
+                log(f"警告: 无法写入计时结果 {timing_path}: {e}")
+        return doc_path, None
+    except Exception as e:
+        log(f"错误: {str(e)}")
+        log(f"Traceback: {traceback.format_exc()}")
+        progress(0)
+        return None, f"生成文档时发生错误:\n{str(e)}"
@@ -0,0 +1,105 @@
+"""批量无界面生成 Word 文档
+
+用法示例:
+    python 09_batch_generate.py specs/*.json notices.yaml -o output --config config.ini
+    python 09_batch_generate.py outlines/*.md reports/*.docx -o output
+"""
+import argparse
+import glob
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+doc_spec = importlib.import_module("07_doc_spec")
+docx_engine = importlib.import_module("08_docx_engine")
+style_template_cache = importlib.import_module("10_style_template_cache")
+
+
+def render_spec(spec_dict, base_style_dict, output_dir, verbose=False, template_cache_dir=None, timing_path=None):
+    """在工作进程中渲染单个文档描述，返回 (filename, doc_path, error, elapsed_seconds)"""
+    start = time.perf_counter()
+    if template_cache_dir:
+        style_template_cache.default_cache.cache_dir = template_cache_dir
+    filename = spec_dict.get("filename", "")
+    try:
+        spec = doc_spec.DocumentSpec.from_dict(spec_dict, doc_spec.StyleSpec.from_dict(base_style_dict))
+    except (ValueError, TypeError) as e:
+        return filename, None, f"文档描述无效: {e}", time.perf_counter() - start
+    log = (lambda msg, level=None: print(f"[{spec.filename}] {msg}", flush=True)) if verbose else docx_engine._noop
+    doc_path = os.path.join(output_dir, f"{spec.filename}.docx")
+    saved_path, error = docx_engine.generate_document(spec, doc_path, log=log, timing_path=timing_path)
+    return spec.filename, saved_path, error, time.perf_counter() - start
+
+
+def collect_specs(patterns):
+    """展开通配符并读取全部文档描述，返回 [(来源文件, 描述字典)]"""
+    specs = []
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern)) or [pattern]
+        for path in paths:
+            for spec_dict in doc_spec.load_spec_file(path):
+                specs.append((path, spec_dict))
+    return specs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="根据 JSON/YAML 文档描述或 Markdown/纯文本/Word 大纲批量生成 Word 文档（无需图形界面）")
+    parser.add_argument("specs", nargs="+", help="文档描述文件（支持通配符，.json/.jsonl/.yaml/.yml，大纲 .md/.markdown/.txt/.docx）")
+    parser.add_argument("-o", "--output-dir", default=".", help="输出目录（默认当前目录）")
+    parser.add_argument("--config", default="config.ini", help="读取 DEFAULT_UI_SETTINGS 作为基础样式的配置文件")
+    parser.add_argument("--style", help="JSON 格式的样式覆盖文件，字段名同 config.ini")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="并行进程数（默认每个 CPU 核心一个）")
+    parser.add_argument("--template-cache-dir", help="样式模板的磁盘缓存目录（跨批次复用已构建的样式模板）")
+    parser.add_argument("--timing-file", help="把每个文档的分阶段计时结果追加到此 JSON Lines 文件")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出每个文档的详细生成日志（含分阶段耗时）")
+    args = parser.parse_args(argv)
+
+    base_style = doc_spec.StyleSpec.from_config(args.config)
+    if args.style:
+        with open(args.style, 'r', encoding='utf-8') as f:
+            base_style = base_style.merged(json.load(f))
+
+    try:
+        specs = collect_specs(args.specs)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"读取文档描述失败: {e}", file=sys.stderr)
+        return 2
+    if not specs:
+        print("没有找到任何文档描述。", file=sys.stderr)
+        return 2
+
+    overwrites = [source for source, spec_dict in specs
+                  if os.path.abspath(os.path.join(args.output_dir, f"{spec_dict.get('filename', '')}.docx")) == os.path.abspath(source)]
+    if overwrites:
+        print(f"输出文件会覆盖作为输入的大纲文件，请指定其他输出目录: {', '.join(overwrites)}", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    template_cache_dir = os.path.abspath(args.template_cache_dir) if args.template_cache_dir else None
+    base_style_dict = base_style.to_dict()
+    workers = max(1, min(args.workers, len(specs)))
+    print(f"共 {len(specs)} 个文档，使用 {workers} 个进程生成...")
+
+    start = time.perf_counter()
+    failures = 0
+    timing_path = os.path.abspath(args.timing_file) if args.timing_file else None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(render_spec, spec_dict, base_style_dict, args.output_dir, args.verbose, template_cache_dir, timing_path): source
+                   for source, spec_dict in specs}
+        for done, future in enumerate(as_completed(futures), 1):
+            filename, doc_path, error, elapsed = future.result()
+            if error:
+                failures += 1
+                print(f"[{done}/{len(specs)}] 失败 {filename or futures[future]}: {error}", file=sys.stderr)
+            else:
+                print(f"[{done}/{len(specs)}] {doc_path} ({elapsed:.2f}s)")
+
+    print(f"完成: 成功 {len(specs) - failures}，失败 {failures}，总耗时 {time.perf_counter() - start:.2f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
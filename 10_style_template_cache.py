@@ -0,0 +1,106 @@
+from docx import Document
+from collections import OrderedDict
+import hashlib
+import io
+import json
+import os
+import threading
+
+# 修改样式构建逻辑时递增，使旧的磁盘缓存失效
+TEMPLATE_VERSION = 2 # 2: 增加目录 1~3 级样式
+
+# 不影响 styles.xml 的字段（页眉 Logo 通过 style_cache_key 的 header 参数单独计入）
+_NON_STYLE_FIELDS = {"add_logo", "logo_path", "logo_position", "logo_width_cm"}
+
+
+def style_cache_key(style, kind="engine", header=None):
+    """根据样式字段计算模板缓存键；kind 区分不同的样式构建逻辑，header 为构建进模板的页眉内容标识"""
+    fields = {k: v for k, v in style.to_dict().items() if k not in _NON_STYLE_FIELDS}
+    key_data = {"kind": kind, "version": TEMPLATE_VERSION, "style": fields}
+    if header is not None:
+        key_data["header"] = header
+    payload = json.dumps(key_data,
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class StyleTemplateCache:
+    """已设置好页面和样式的空白 .docx 模板缓存（内存 LRU + 可选磁盘目录）
+
+    每种样式组合只构建一次，之后的文档都从缓存的模板字节克隆，
+    省去每份文档重复创建样式的开销。
+    """
+
+    def __init__(self, max_entries=16, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.docx") if self.cache_dir else None
+
+    def _remember(self, key, blob):
+        with self._lock:
+            self._templates[key] = blob
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+
+    def get_template_bytes(self, key, builder):
+        """返回模板的 .docx 字节；未命中时调用 builder(document) 构建并缓存"""
+        with self._lock:
+            blob = self._templates.get(key)
+            if blob is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return blob
+
+        disk_path = self._disk_path(key)
+        if disk_path and os.path.exists(disk_path):
+            with open(disk_path, 'rb') as f:
+                blob = f.read()
+            with self._lock: self.hits += 1
+            self._remember(key, blob)
+            return blob
+
+        document = Document()
+        builder(document)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        blob = buffer.getvalue()
+        with self._lock: self.misses += 1
+        self._remember(key, blob)
+
+        if disk_path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(blob)
+                os.replace(tmp_path, disk_path) # Atomic so concurrent workers never read a partial file
+            except OSError:
+                pass # The disk cache is only an optimisation
+        return blob
+
+    def contains(self, key):
+        """模板是否已在内存或磁盘缓存中（只用于预估耗时，不计入命中次数）"""
+        with self._lock:
+            if key in self._templates:
+                return True
+        disk_path = self._disk_path(key)
+        return bool(disk_path) and os.path.exists(disk_path)
+
+    def new_document(self, key, builder):
+        """从缓存模板克隆出一个新的 Document"""
+        return Document(io.BytesIO(self.get_template_bytes(key, builder)))
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+# 进程内共享的默认缓存（批量生成时每个工作进程各有一份）
+default_cache = StyleTemplateCache(cache_dir=os.environ.get("DOCX_TEMPLATE_CACHE_DIR") or None)
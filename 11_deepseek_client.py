@@ -0,0 +1,131 @@
+import json
+
+API_URL = "https://api.deepseek.com/chat/completions"
+
+# 分块分析时同时进行的最大请求数
+MAX_CONCURRENT_REQUESTS = 4
+
+# 修改提示词时递增（缓存等功能依赖此版本号区分结果）
+PROMPT_VERSION = 1
+
+SYSTEM_PROMPT = "你是一个专业的文本分析助手，负责识别文本中的标题结构，并严格按照用户指定的JSON格式返回结果。"
+
+# JSON 输出模式（response_format=json_object）只能返回 JSON 对象，章节数组放在 sections 字段中；
+# 回复不再有 Markdown 代码块，max_tokens 调到 deepseek-chat 的上限以减少截断
+JSON_MODE_MAX_TOKENS = 8192
+
+
+class AIAnalysisError(Exception):
+    """AI 标题识别最终失败（已用尽重试或不可重试的错误），消息可直接展示给用户"""
+
+
+def build_user_prompt(text):
+    return f"""
+请分析以下文本，识别其中的标题结构。将结果按如下JSON格式返回：
+```json
+[
+    {{"level": 1, "title": "一级标题1", "content": "一级标题1下的正文内容"}},
+    {{"level": 2, "title": "二级标题1.1", "content": "二级标题1.1下的正文内容"}},
+    {{"level": 1, "title": "一级标题2", "content": "一级标题2下的正文内容"}},
+    ...
+]
+```
+规则：
+1. level 表示标题级别，1为一级标题，2为二级标题，3为三级标题。
+2. 识别标题时考虑格式特征，如数字编号（例如 1. 第一个, 1.1 小节, (一) 部分, A. 点）, 字体大小, 缩进等。
+3. content 是标题下的正文内容，直到下一个同级或更高级别的标题出现之前的所有文本。如果标题下直接是子标题，则其 content 可以为空字符串。
+4. 仅返回JSON格式，不要有其他解释文字或Markdown标记之外的内容。
+5. 确保JSON是有效的，所有字符串都用双引号括起来。
+以下是要分析的文本：
+{text}
+"""
+
+
+def build_json_mode_prompt(text):
+    return f"""
+请分析以下文本，识别其中的标题结构，以 JSON 对象返回结果，格式示例：
+{{"sections": [
+    {{"level": 1, "title": "一级标题1", "content": "一级标题1下的正文内容"}},
+    {{"level": 2, "title": "二级标题1.1", "content": "二级标题1.1下的正文内容"}},
+    {{"level": 1, "title": "一级标题2", "content": "一级标题2下的正文内容"}}
+]}}
+规则：
+1. level 为整数 1、2 或 3，分别表示一级、二级、三级标题。
+2. 识别标题时考虑格式特征，如数字编号（例如 1. 第一个, 1.1 小节, (一) 部分, A. 点）, 字体大小, 缩进等。
+3. content 是标题下的正文内容，直到下一个同级或更高级别的标题出现之前的所有文本。如果标题下直接是子标题，则其 content 为空字符串。
+4. sections 按原文顺序排列。
+以下是要分析的文本：
+{text}
+"""
+
+
+def build_headers(api_key):
+    return {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+
+
+def build_payload(model, text, stream=False, json_mode=False):
+    """构建标题识别请求体；json_mode 为 True 时请求 JSON 输出模式（回复为 {"sections": [...]}）"""
+    prompt = build_json_mode_prompt(text) if json_mode else build_user_prompt(text)
+    data = {"model": model, "messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]}
+    if json_mode:
+        data["response_format"] = {"type": "json_object"}
+        data["max_tokens"] = JSON_MODE_MAX_TOKENS
+    if stream:
+        data["stream"] = True
+        data["stream_options"] = {"include_usage": True}
+    return data
+
+
+SSE_DONE = object() # parse_sse_line 遇到 [DONE] 时的返回值
+
+
+def parse_sse_line(raw_line):
+    """解析一行 SSE：返回 data 字段解码后的 JSON 对象、SSE_DONE，或 None（空行、注释、非 data 行、无效 JSON）"""
+    line = raw_line.decode('utf-8') if isinstance(raw_line, bytes) else raw_line
+    line = line.strip()
+    if not line or line.startswith(':'): # 空行为事件分隔，冒号开头为 keep-alive 注释
+        return None
+    if not line.startswith('data:'):
+        return None
+    payload = line[5:].strip()
+    if payload == '[DONE]':
+        return SSE_DONE
+    try:
+        return json.loads(payload)
+    except json.JSONDecodeError:
+        return None
+
+
+def iter_sse_events(lines):
+    """解析 SSE 行流，逐个返回 data 字段解码后的 JSON 对象，遇到 [DONE] 结束"""
+    for raw_line in lines:
+        event = parse_sse_line(raw_line)
+        if event is SSE_DONE:
+            return
+        if event is not None:
+            yield event
+
+
+def stream_delta(event):
+    """从一个流式事件中取出 (content_delta, usage)；两者都没有时返回 None"""
+    usage = event.get('usage')
+    choices = event.get('choices') or []
+    delta = (choices[0].get('delta') or {}).get('content') if choices else None
+    if delta or usage:
+        return delta or "", usage
+    return None
+
+
+def iter_stream_deltas(response):
+    """从流式响应中逐个返回 (content_delta, usage)；usage 仅在最后一个事件中出现"""
+    for event in iter_sse_events(response.iter_lines()):
+        item = stream_delta(event)
+        if item is not None:
+            yield item
+
+
+def response_content(result):
+    """非流式响应中第一个候选的文本内容；结构不完整时返回 None"""
+    if not result.get('choices') or not result['choices'][0].get('message') or not result['choices'][0]['message'].get('content'):
+        return None
+    return result['choices'][0]['message']['content']
@@ -0,0 +1,275 @@
+import json
+import re
+
+# 模型回复常见的 JSON 缺陷：字符串中未转义的引号或换行、末尾多余的逗号、单引号、
+# 未加引号的键、Python 字面量、注释，以及回复被截断。这里尽量修复而不是整体丢弃重试。
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_DANGLING_KEY = re.compile(r'([,{])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$') # A key (after { or ,) with no value yet
+
+
+def _next_char(text, i):
+    """i 之后第一个非空白、非注释字符的位置（没有时返回 len(text)）"""
+    n = len(text)
+    while i < n:
+        if text[i].isspace():
+            i += 1
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end < 0 else end
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+        else:
+            break
+    return i
+
+
+def _closes_string(text, i):
+    """引号后面是逗号、冒号、右括号或文本结尾时才视为字符串结束，否则按正文中的引号处理"""
+    j = _next_char(text, i)
+    return j >= len(text) or text[j] in ',:}]'
+
+
+def repair_json_text(text):
+    """修复常见的 JSON 缺陷并返回新文本（不保证结果有效，由调用方再次解析）"""
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch in '"\'':
+            quote = ch
+            out.append('"')
+            i += 1
+            while i < n:
+                ch = text[i]
+                if ch == '\\' and i + 1 < n:
+                    out.append("'" if quote == "'" and text[i + 1] == "'" else text[i:i + 2]) # \' is not a JSON escape
+                    i += 2
+                    continue
+                if ch == quote and _closes_string(text, i + 1):
+                    break
+                out.append('\\"' if ch == '"' else ch)
+                i += 1
+            out.append('"')
+            i += 1
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end < 0 else end
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+        elif ch == ',' and (_next_char(text, i + 1) >= n or text[_next_char(text, i + 1)] in '}]'):
+            i += 1 # Trailing comma
+        elif ch.isalpha() or ch == '_':
+            word = _WORD.match(text, i).group()
+            i += len(word)
+            if word in _LITERALS:
+                out.append(_LITERALS[word])
+            elif _next_char(text, i) < n and text[_next_char(text, i)] == ':':
+                out.append(f'"{word}"') # Unquoted key
+            else:
+                out.append(word)
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+
+def close_truncated(text):
+    """补全被截断的 JSON：闭合未结束的字符串，去掉悬空的键或逗号，再补上缺少的右括号"""
+    closers = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape: escape = False
+            elif ch == '\\': escape = True
+            elif ch == '"': in_string = False
+        elif ch == '"': in_string = True
+        elif ch == '{': closers.append('}')
+        elif ch == '[': closers.append(']')
+        elif ch in '}]' and closers: closers.pop()
+    if escape:
+        text = text[:-1]
+    if in_string:
+        text += '"'
+    if closers and closers[-1] == '}':
+        text = _DANGLING_KEY.sub(lambda match: '{' if match.group(1) == '{' else '', text)
+    return text.rstrip().rstrip(',') + ''.join(reversed(closers))
+
+
+def decode_object(text):
+    """解析一个对象的文本，返回 (对象, 是否经过修复)；无法解析时返回 (None, False)"""
+    try:
+        return json.loads(text, strict=False), False # strict=False accepts raw newlines and tabs inside strings
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(repair_json_text(text), strict=False), True
+    except json.JSONDecodeError:
+        return None, False
+
+
+def is_section(obj):
+    return isinstance(obj, dict) and bool(obj.get("title")) and obj.get("level") is not None
+
+
+SECTION_LEVELS = (1, 2, 3)
+
+
+class SectionSchemaError(ValueError):
+    """回复的整体结构不符合章节格式（没有章节数组）"""
+
+
+def _section_level(value):
+    """把 level 转为整数；不是 1~3 的整数（或整数字符串）时返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value.strip())
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return value if isinstance(value, int) and value in SECTION_LEVELS else None
+
+
+def validate_sections(data):
+    """按章节结构校验 JSON 输出模式的回复（{"sections": [...]}，也接受直接的数组）
+
+    返回 (有效章节列表, 问题说明列表)；章节统一为 {"level": int, "title": str, "content": str}。
+    没有章节数组时抛出 SectionSchemaError。
+    """
+    if isinstance(data, dict):
+        data = data.get("sections")
+    if not isinstance(data, list):
+        raise SectionSchemaError("回复中没有 sections 数组")
+    sections, problems = [], []
+    for index, item in enumerate(data, 1):
+        if not isinstance(item, dict):
+            problems.append(f"第 {index} 项不是对象: {str(item)[:100]}"); continue
+        level = _section_level(item.get("level"))
+        title = item.get("title")
+        content = item.get("content")
+        if level is None:
+            problems.append(f"第 {index} 项的 level 不是 1~3 的整数: {str(item)[:100]}"); continue
+        if not isinstance(title, str) or not title.strip():
+            problems.append(f"第 {index} 项缺少标题: {str(item)[:100]}"); continue
+        if content is not None and not isinstance(content, str):
+            problems.append(f"第 {index} 项的 content 不是字符串: {str(item)[:100]}"); continue
+        sections.append({"level": level, "title": title.strip(), "content": content or ""})
+    return sections, problems
+
+
+class SectionArrayParser:
+    """增量解析模型流式返回的章节 JSON 数组
+
+    每次 feed() 传入新收到的文本片段，返回其中已经闭合的顶层对象列表。
+    数组之前的 ```json 等前缀文本会被忽略，遇到顶层的 ] 后停止解析。
+    无法直接解析的对象先尝试修复（记入 repaired），仍失败的记入 errors；
+    回复结束后调用 finish() 补全被截断的最后一个对象。
+    """
+
+    def __init__(self):
+        self._buffer = []       # 当前对象已收到的字符
+        self._depth = 0         # 0: 数组外, 1: 数组内, >=2: 对象内
+        self._in_string = False
+        self._escape = False
+        self._objects = 0       # 当前数组中已闭合的对象数
+        self.finished = False
+        self.truncated = False  # 回复在数组结束前中断
+        self.errors = []        # 无法解析而丢弃的对象文本（截断后保存）
+        self.repaired = []      # 经过修复才能解析的对象文本（截断后保存）
+
+    def feed(self, chunk):
+        sections = []
+        for ch in chunk:
+            if self.finished:
+                break
+            if self._depth >= 2:
+                self._buffer.append(ch)
+                if self._in_string:
+                    if self._escape: self._escape = False
+                    elif ch == '\\': self._escape = True
+                    elif ch == '"': self._in_string = False
+                    continue
+                if ch == '"': self._in_string = True
+                elif ch in '{[': self._depth += 1
+                elif ch in '}]':
+                    self._depth -= 1
+                    if self._depth == 1:
+                        obj = self._decode(''.join(self._buffer))
+                        self._buffer = []
+                        self._objects += 1
+                        if obj is not None:
+                            sections.append(obj)
+            elif self._depth == 1:
+                if ch == '{':
+                    self._depth = 2
+                    self._buffer = [ch]
+                elif ch == ']':
+                    # A bracket pair in prose before the array (e.g. "[注]") is not the section array
+                    self._depth = 0
+                    self.finished = self._objects > 0
+            elif ch == '[':
+                self._depth = 1
+        return sections
+
+    def finish(self):
+        """回复结束时调用：补全并返回被截断的最后一个章节（列表，最多一个元素）"""
+        if self.finished or not self.started:
+            return []
+        self.truncated = True
+        if self._depth < 2 or not self._buffer:
+            return []
+        text = ''.join(self._buffer)
+        self._buffer = []
+        self._depth = 1
+        obj, _ = decode_object(close_truncated(text))
+        if not is_section(obj):
+            self.errors.append(text[:200])
+            return []
+        self.repaired.append(text[:200])
+        return [obj]
+
+    def _decode(self, text):
+        obj, repaired = decode_object(text)
+        if obj is None:
+            self.errors.append(text[:200])
+        elif repaired:
+            self.repaired.append(text[:200])
+        return obj
+
+    @property
+    def started(self):
+        return self._depth > 0 or self.finished or self._objects > 0
+
+    @property
+    def complete(self):
+        """数组完整结束且没有丢弃或修复过的对象"""
+        return self.finished and not self.errors and not self.repaired
+
+
+class SectionParseResult:
+    """parse_sections 的结果：恢复出的章节以及被丢弃、修复的对象"""
+
+    def __init__(self, sections, parser):
+        self.sections = sections
+        self.dropped = list(parser.errors)
+        self.repaired = list(parser.repaired)
+        self.truncated = parser.truncated
+        self.complete = parser.complete
+
+    def summary(self):
+        parts = [f"恢复 {len(self.sections)} 个章节"]
+        if self.repaired: parts.append(f"修复 {len(self.repaired)} 个")
+        if self.dropped: parts.append(f"丢弃 {len(self.dropped)} 个")
+        if self.truncated: parts.append("回复被截断")
+        return "，".join(parts)
+
+
+def parse_sections(text):
+    """从完整的模型回复中取出章节数组中可以恢复的最长前缀（忽略数组前后的说明文字）"""
+    parser = SectionArrayParser()
+    sections = parser.feed(text)
+    sections.extend(parser.finish())
+    return SectionParseResult(sections, parser)
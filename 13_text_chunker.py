@@ -0,0 +1,236 @@
+import argparse
+import random
+import re
+import threading
+import zlib
+
+# 每块的最大字符数：模型需要在输出中复述正文，块过大时输出会超过单次回复的 token 上限
+DEFAULT_MAX_CHARS = 4000
+
+# 切分点的得分只取行首这么多个字符：修改段落中间的文字不会移动切分点
+BOUNDARY_PREFIX_CHARS = 16
+
+# 用于选择切分位置的标题特征（与提示词中列出的编号格式一致）
+_HEADING_HINT = re.compile(
+    r'^\s*(第[一二三四五六七八九十百零\d]+[章节部分篇]'
+    r'|[一二三四五六七八九十百]+、'
+    r'|[（(][一二三四五六七八九十百]+[)）]'
+    r'|\d+(\.\d+)*[.、．]?\s'
+    r'|\d+(\.\d+)+'
+    r'|[A-Z][.、．])')
+
+
+def looks_like_heading(line):
+    stripped = line.strip()
+    return bool(stripped) and len(stripped) <= 60 and bool(_HEADING_HINT.match(stripped))
+
+
+def _hard_split(line, max_chars):
+    return [line[i:i + max_chars] for i in range(0, len(line), max_chars)]
+
+
+def _boundary_weight(lines, index):
+    """在 lines[index] 之前切分的倾向：标题行最高，空行之后的段落其次，普通换行最低"""
+    if looks_like_heading(lines[index]):
+        return 4
+    if index and not lines[index - 1].strip():
+        return 2
+    return 1
+
+
+def _boundary_score(line):
+    """由行首内容决定的 [0, 1) 伪随机数（与文本其他部分和运行环境无关）"""
+    return zlib.crc32(line.strip()[:BOUNDARY_PREFIX_CHARS].encode('utf-8')) / 2 ** 32
+
+
+def _cut_units(lines, starts, offsets, total, min_chars):
+    """选出切分的单元：得分（哈希值除以权重）在前后 min_chars 个字符内最小的单元
+
+    相邻切分点至少相隔 min_chars，且每个切分点只取决于它前后 min_chars 以内的内容。
+    """
+    scores = [(_boundary_score(lines[start]) / _boundary_weight(lines, start), unit) for unit, start in enumerate(starts)]
+    cuts = []
+    low = 0
+    for unit in range(1, len(starts)):
+        if offsets[unit] < min_chars or total - offsets[unit] < min_chars:
+            continue
+        while offsets[unit] - offsets[low] >= min_chars:
+            low += 1
+        high = unit
+        while high + 1 < len(starts) and offsets[high + 1] - offsets[unit] < min_chars:
+            high += 1
+        if all(scores[unit] < scores[other] for other in range(max(low, 1), high + 1) if other != unit):
+            cuts.append(unit)
+    return cuts
+
+
+def split_text(text, max_chars=DEFAULT_MAX_CHARS, overlap_chars=200, min_chars=None):
+    """按内容决定的段落/标题边界把长文本切成若干块
+
+    候选切分点为每个非空行之前，得分由行内容的哈希值决定（标题行优先，其次是空行之后的段落）；
+    在前后 min_chars（默认 max_chars 的三分之一）个字符内得分最小的候选点处切分。
+    切分点与块的累计长度无关，修改一个段落只影响它所在的块和相邻块，其余块的文本不变，
+    按块的识别缓存仍能命中。两个切分点之间超过 max_chars 时在其间按行补充切分。
+    每块开头附带上一块末尾不超过 overlap_chars 的完整行作为上下文，重复识别出的章节由 SectionStitcher 去重。
+    """
+    lines = []
+    for line in text.splitlines():
+        lines.extend(_hard_split(line, max_chars) if len(line) > max_chars else [line])
+    if sum(len(line) + 1 for line in lines) <= max_chars:
+        return [text]
+    min_chars = max_chars // 3 if min_chars is None else min_chars
+
+    # Each unit is a non-blank line plus the blank lines after it; chunks only start at a unit
+    starts = [i for i, line in enumerate(lines) if line.strip()]
+    if not starts:
+        return []
+    starts[0] = 0
+    sizes = [sum(len(line) + 1 for line in lines[begin:end]) for begin, end in zip(starts, starts[1:] + [len(lines)])]
+    offsets = [0]
+    for size in sizes[:-1]:
+        offsets.append(offsets[-1] + size)
+
+    bounds = []
+    cuts = [0] + _cut_units(lines, starts, offsets, sum(sizes), min_chars)
+    for begin, end in zip(cuts, cuts[1:] + [len(starts)]):
+        bounds.append(starts[begin])
+        size = sizes[begin]
+        for unit in range(begin + 1, end): # Rare gap longer than max_chars: split it between lines
+            if size + sizes[unit] > max_chars:
+                bounds.append(starts[unit])
+                size = 0
+            size += sizes[unit]
+
+    chunks = []
+    for start, end in zip(bounds, bounds[1:] + [len(lines)]):
+        overlap_start = start
+        if chunks and overlap_chars:
+            # Extend backwards over whole lines of the previous chunk as context
+            overlap_size = 0
+            while overlap_start > 0 and overlap_size + len(lines[overlap_start - 1]) + 1 <= overlap_chars:
+                overlap_size += len(lines[overlap_start - 1]) + 1
+                overlap_start -= 1
+
+        chunk_text = "\n".join(lines[overlap_start:end]).strip()
+        if chunk_text:
+            chunks.append(chunk_text)
+    return chunks
+
+
+def _normalize_title(title):
+    return re.sub(r'\s+', '', str(title or ''))
+
+
+class SectionStitcher:
+    """按块顺序拼接各块识别出的章节，去掉重叠部分产生的重复章节并修正级别跳跃
+
+    各块的结果可以乱序到达（并发请求），emit 回调总是按原文顺序被调用。
+    前面的块全部完成之前，后面块的章节会被暂存。
+    """
+
+    def __init__(self, chunk_count, emit, dedupe_window=3):
+        self.chunk_count = chunk_count
+        self.emit = emit
+        self.dedupe_window = dedupe_window
+        self._pending = [[] for _ in range(chunk_count)]
+        self._finished = [False] * chunk_count
+        self._head = 0                  # 当前可以直接输出的块
+        self._recent_titles = []        # 上一块末尾输出的标题，用于去重
+        self._chunk_titles = []         # 当前块已输出的标题
+        self._chunk_emitted = 0         # 当前块已输出（或丢弃）的章节数
+        self._prev_level = 0
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def add(self, chunk_index, section):
+        with self._lock:
+            if chunk_index == self._head:
+                self._emit(section)
+            else:
+                self._pending[chunk_index].append(section)
+
+    def finish_chunk(self, chunk_index):
+        with self._lock:
+            self._finished[chunk_index] = True
+            while self._head < self.chunk_count and self._finished[self._head]:
+                self._recent_titles = self._chunk_titles[-self.dedupe_window:]
+                self._chunk_titles = []
+                self._chunk_emitted = 0
+                self._head += 1
+                if self._head < self.chunk_count:
+                    for section in self._pending[self._head]:
+                        self._emit(section)
+                    self._pending[self._head] = []
+
+    def _emit(self, section):
+        self._chunk_emitted += 1
+        if isinstance(section, dict):
+            title = _normalize_title(section.get('title'))
+            # Only the first few sections of a chunk can come from the overlap
+            if self._chunk_emitted <= self.dedupe_window and title and title in self._recent_titles:
+                self.duplicates += 1
+                return
+            try:
+                level = int(section.get('level'))
+                if level > self._prev_level + 1:
+                    section = dict(section, level=self._prev_level + 1)
+                    level = self._prev_level + 1
+                self._prev_level = level
+            except (TypeError, ValueError):
+                pass # Left for the importer to report
+            self._chunk_titles.append(title)
+        self.emit(section)
+
+
+def merge_chunk_sections(chunk_results):
+    """把按块顺序排列的章节列表合并为一个列表"""
+    merged = []
+    stitcher = SectionStitcher(len(chunk_results), merged.append)
+    for index, sections in enumerate(chunk_results):
+        for section in sections or []:
+            stitcher.add(index, section)
+        stitcher.finish_chunk(index)
+    return merged
+
+
+def _synthetic_text(sections, seed=0):
+    rng = random.Random(seed)
+    words = "各单位要高度重视认真组织落实按照统一部署结合实际制定具体方案明确责任分工确保各项任务按期完成"
+    parts = []
+    for i in range(sections):
+        parts.append(f"{i + 1}. " + "".join(rng.choice(words) for _ in range(rng.randint(6, 16))))
+        for _ in range(rng.randint(1, 5)):
+            parts.append("".join(rng.choice(words) for _ in range(rng.randint(40, 400))) + "。")
+    return parts
+
+
+def main(argv=None):
+    """自检：修改任意一个段落（插入不同长度的文字）后，除所在块及其重叠相邻块外，其余块的文本都不变"""
+    parser = argparse.ArgumentParser(description="长文本切块稳定性自检")
+    parser.add_argument("--sections", type=int, default=150, help="合成文本的章节数（默认 150）")
+    parser.add_argument("--edits", type=int, default=200, help="随机修改次数（默认 200）")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    failures = 0
+    for separator in ("\n\n", "\n"):
+        paragraphs = _synthetic_text(args.sections)
+        chunks = split_text(separator.join(paragraphs))
+        body = [i for i, paragraph in enumerate(paragraphs) if not looks_like_heading(paragraph)]
+        worst = 0
+        for _ in range(args.edits):
+            index, inserted = rng.choice(body), rng.choice((10, 150, 600, 2000))
+            edited = list(paragraphs)
+            position = rng.randint(0, len(edited[index]))
+            edited[index] = edited[index][:position] + "插" * inserted + edited[index][position:]
+            lost = len(set(chunks) - set(split_text(separator.join(edited))))
+            worst = max(worst, lost)
+            failures += lost > 2
+        print(f"段落间隔 {separator!r}: {len(chunks)} 块，平均 {sum(map(len, chunks)) // len(chunks)} 字符，"
+              f"修改一个段落最多改变 {worst} 个原有块")
+    print("通过" if not failures else f"失败: {failures} 次修改改变了超过 2 个原有块")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
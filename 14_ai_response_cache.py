@@ -0,0 +1,91 @@
+import contextlib
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_FILE = "ai_cache.sqlite3"
+
+
+def normalize_text(text):
+    """忽略行尾空白和首尾空行的差异，避免无意义的改动导致缓存未命中"""
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+def cache_key(model, prompt_version, text):
+    digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return f"{model}:{prompt_version}:{digest}"
+
+
+class AIResponseCache:
+    """按 (模型, 提示词版本, 文本哈希) 缓存 AI 标题识别得到的章节列表（SQLite 存储）
+
+    超过 ttl_seconds 未更新的条目视为过期；条目数或总大小超限时按最近使用时间淘汰。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_entries=2000, max_bytes=64 * 1024 * 1024, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                sections TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created REAL NOT NULL,
+                                last_used REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn: # Commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, model, prompt_version, text):
+        """命中时返回章节列表，否则返回 None"""
+        key = cache_key(model, prompt_version, text)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT sections, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        try:
+            return json.loads(row[0])
+        except json.JSONDecodeError:
+            return None
+
+    def put(self, model, prompt_version, text, sections):
+        key = cache_key(model, prompt_version, text)
+        payload = json.dumps(sections, ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, sections, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                         (key, payload, len(payload.encode('utf-8')), now, now))
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        count, total_size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total_size <= self.max_bytes:
+            return
+        freed_count, freed_size = 0, 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if count - freed_count <= self.max_entries and total_size - freed_size <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            freed_count += 1; freed_size += size
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
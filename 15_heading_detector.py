@@ -0,0 +1,183 @@
+import re
+
+# 本地规则标题识别：单次线性扫描，按编号格式判断标题及其级别。
+# 编号格式（"体系"）的级别由出现顺序决定：新体系出现时作为当前标题的下一级，
+# 已出现过的体系再次出现时回到它原来的级别，例如 一、→（一）→ 1. →（1）或 1 → 1.1 → 1.1.1。
+
+_CN_DIGITS = {'零': 0, '〇': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_CN_NUM = r'[一二三四五六七八九十百零〇两]+'
+
+# (体系名, 正则)；正则的第 1 组为编号，最后一组为标题文字
+_PATTERNS = [
+    ('chapter', re.compile(rf'^第({_CN_NUM}|\d+)[章篇]\s*(.*)$')),
+    ('part', re.compile(rf'^第({_CN_NUM}|\d+)部分\s*(.*)$')),
+    ('jie', re.compile(rf'^第({_CN_NUM}|\d+)节\s*(.*)$')),
+    ('cn_dun', re.compile(rf'^({_CN_NUM})[、.．]\s*(.*)$')),
+    ('cn_paren', re.compile(rf'^[（(]({_CN_NUM})[)）]\s*(.*)$')),
+    ('arabic_multi', re.compile(r'^(\d+(?:[.．]\d+)+)[.、．]?\s*(.*)$')),
+    ('arabic', re.compile(r'^(\d+)(?:[.、．]\s*|\s+)(.*)$')),
+    ('arabic_paren', re.compile(r'^[（(](\d+)[)）]\s*(.*)$')),
+    ('latin', re.compile(r'^([A-Z])[.、．]\s*(.*)$')),
+]
+
+MAX_TITLE_CHARS = 40
+_SENTENCE_END = '。；;！？!?'
+
+
+def cn_to_int(text):
+    """把一、十二、二十三、一百零五等中文数字转为整数"""
+    if text.isdigit():
+        return int(text)
+    total, current = 0, 0
+    for ch in text:
+        if ch == '百':
+            total += (current or 1) * 100; current = 0
+        elif ch == '十':
+            total += (current or 1) * 10; current = 0
+        elif ch in _CN_DIGITS:
+            current = _CN_DIGITS[ch]
+        else:
+            return None
+    return total + current
+
+
+def _parse_number(family, number_text):
+    if family == 'latin':
+        return ord(number_text) - ord('A') + 1
+    if family == 'arabic_multi':
+        return int(re.split(r'[.．]', number_text)[-1])
+    return cn_to_int(number_text)
+
+
+def classify_line(line):
+    """判断一行是否为编号标题，返回 (体系, 序号, 标题, 行内正文) 或 None
+
+    "（一）加强组织领导。各地区要……" 这类标题与正文同行的写法会在第一个句号处拆开。
+    编号后文字过长又无法拆分的行（更像编号列表中的正文）返回 ('ambiguous', ...)。
+    """
+    stripped = line.strip()
+    if not stripped:
+        return None
+    for family, pattern in _PATTERNS:
+        match = pattern.match(stripped)
+        if not match:
+            continue
+        title_text = match.group(match.lastindex).strip()
+        if not title_text:
+            return None
+        number = _parse_number(family, match.group(1))
+        if number is None:
+            return None
+        if family == 'arabic_multi':
+            family = f"arabic_{len(re.split(r'[.．]', match.group(1)))}"
+        if len(stripped) <= MAX_TITLE_CHARS and stripped[-1] not in _SENTENCE_END:
+            return family, number, stripped, ""
+        cut = stripped.find('。')
+        if 0 < cut <= MAX_TITLE_CHARS:
+            return family, number, stripped[:cut], stripped[cut + 1:].strip()
+        return 'ambiguous', number, stripped, ""
+    return None
+
+
+class DetectionResult:
+    def __init__(self, sections, heading_count, sequence_errors, ambiguous_lines, too_deep):
+        self.sections = sections
+        self.heading_count = heading_count
+        self.sequence_errors = sequence_errors
+        self.ambiguous_lines = ambiguous_lines
+        self.too_deep = too_deep
+
+    @property
+    def confident(self):
+        """标题数量足够、编号连续且歧义行很少时认为本地识别可靠"""
+        if self.heading_count < 2:
+            return False
+        tolerance = max(1, self.heading_count // 10)
+        return (self.sequence_errors <= tolerance and self.ambiguous_lines <= max(1, self.heading_count // 5)
+                and self.too_deep <= tolerance)
+
+    def summary(self):
+        return (f"标题 {self.heading_count} 个，编号不连续 {self.sequence_errors} 处，"
+                f"歧义行 {self.ambiguous_lines} 行，超过三级 {self.too_deep} 处")
+
+
+def detect_sections(text):
+    """单次扫描识别标题结构，返回 DetectionResult，sections 格式与 AI 结果相同: [{level, title, content}]"""
+    result = DetectionResult([], 0, 0, 0, 0)
+    result.sections = list(iter_sections(text.splitlines(), result))
+    return result
+
+
+def iter_sections(lines, counts):
+    """逐行扫描并逐个产出章节（下一个标题出现时产出上一个章节），统计数字累加到 counts 的同名属性上
+
+    counts 需要有 heading_count、sequence_errors、ambiguous_lines、too_deep 四个属性（如 DetectionResult）。
+    """
+    preamble = []
+    stack = []          # [[体系, 上一个序号]]，下标 + 1 即级别
+    current = None
+    body = preamble
+
+    for line in lines:
+        classified = classify_line(line)
+        if classified is None:
+            body.append(line.strip())
+            continue
+        family, number, title, inline_body = classified
+        if family == 'ambiguous':
+            counts.ambiguous_lines += 1
+            body.append(line.strip())
+            continue
+
+        depth = next((i for i, entry in enumerate(stack) if entry[0] == family), None)
+        if depth is None:
+            if number != 1:
+                counts.sequence_errors += 1
+            depth = len(stack)
+            stack.append([family, number])
+        else:
+            if number != stack[depth][1] + 1:
+                counts.sequence_errors += 1
+            del stack[depth + 1:]
+            stack[depth][1] = number
+
+        if depth >= 3:
+            counts.too_deep += 1 # Deeper than 三级标题, keep as body text
+            body.append(line.strip())
+            continue
+
+        counts.heading_count += 1
+        if current is not None:
+            yield _finish_section(current)
+        elif preamble:
+            section = preamble_section(preamble)
+            if section is not None:
+                yield section
+        body = [inline_body] if inline_body else []
+        current = {'level': depth + 1, 'title': title, 'body': body}
+
+    if current is not None:
+        yield _finish_section(current)
+    else:
+        section = preamble_section(preamble)
+        if section is not None:
+            yield section
+
+
+def _finish_section(section):
+    return {'level': section['level'], 'title': section['title'], 'content': _join_body(section['body'])}
+
+
+def preamble_section(lines):
+    """第一个标题之前的正文作为一级章节：首行为标题，其余为内容；没有正文时返回 None"""
+    preamble_text = _join_body(lines)
+    if not preamble_text:
+        return None
+    first_line, _, rest = preamble_text.partition('\n')
+    return {'level': 1, 'title': first_line.strip(), 'content': rest.strip()}
+
+
+def _join_body(lines):
+    """合并正文行，连续空行压缩为一个空行（段落分隔）"""
+    text = "\n".join(lines)
+    return re.sub(r'\n\s*\n+', '\n\n', text).strip()
@@ -0,0 +1,67 @@
+class TreeSync:
+    """按差异增量更新 ttk.Treeview，只插入、移动、修改或删除发生变化的行
+
+    内部记录上一次渲染的行，比较时无需逐项查询 Tk，整棵树不再每次清空重建。
+    """
+
+    def __init__(self, tree, parent=""):
+        self.tree = tree
+        self.parent = parent
+        self._order = []    # 当前显示顺序中的 iid
+        self._rows = {}     # iid -> (text, values)
+
+    def reset(self):
+        """清空 Treeview 和记录（外部直接改动了树时使用）"""
+        if self._order:
+            self.tree.delete(*self._order)
+        self._order = []
+        self._rows = {}
+
+    def rendered(self):
+        """当前显示顺序中的 iid 列表"""
+        return list(self._order)
+
+    def discard(self, iids):
+        """删除指定的行（Tk 会一并删除它们的下级行）"""
+        iids = [iid for iid in iids if iid in self._rows]
+        if iids:
+            self.tree.delete(*iids)
+            for iid in iids:
+                del self._rows[iid]
+            self._order = [iid for iid in self._order if iid in self._rows]
+
+    def sync(self, rows):
+        """rows 为按显示顺序排列的 (iid, text, values)，返回实际执行的 Tk 操作数"""
+        rows = list(rows)
+        wanted = {iid for iid, _, _ in rows}
+        operations = 0
+
+        stale = [iid for iid in self._order if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale) # One Tk call for all removed rows
+            for iid in stale:
+                del self._rows[iid]
+            operations += 1
+        current = [iid for iid in self._order if iid in wanted] if stale else self._order
+
+        for index, (iid, text, values) in enumerate(rows):
+            row = (text, tuple(values))
+            previous = self._rows.get(iid)
+            if previous is None:
+                self.tree.insert(self.parent, index, iid, text=text, values=values)
+                current.insert(index, iid)
+                operations += 1
+            else:
+                if current[index] != iid:
+                    self.tree.move(iid, self.parent, index)
+                    current.remove(iid)
+                    current.insert(index, iid)
+                    operations += 1
+                if previous != row:
+                    self.tree.item(iid, text=text, values=values)
+                    operations += 1
+            self._rows[iid] = row
+
+        self._order = current
+        return operations
+
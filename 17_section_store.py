@@ -0,0 +1,172 @@
+import itertools
+
+
+class SectionRecord:
+    """章节记录（__slots__ 紧凑存储），支持 section['title'] 形式读写，兼容原来的字典用法"""
+    __slots__ = ('id', 'level', 'title', 'content', '_prev', '_next')
+    FIELDS = ('id', 'level', 'title', 'content')
+
+    def __init__(self, section_id, level, title, content=""):
+        self.id = section_id
+        self.level = level
+        self.title = title
+        self.content = content
+        self._prev = self._next = None
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS: raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS: raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def update(self, values=(), **kwargs):
+        for key, value in dict(values, **kwargs).items():
+            self[key] = value
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def __repr__(self):
+        return f"SectionRecord({self.id!r}, level={self.level!r}, title={self.title!r})"
+
+
+class SectionStore:
+    """有序章节集合：id -> 记录的字典 + 双向链表
+
+    按 id 查找、删除、插入到某章节之后、上下移动均为 O(1)，迭代按文档顺序进行。
+    """
+
+    def __init__(self, sections=None, id_prefix="section_"):
+        self._by_id = {}
+        self._root = SectionRecord(None, 0, "") # Sentinel of the circular list
+        self._root._prev = self._root._next = self._root
+        self._id_counter = itertools.count(1)
+        self.id_prefix = id_prefix
+        if sections:
+            self.extend((s['level'], s['title'], s.get('content', "")) for s in sections)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        node = self._root._next
+        while node is not self._root:
+            next_node = node._next # Allows removing the current record while iterating
+            yield node
+            node = next_node
+
+    def __contains__(self, section_id):
+        return section_id in self._by_id
+
+    def get(self, section_id):
+        return self._by_id.get(section_id)
+
+    def first(self):
+        return self._root._next if self._by_id else None
+
+    def after(self, record):
+        """返回 record 之后的章节，已是最后一个时返回 None"""
+        return None if record._next is self._root else record._next
+
+    def before(self, record):
+        """返回 record 之前的章节，已是第一个时返回 None"""
+        return None if record._prev is self._root else record._prev
+
+    def new_id(self):
+        section_id = f"{self.id_prefix}{next(self._id_counter)}"
+        while section_id in self._by_id: # Ids supplied by the caller may collide with generated ones
+            section_id = f"{self.id_prefix}{next(self._id_counter)}"
+        return section_id
+
+    def _link_after(self, node, anchor):
+        node._prev, node._next = anchor, anchor._next
+        anchor._next._prev = node
+        anchor._next = node
+
+    def _unlink(self, node):
+        node._prev._next = node._next
+        node._next._prev = node._prev
+        node._prev = node._next = None
+
+    def _anchor(self, after_id):
+        if after_id is None:
+            return self._root._prev
+        anchor = self._by_id.get(after_id)
+        if anchor is None: raise KeyError(after_id)
+        return anchor
+
+    def add(self, level, title, content="", after_id=None, section_id=None):
+        """添加章节，after_id 为 None 时追加到末尾，否则插入到该章节之后；返回新记录"""
+        anchor = self._anchor(after_id)
+        if section_id is None:
+            section_id = self.new_id()
+        elif section_id in self._by_id:
+            raise KeyError(f"章节 id 重复: {section_id}")
+        node = SectionRecord(section_id, level, title, content)
+        self._by_id[section_id] = node
+        self._link_after(node, anchor)
+        return node
+
+    def extend(self, items):
+        """批量追加 (level, title, content) 章节，返回新记录列表"""
+        return [self.add(level, title, content) for level, title, content in items]
+
+    def remove(self, section_id):
+        """删除章节，返回被删除的记录（不存在时返回 None）"""
+        node = self._by_id.pop(section_id, None)
+        if node is not None:
+            self._unlink(node)
+        return node
+
+    def move_after(self, section_id, after_id=None):
+        """把章节移动到 after_id 之后；after_id 为 None 时移到最前面"""
+        node = self._by_id[section_id]
+        anchor = self._root if after_id is None else self._by_id[after_id]
+        if anchor is node or node._prev is anchor:
+            return
+        self._unlink(node)
+        self._link_after(node, anchor)
+
+    def move(self, section_id, direction):
+        """与相邻章节交换位置（direction 为 -1 上移、1 下移），越界时返回 False"""
+        node = self._by_id[section_id]
+        if direction < 0:
+            if node._prev is self._root: return False
+            anchor = node._prev._prev
+        else:
+            if node._next is self._root: return False
+            anchor = node._next
+        self._unlink(node)
+        self._link_after(node, anchor)
+        return True
+
+    def move_block_after(self, first_id, last_id, after_id=None):
+        """把 first_id 到 last_id 这一段连续章节整体移到 after_id 之后（after_id 为 None 时移到最前面）
+
+        调用方需保证 first_id 不在 last_id 之后，且 after_id 不在该段之内。
+        """
+        first, last = self._by_id[first_id], self._by_id[last_id]
+        anchor = self._root if after_id is None else self._by_id[after_id]
+        if anchor is first._prev:
+            return
+        first._prev._next = last._next
+        last._next._prev = first._prev
+        first._prev, last._next = anchor, anchor._next
+        anchor._next._prev = last
+        anchor._next = first
+
+    def clear(self):
+        self._by_id.clear()
+        self._root._prev = self._root._next = self._root
+
+    def to_list(self):
+        """按文档顺序导出为字典列表"""
+        return [node.to_dict() for node in self]
@@ -0,0 +1,206 @@
+import importlib
+
+tree_sync = importlib.import_module("16_tree_sync")
+
+
+class SectionTree:
+    """由章节级别推导出的树结构（不复制数据，直接在 SectionStore 的顺序上计算）
+
+    某章节的子树是它之后级别更深的连续章节，因此子树的查找、删除和整体移动
+    只需访问子树本身（以及相邻的同级章节），与文档总长度无关。
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def subtree(self, section_id):
+        """按文档顺序返回章节及其全部下级章节"""
+        node = self.store.get(section_id)
+        if node is None:
+            return []
+        nodes = [node]
+        following = self.store.after(node)
+        while following is not None and following.level > node.level:
+            nodes.append(following)
+            following = self.store.after(following)
+        return nodes
+
+    def has_children(self, section_id):
+        node = self.store.get(section_id)
+        following = self.store.after(node) if node is not None else None
+        return following is not None and following.level > node.level
+
+    def parent(self, section_id):
+        """返回上级章节，一级章节（或前面没有更高级别的章节）返回 None"""
+        node = self.store.get(section_id)
+        previous = self.store.before(node) if node is not None else None
+        while previous is not None and previous.level >= node.level:
+            previous = self.store.before(previous)
+        return previous
+
+    def children(self, parent_id=None):
+        """返回直接下级章节；parent_id 为 None 时返回顶层章节
+
+        级别跳跃时（如一级下直接是三级），比前面所有兄弟级别都不更深的章节视为直接下级。
+        """
+        if parent_id is None:
+            nodes = iter(self.store)
+        else:
+            nodes = iter(self.subtree(parent_id)[1:])
+        children = []
+        shallowest = None
+        for node in nodes:
+            if shallowest is None or node.level <= shallowest:
+                children.append(node)
+                shallowest = node.level
+        return children
+
+    def previous_sibling(self, section_id):
+        node = self.store.get(section_id)
+        previous = self.store.before(node)
+        while previous is not None and previous.level > node.level:
+            previous = self.store.before(previous)
+        return previous if previous is not None and previous.level == node.level else None
+
+    def next_sibling(self, section_id):
+        following = self.store.after(self.subtree(section_id)[-1])
+        node = self.store.get(section_id)
+        return following if following is not None and following.level == node.level else None
+
+    def move_subtree(self, section_id, direction):
+        """与同级的上一个/下一个章节交换位置，下级章节随之一起移动；无法移动时返回 False"""
+        nodes = self.subtree(section_id)
+        if not nodes:
+            return False
+        if direction < 0:
+            sibling = self.previous_sibling(section_id)
+            if sibling is None: return False
+            anchor = self.store.before(sibling)
+            self.store.move_block_after(nodes[0].id, nodes[-1].id, anchor.id if anchor is not None else None)
+        else:
+            sibling = self.next_sibling(section_id)
+            if sibling is None: return False
+            self.store.move_block_after(nodes[0].id, nodes[-1].id, self.subtree(sibling.id)[-1].id)
+        return True
+
+    def delete_subtree(self, section_id):
+        """删除章节及其全部下级章节，返回被删除的 id 列表"""
+        removed = [node.id for node in self.subtree(section_id)]
+        for removed_id in removed:
+            self.store.remove(removed_id)
+        return removed
+
+
+class LazySectionTreeView:
+    """以嵌套方式在 ttk.Treeview 中显示 SectionTree，子节点在首次展开时才加载
+
+    未加载的节点下放一个占位行以显示展开标记；每个已加载节点的子行由各自的
+    TreeSync 增量更新。
+    """
+
+    PLACEHOLDER_SUFFIX = "::placeholder"
+
+    def __init__(self, tree, model):
+        self.tree = tree
+        self.model = model
+        self._syncs = {"": tree_sync.TreeSync(tree)} # 已加载的父节点 -> TreeSync
+        self._placeholders = set()                     # 带占位行的未加载节点
+        tree.bind('<<TreeviewOpen>>', self._on_open, add='+')
+
+    def _rows_for(self, parent_iid, prefix):
+        return [(child.id, f"{prefix}{number}", (child.title, f"级别{child.level}"))
+                for number, child in enumerate(self.model.children(parent_iid or None), 1)]
+
+    def _drop(self, iid):
+        """忘记已从 Treeview 删除的行（Tk 会一并删除其下级行）"""
+        self._placeholders.discard(iid)
+        sync = self._syncs.pop(iid, None)
+        if sync is not None:
+            for child_iid in sync.rendered():
+                self._drop(child_iid)
+
+    def _prune(self, parent_iid, wanted_parent):
+        sync = self._syncs[parent_iid]
+        stale = [iid for iid in sync.rendered() if wanted_parent.get(iid) != parent_iid]
+        if stale:
+            sync.discard(stale) # Removed sections and sections that moved under another parent
+            for iid in stale:
+                self._drop(iid)
+        for iid in sync.rendered():
+            if iid in self._syncs:
+                self._prune(iid, wanted_parent)
+
+    def _sync_placeholders(self, rows):
+        """未加载的行有下级章节时放一个占位行，没有时去掉"""
+        for iid, _, _ in rows:
+            if iid in self._syncs:
+                continue
+            expandable = self.model.has_children(iid)
+            if expandable and iid not in self._placeholders:
+                self.tree.insert(iid, "end", iid + self.PLACEHOLDER_SUFFIX, text="…")
+                self._placeholders.add(iid)
+            elif not expandable and iid in self._placeholders:
+                self.tree.delete(iid + self.PLACEHOLDER_SUFFIX)
+                self._placeholders.discard(iid)
+
+    def refresh(self):
+        """按模型更新所有已加载的层级，只改动发生变化的行"""
+        planned = []      # [(parent_iid, rows)]，父节点总在子节点之前
+        wanted_parent = {}
+        pending = [("", "")]
+        while pending:
+            parent_iid, prefix = pending.pop()
+            if parent_iid and parent_iid not in self.model.store:
+                continue
+            rows = self._rows_for(parent_iid, prefix)
+            planned.append((parent_iid, rows))
+            for iid, text, _ in rows:
+                wanted_parent[iid] = parent_iid
+                if iid in self._syncs:
+                    pending.append((iid, text + "."))
+
+        self._prune("", wanted_parent)
+        for parent_iid, rows in planned:
+            if parent_iid not in self._syncs: # Was pruned, it will be reloaded when expanded again
+                continue
+            self._syncs[parent_iid].sync(rows)
+            self._sync_placeholders(rows)
+
+    def load(self, iid):
+        """加载某节点的直接下级行（首次展开时调用）"""
+        if iid in self._syncs or iid not in self.model.store:
+            return
+        if iid in self._placeholders:
+            self.tree.delete(iid + self.PLACEHOLDER_SUFFIX)
+            self._placeholders.discard(iid)
+        sync = self._syncs[iid] = tree_sync.TreeSync(self.tree, iid)
+        rows = self._rows_for(iid, self.tree.item(iid, 'text') + ".")
+        sync.sync(rows)
+        self._sync_placeholders(rows)
+
+    def _on_open(self, event):
+        iid = self.tree.focus()
+        if iid:
+            self.load(iid)
+
+    def reveal(self, section_id):
+        """展开所有上级节点并滚动到该章节"""
+        ancestors = []
+        parent = self.model.parent(section_id)
+        while parent is not None:
+            ancestors.append(parent.id)
+            parent = self.model.parent(parent.id)
+        for iid in reversed(ancestors):
+            self.load(iid)
+            self.tree.item(iid, open=True)
+        if self.tree.exists(section_id):
+            self.tree.see(section_id)
+
+    def collapse(self, iid=""):
+        """折叠某节点的整棵子树；iid 为空时折叠全部"""
+        sync = self._syncs.get(iid)
+        if iid and self.tree.exists(iid):
+            self.tree.item(iid, open=False)
+        if sync is not None:
+            for child_iid in sync.rendered():
+                self.collapse(child_iid)
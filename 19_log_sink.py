@@ -0,0 +1,155 @@
+import collections
+import json
+import threading
+import time
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LEVEL_LABELS = {"DEBUG": "调试", "INFO": "信息", "WARNING": "警告", "ERROR": "错误"}
+
+
+def guess_level(message):
+    """未指定级别时按消息前缀推断（引擎中的消息以"错误"/"警告"开头）"""
+    head = message.lstrip()[:12]
+    if head.startswith(("错误", "Traceback")):
+        return "ERROR"
+    if head.startswith("警告"):
+        return "WARNING"
+    return "INFO"
+
+
+class LogSink:
+    """线程安全的日志队列：任意线程调用 emit，界面或调用方定期 drain 批量取出
+
+    队列有上限（max_pending），积压过多时丢弃最旧的消息并计数；低于 level 的消息直接忽略。
+    指定 file_path 时取出的消息会追加写入文件，json_lines=True 时每行一个 JSON 对象。
+    """
+
+    def __init__(self, level="INFO", max_pending=10000, file_path=None, json_lines=False):
+        self.level = level
+        self.max_pending = max_pending
+        self.file_path = file_path
+        self.json_lines = json_lines
+        self.dropped = 0
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._file = None
+
+    @property
+    def level(self):
+        return self._level
+
+    @level.setter
+    def level(self, level):
+        self._level = level if level in LEVELS else "INFO"
+        self._threshold = LEVELS[self._level]
+
+    def enabled(self, level):
+        return LEVELS.get(level, 20) >= self._threshold
+
+    def emit(self, message, level=None):
+        level = level or guess_level(message)
+        if not self.enabled(level):
+            return
+        record = (time.time(), level, message)
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft(); self.dropped += 1
+            self._pending.append(record)
+
+    def drain(self):
+        """取出全部待处理消息（按产生顺序），同时写入文件"""
+        with self._lock:
+            records = list(self._pending)
+            self._pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            records.insert(0, (time.time(), "WARNING", f"日志过多，已丢弃 {dropped} 条较早的消息"))
+        if records and self.file_path:
+            self._write_file(records)
+        return records
+
+    def _write_file(self, records):
+        try:
+            if self._file is None:
+                self._file = open(self.file_path, "a", encoding="utf-8")
+            if self.json_lines:
+                lines = (json.dumps({"time": created, "level": level, "message": message}, ensure_ascii=False)
+                         for created, level, message in records)
+            else:
+                lines = (format_record(record) for record in records)
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+        except OSError as e:
+            print(f"写入日志文件失败 ({self.file_path}): {e}")
+            self.file_path = None # Stop retrying on every tick
+
+    def close(self):
+        self.drain()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def format_record(record):
+    created, level, message = record
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+    prefix = "" if level == "INFO" else f"[{LEVEL_LABELS.get(level, level)}] "
+    return f"[{timestamp}] {prefix}{message}"
+
+
+class TextLogView:
+    """按固定间隔把 LogSink 中的消息一次性写入 Tk Text 控件
+
+    每个间隔最多一次插入和一次滚动；超过 max_lines 行时删除最早的行。
+    用户向上翻看历史时不强制滚动到底部。
+    """
+
+    def __init__(self, root, text_widget, sink, interval_ms=100, max_lines=5000):
+        self.root = root
+        self.text_widget = text_widget
+        self.sink = sink
+        self.interval_ms = interval_ms
+        self.max_lines = max_lines
+        self._after_id = None
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        self._after_id = None
+        try:
+            self.flush()
+        finally:
+            if self.root.winfo_exists():
+                self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def flush(self):
+        """立即写入待处理的消息（只能在主线程调用）"""
+        records = self.sink.drain()
+        if not records:
+            return
+        if len(records) > self.max_lines:
+            records = records[-self.max_lines:]
+        widget = self.text_widget
+        at_bottom = widget.yview()[1] >= 0.999
+        widget.config(state="normal")
+        widget.insert("end", "\n".join(format_record(record) for record in records) + "\n")
+        line_count = int(widget.index("end-1c").split(".")[0]) - 1
+        if line_count > self.max_lines:
+            widget.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+        if at_bottom:
+            widget.see("end")
+        widget.config(state="disabled")
+
+    def clear(self):
+        """清空控件和尚未显示的消息（只能在主线程调用；消息仍会写入日志文件）"""
+        self.sink.drain()
+        self.text_widget.config(state="normal")
+        self.text_widget.delete("1.0", "end")
+        self.text_widget.config(state="disabled")
@@ -0,0 +1,168 @@
+import argparse
+import copy
+import importlib
+import io
+import re
+import time
+import warnings
+import zipfile
+
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from lxml import etree
+
+_W_PPR = qn('w:pPr')
+_W_PSTYLE = qn('w:pStyle')
+_W_VAL = qn('w:val')
+_W_R = qn('w:r')
+_W_T = qn('w:t')
+_W_TAB = qn('w:tab')
+_W_BR = qn('w:br')
+_XML_SPACE = qn('xml:space')
+_W_BOOKMARK_START = qn('w:bookmarkStart')
+_W_BOOKMARK_END = qn('w:bookmarkEnd')
+_W_ID = qn('w:id')
+_W_NAME = qn('w:name')
+_RUN_BREAKS = re.compile(r'([\t\r\n])')
+
+
+def append_run_text(r, text):
+    """按 python-docx Run.text 的规则写入文字：制表符为 w:tab，换行/回车为 w:br，其余连续字符合并为一个 w:t"""
+    for piece in _RUN_BREAKS.split(text):
+        if not piece:
+            continue
+        if piece == '\t':
+            etree.SubElement(r, _W_TAB)
+        elif piece in '\r\n':
+            etree.SubElement(r, _W_BR)
+        else:
+            t = etree.SubElement(r, _W_T)
+            t.text = piece
+            if len(piece.strip()) < len(piece):
+                t.set(_XML_SPACE, 'preserve')
+
+
+class BodyWriter:
+    """直接构建 w:p/w:r 元素向文档主体追加段落
+
+    生成的 XML 与 document.add_paragraph(text, style=...) 完全相同，但样式名称只解析一次，
+    也不为每个段落和文字块创建 Paragraph/Run 代理对象。
+    """
+
+    def __init__(self, document):
+        self.document = document
+        self._body = document.element.body
+        self._sect_pr = self._body.find(qn('w:sectPr'))
+        self._style_ids = {}
+        self._templates = {}
+        self.paragraph_count = 0
+        self.run_count = 0
+
+    def style_id(self, style_name):
+        """解析段落样式 id（每个名称只查找一次）；默认段落样式返回 None，样式不存在时抛出 KeyError"""
+        if style_name not in self._style_ids:
+            self._style_ids[style_name] = self.document.part.get_style_id(style_name, WD_STYLE_TYPE.PARAGRAPH)
+        return self._style_ids[style_name]
+
+    def _new_paragraph(self, style_name):
+        template = self._templates.get(style_name)
+        if template is None:
+            template = OxmlElement('w:p')
+            if style_name is not None:
+                # Setting a style always adds w:pPr; the default style leaves it empty
+                p_pr = etree.SubElement(template, _W_PPR)
+                style_id = self.style_id(style_name)
+                if style_id is not None:
+                    etree.SubElement(p_pr, _W_PSTYLE).set(_W_VAL, style_id)
+            self._templates[style_name] = template
+        return copy.deepcopy(template)
+
+    def add_paragraph(self, text="", style_name=None, force_run=False, bookmark=None):
+        """追加一个段落；force_run=True 时即使 text 为空也写入一个空的 w:r（与 add_run("") 相同）
+
+        bookmark 为 (id, name) 时用书签包住段落文字（目录条目的超链接指向它）。
+        """
+        p = self._new_paragraph(style_name)
+        if bookmark is not None:
+            start = etree.SubElement(p, _W_BOOKMARK_START)
+            start.set(_W_ID, str(bookmark[0])); start.set(_W_NAME, bookmark[1])
+        if text or force_run:
+            r = etree.SubElement(p, _W_R)
+            if text:
+                append_run_text(r, text)
+            self.run_count += 1
+        if bookmark is not None:
+            etree.SubElement(p, _W_BOOKMARK_END).set(_W_ID, str(bookmark[0]))
+        self.paragraph_count += 1
+        if self._sect_pr is not None:
+            self._sect_pr.addprevious(p) # Body content always stays before the final w:sectPr
+        else:
+            self._body.append(p)
+        return p
+
+
+def _legacy_add_content(document, sections):
+    """逐段调用 document.add_paragraph 的原实现，仅用于基准测试和结果比对"""
+    for sec_item in sections:
+        style_name = {1: 'Heading1Style', 2: 'Heading2Style', 3: 'Heading3Style'}.get(sec_item['level'], 'Normal')
+        p = document.add_paragraph(sec_item['title'], style=style_name)
+        if style_name.startswith('Heading'):
+            p.paragraph_format.first_line_indent = None
+        if sec_item['content']:
+            for para_text in re.split(r'\n\s*\n', sec_item['content'].strip()):
+                if para_text.strip():
+                    lines = para_text.splitlines()
+                    if lines:
+                        first_line_para = document.add_paragraph(style='Normal')
+                        first_line_para.add_run(lines[0].strip())
+                        for line_text in lines[1:]:
+                            if line_text.strip():
+                                document.add_paragraph(line_text.strip(), style='Normal')
+
+
+def _synthetic_sections(paragraph_count, lines_per_section=4):
+    sections = []
+    for i in range(paragraph_count // (lines_per_section + 1)):
+        body = "\n".join(f"第{i}节正文第{j}行，用于测试大文档生成速度。\t制表符与  空格" for j in range(lines_per_section))
+        sections.append({'level': i % 3 + 1, 'title': f"{i + 1}. 测试标题 {i}", 'content': body})
+    return sections
+
+
+def _document_xml(document):
+    buffer = io.BytesIO()
+    document.save(buffer)
+    with zipfile.ZipFile(buffer) as archive:
+        return archive.read('word/document.xml')
+
+
+def main(argv=None):
+    """基准测试：对比逐段 add_paragraph 与 BodyWriter 写入正文的耗时，并校验 document.xml 完全一致"""
+    parser = argparse.ArgumentParser(description="正文写入基准测试")
+    parser.add_argument("paragraphs", nargs="*", type=int, default=[10000, 100000], help="段落数（默认 10000 100000）")
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore") # Style lookup by id emits a DeprecationWarning on the legacy path
+    doc_spec = importlib.import_module("07_doc_spec")
+    docx_engine = importlib.import_module("08_docx_engine")
+    style = doc_spec.StyleSpec()
+    for count in args.paragraphs:
+        sections = _synthetic_sections(count)
+        timings = {}
+        outputs = {}
+        for name, write in (("add_paragraph", _legacy_add_content), ("BodyWriter", docx_engine.add_user_document_content)):
+            document = docx_engine.new_styled_document(style)
+            start = time.perf_counter()
+            write(document, sections)
+            timings[name] = time.perf_counter() - start
+            outputs[name] = _document_xml(document)
+        identical = outputs["add_paragraph"] == outputs["BodyWriter"]
+        print(f"{count} 段: add_paragraph {timings['add_paragraph']:.2f}s, BodyWriter {timings['BodyWriter']:.2f}s, "
+              f"加速 {timings['add_paragraph'] / timings['BodyWriter']:.1f}x, XML {'一致' if identical else '不一致'}")
+        if not identical:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,189 @@
+import importlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+from docx.oxml.ns import qn
+from lxml import etree
+
+body_writer = importlib.import_module("20_body_writer")
+pipeline_timing = importlib.import_module("32_pipeline_timing")
+
+DOCUMENT_PART = "word/document.xml"
+BODY_MARKER = "docx-streaming-body"
+FLUSH_CHARS = 64 * 1024
+SPOOL_MAX_BYTES = 16 * 1024 * 1024 # 正文 XML 超过此大小时暂存到磁盘
+
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+def _new_file_mode():
+    """普通新建文件的权限：Linux 上按进程当前的 umask，其他系统为 0o644
+
+    不用 os.umask 读取，因为它只能通过设置来读取，会短暂改变整个进程（其他线程）的 umask。
+    """
+    try:
+        with open('/proc/self/status', encoding='ascii') as status:
+            for line in status:
+                if line.startswith('Umask:'):
+                    return 0o666 & ~int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0o644
+
+
+def new_temp_file(target_path):
+    """在目标所在目录创建唯一的临时文件，返回 (fd, 临时文件路径)
+
+    同一目标的多个写入者各用各的临时文件，完成后 os.replace 为原子替换（同一文件系统）。
+    mkstemp 创建的文件只有所有者可读写，这里改为目标原有的权限（目标不存在时同普通新建文件）。
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path) or '.', suffix='.tmp')
+    try:
+        mode = os.stat(target_path).st_mode & 0o777
+    except OSError:
+        mode = _new_file_mode()
+    try:
+        os.chmod(temp_path, mode)
+    except OSError:
+        pass
+    return fd, temp_path
+
+
+def _attr(value):
+    return escape(value, {'"': '&quot;'})
+
+
+def _text_xml(text):
+    """与 append_run_text 相同的规则生成 w:r 的内容"""
+    if _INVALID_XML_CHARS.search(text):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters")
+    parts = []
+    for piece in body_writer._RUN_BREAKS.split(text):
+        if not piece:
+            continue
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in '\r\n':
+            parts.append('<w:br/>')
+        elif len(piece.strip()) < len(piece):
+            parts.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+        else:
+            parts.append(f'<w:t>{escape(piece)}</w:t>')
+    return ''.join(parts)
+
+
+class StreamingBodyWriter:
+    """与 BodyWriter 接口相同，但段落直接序列化为 XML 文本写入输出流，不在内存中保留元素树
+
+    样式 id 通过模板文档解析（每个名称只解析一次）。
+    """
+
+    def __init__(self, document, stream):
+        self._resolver = body_writer.BodyWriter(document) # Only used for style id lookup
+        self._stream = stream
+        self._buffer = []
+        self._buffered = 0
+        self._p_prs = {}
+        self.paragraph_count = 0
+        self.run_count = 0
+        self.bytes_written = 0
+
+    def style_id(self, style_name):
+        return self._resolver.style_id(style_name)
+
+    def _paragraph_properties(self, style_name):
+        p_pr = self._p_prs.get(style_name)
+        if p_pr is None:
+            if style_name is None:
+                p_pr = ''
+            else:
+                style_id = self.style_id(style_name) # The default style keeps an empty w:pPr, like add_paragraph
+                p_pr = f'<w:pPr><w:pStyle w:val="{_attr(style_id)}"/></w:pPr>' if style_id is not None else '<w:pPr/>'
+            self._p_prs[style_name] = p_pr
+        return p_pr
+
+    def add_paragraph(self, text="", style_name=None, force_run=False, bookmark=None):
+        content = self._paragraph_properties(style_name)
+        if bookmark is not None:
+            content += f'<w:bookmarkStart w:id="{bookmark[0]}" w:name="{_attr(bookmark[1])}"/>'
+        if text:
+            content += f'<w:r>{_text_xml(text)}</w:r>'
+            self.run_count += 1
+        elif force_run:
+            content += '<w:r/>'
+            self.run_count += 1
+        if bookmark is not None:
+            content += f'<w:bookmarkEnd w:id="{bookmark[0]}"/>'
+        xml = f'<w:p>{content}</w:p>' if content else '<w:p/>'
+        self._buffer.append(xml)
+        self._buffered += len(xml)
+        self.paragraph_count += 1
+        if self._buffered >= FLUSH_CHARS:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            data = ''.join(self._buffer).encode('utf-8')
+            self._stream.write(data)
+            self.bytes_written += len(data)
+            self._buffer = []
+            self._buffered = 0
+
+
+def save_streaming(document, doc_path, write_body, finalize=None, timer=None):
+    """保存文档，正文由 write_body(writer) 以流式方式写入 word/document.xml
+
+    document 为只包含页眉、标题、目录等开头内容的模板文档；其余部件（样式、设置、页眉图片等）
+    原样从模板复制。正文 XML 先写入临时缓冲（超过 SPOOL_MAX_BYTES 后转存磁盘），
+    写完后调用 finalize(document)（例如填入目录条目），再序列化模板并与正文一起压缩输出，
+    内存占用与文档长度无关。先写入目标目录中的唯一临时文件，完成后再替换目标文件。
+    序列化和压缩输出作为 timer 中的 "save" 阶段，记录正文 XML 和输出文件的字节数。
+    """
+    timer = timer if timer is not None else pipeline_timing.PipelineTimer()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as body_xml:
+        writer = StreamingBodyWriter(document, body_xml)
+        write_body(writer)
+        writer.flush()
+        if finalize is not None:
+            finalize(document)
+
+        with timer.span("save", body_bytes=writer.bytes_written) as span:
+            body = document.element.body
+            sect_pr = body.find(qn('w:sectPr'))
+            marker = etree.Comment(BODY_MARKER)
+            if sect_pr is not None:
+                sect_pr.addprevious(marker)
+            else:
+                body.append(marker)
+            template = io.BytesIO()
+            try:
+                document.save(template)
+            finally:
+                body.remove(marker)
+
+            fd, temp_path = new_temp_file(doc_path)
+            try:
+                with os.fdopen(fd, 'wb') as temp_file, zipfile.ZipFile(template) as source, \
+                        zipfile.ZipFile(temp_file, 'w', compression=zipfile.ZIP_DEFLATED) as target:
+                    for info in source.infolist():
+                        if info.filename != DOCUMENT_PART:
+                            target.writestr(info.filename, source.read(info.filename))
+                            continue
+                        head, tail = source.read(DOCUMENT_PART).split(f"<!--{BODY_MARKER}-->".encode('utf-8'), 1)
+                        with target.open(DOCUMENT_PART, 'w', force_zip64=True) as stream:
+                            stream.write(head)
+                            body_xml.seek(0)
+                            shutil.copyfileobj(body_xml, stream)
+                            stream.write(tail)
+                os.replace(temp_path, doc_path)
+                span.add("bytes", os.path.getsize(doc_path))
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+    return doc_path
@@ -0,0 +1,166 @@
+import math
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from lxml import etree
+
+# 目录预先生成：写正文的同一遍扫描中为标题加书签、估算页码，正文写完后把目录条目
+# 作为 TOC 域的缓存结果写入，不按 F9 更新也能看到完整目录（Word 中更新域后页码以实际排版为准）。
+
+TOC_INSTRUCTION = r' TOC \o "1-3" \h \z \u '
+TOC_LEVELS = 3
+
+# A4、左边距 1.25 英寸、其余 1 英寸（与 setup_page 一致），单位: 磅
+PAGE_TEXT_WIDTH_PT = (8.27 - 1.25 - 1.0) * 72
+PAGE_TEXT_HEIGHT_PT = (11.69 - 1.0 - 1.0) * 72
+TOC_TAB_POS_TWIPS = int(round(PAGE_TEXT_WIDTH_PT * 20))
+LINE_HEIGHT_FACTOR = 1.3 # 单倍行距的行高约为字号的 1.3 倍（中文字体）
+HEADING_SPACING_PT = {1: (12, 6), 2: (8, 4), 3: (6, 2)} # 段前、段后，与 create_style 一致
+
+
+def _points(value, default=12.0):
+    try:
+        size = float(value)
+    except (TypeError, ValueError):
+        return default
+    return size if size > 0 else default
+
+
+def text_width_em(text):
+    """估算文字宽度（以字号为单位）：中文等全角字符按 1，ASCII 字符按 0.5"""
+    return sum(0.5 if ord(ch) < 0x2E80 else 1.0 for ch in text)
+
+
+def add_toc_styles(document):
+    """添加目录 1~3 级样式（Word 内置样式 toc 1~3，默认模板中没有定义）"""
+    styles_element = document.styles.element
+    for level in range(1, TOC_LEVELS + 1):
+        style_id = f"TOC{level}"
+        if styles_element.get_by_id(style_id) is not None:
+            continue
+        style = OxmlElement('w:style', {qn('w:type'): 'paragraph', qn('w:styleId'): style_id})
+        for tag, value in (('w:name', f"toc {level}"), ('w:basedOn', 'Normal'), ('w:next', 'Normal'), ('w:uiPriority', '39')):
+            etree.SubElement(style, qn(tag)).set(qn('w:val'), value)
+        etree.SubElement(style, qn('w:unhideWhenUsed'))
+        p_pr = etree.SubElement(style, qn('w:pPr'))
+        etree.SubElement(p_pr, qn('w:ind')).attrib.update({qn('w:left'): str((level - 1) * 420), qn('w:firstLine'): '0'})
+        styles_element.append(style)
+
+
+class PageEstimator:
+    """按页面尺寸、字号和行距粗略估算正文排版到第几页（从 1 开始计）"""
+
+    def __init__(self, style):
+        self.normal_size = _points(style.normal_size)
+        self.normal_line = self.normal_size * LINE_HEIGHT_FACTOR * 1.5 # 正文为 1.5 倍行距
+        self.chars_per_line = max(1.0, PAGE_TEXT_WIDTH_PT / self.normal_size)
+        self.indent_em = _points(style.indent_chars, 0.0)
+        self.heading_sizes = {1: _points(style.h1_size), 2: _points(style.h2_size), 3: _points(style.h3_size)}
+        self.used = 0.0 # 已占用的高度（磅），跨页累计
+
+    @property
+    def page(self):
+        return int(self.used // PAGE_TEXT_HEIGHT_PT) + 1
+
+    def _remaining(self):
+        return PAGE_TEXT_HEIGHT_PT - self.used % PAGE_TEXT_HEIGHT_PT
+
+    def add_heading(self, level, title):
+        """返回标题所在页；标题与下一段同页（keep_with_next），放不下时移到下一页"""
+        size = self.heading_sizes.get(level, self.normal_size)
+        before, after = HEADING_SPACING_PT.get(level, (0, 0))
+        lines = max(1, math.ceil(text_width_em(title) * size / PAGE_TEXT_WIDTH_PT))
+        height = before + lines * size * LINE_HEIGHT_FACTOR + after
+        if self._remaining() < height + self.normal_line:
+            self.used += self._remaining()
+        page = self.page
+        self.used += height
+        return page
+
+    def add_paragraph(self, text):
+        lines = max(1, math.ceil((text_width_em(text) + self.indent_em) / self.chars_per_line))
+        self.used += lines * self.normal_line
+
+
+class TocBuilder:
+    """收集标题书签和估算页码，生成目录条目段落"""
+
+    def __init__(self, style, levels=TOC_LEVELS):
+        self.style = style
+        self.levels = levels
+        self.estimator = PageEstimator(style)
+        self.entries = [] # [(level, title, bookmark_name, body_page)]
+
+    def heading(self, level, title):
+        """登记一个标题，返回 (书签 id, 书签名)；不进入目录的级别返回 None"""
+        if not isinstance(level, int) or not 1 <= level <= self.levels:
+            self.estimator.add_paragraph(title)
+            return None
+        bookmark_id = len(self.entries)
+        bookmark_name = f"_Toc{bookmark_id + 1:08d}"
+        self.entries.append((level, title, bookmark_name, self.estimator.add_heading(level, title)))
+        return bookmark_id, bookmark_name
+
+    def paragraph(self, text):
+        self.estimator.add_paragraph(text)
+
+    def body_start_page(self):
+        """正文起始页：第一页起依次为文档标题、目录标题和目录条目，目录后分页"""
+        head = _points(self.style.title_size) * LINE_HEIGHT_FACTOR + 36
+        head += max(_points(self.style.h1_size), 16) * LINE_HEIGHT_FACTOR + 24
+        toc_height = head + len(self.entries) * self.estimator.normal_line
+        return 1 + max(1, math.ceil(toc_height / PAGE_TEXT_HEIGHT_PT))
+
+    def render(self, field_paragraph):
+        """把空的 TOC 域段落替换为带缓存结果的目录条目段落；没有条目时保持不变"""
+        if field_paragraph is None or not self.entries:
+            return
+        offset = self.body_start_page() - 1
+        anchor = field_paragraph._p
+        for index, (level, title, bookmark_name, body_page) in enumerate(self.entries):
+            p = _entry_paragraph(level, title, bookmark_name, body_page + offset, first=index == 0)
+            anchor.addnext(p)
+            anchor = p
+        end_p = OxmlElement('w:p')
+        _field_char(etree.SubElement(end_p, qn('w:r')), 'end')
+        anchor.addnext(end_p)
+        field_paragraph._p.getparent().remove(field_paragraph._p)
+
+
+def _field_char(r, field_char_type):
+    etree.SubElement(r, qn('w:fldChar')).set(qn('w:fldCharType'), field_char_type)
+
+
+def _instr_run(parent, instruction):
+    instr = etree.SubElement(etree.SubElement(parent, qn('w:r')), qn('w:instrText'))
+    instr.set(qn('xml:space'), 'preserve')
+    instr.text = instruction
+
+
+def _text_run(parent, text):
+    t = etree.SubElement(etree.SubElement(parent, qn('w:r')), qn('w:t'))
+    t.text = text
+    if len(text.strip()) < len(text):
+        t.set(qn('xml:space'), 'preserve')
+
+
+def _entry_paragraph(level, title, bookmark_name, page, first):
+    p = OxmlElement('w:p')
+    p_pr = etree.SubElement(p, qn('w:pPr'))
+    etree.SubElement(p_pr, qn('w:pStyle')).set(qn('w:val'), f"TOC{level}")
+    tab = etree.SubElement(etree.SubElement(p_pr, qn('w:tabs')), qn('w:tab'))
+    tab.attrib.update({qn('w:val'): 'right', qn('w:leader'): 'dot', qn('w:pos'): str(TOC_TAB_POS_TWIPS)})
+    if first: # The TOC field itself starts in the first entry
+        _field_char(etree.SubElement(p, qn('w:r')), 'begin')
+        _instr_run(p, TOC_INSTRUCTION)
+        _field_char(etree.SubElement(p, qn('w:r')), 'separate')
+    link = etree.SubElement(p, qn('w:hyperlink'))
+    link.attrib.update({qn('w:anchor'): bookmark_name, qn('w:history'): '1'})
+    _text_run(link, title)
+    etree.SubElement(etree.SubElement(link, qn('w:r')), qn('w:tab'))
+    _field_char(etree.SubElement(link, qn('w:r')), 'begin')
+    _instr_run(link, f" PAGEREF {bookmark_name} \\h ")
+    _field_char(etree.SubElement(link, qn('w:r')), 'separate')
+    _text_run(link, str(page))
+    _field_char(etree.SubElement(link, qn('w:r')), 'end')
+    return p
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+import io
+import os
+import threading
+
+from docx.image.image import Image
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.shape import CT_Inline
+from docx.shared import Cm
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # Pillow 为可选依赖，未安装时不做预缩放，直接使用原图
+    PILImage = None
+
+# 页眉 Logo 图片缓存：同一文件（路径、修改时间、大小相同）只读取和解析一次，
+# 文档内所有节的页眉共用一个图片部件。
+
+DOWNSCALE_DPI = 300 # 预缩放时按目标宽度保留的分辨率
+
+
+def file_signature(path):
+    """返回 (绝对路径, 修改时间, 大小)；文件不存在时返回 None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def _downscale(blob, width_cm, dpi):
+    """宽度超过目标尺寸所需像素时按比例缩小；不需要缩小或无法处理时返回 None"""
+    if PILImage is None or not width_cm or not dpi:
+        return None
+    target_px = max(1, int(round(width_cm / 2.54 * dpi)))
+    try:
+        with PILImage.open(io.BytesIO(blob)) as picture:
+            if picture.width <= target_px or getattr(picture, "is_animated", False):
+                return None
+            image_format = picture.format if picture.format in ("PNG", "JPEG") else "PNG"
+            height_px = max(1, int(round(picture.height * target_px / picture.width)))
+            resized = picture.resize((target_px, height_px), PILImage.LANCZOS)
+            if image_format == "JPEG" and resized.mode not in ("RGB", "L"):
+                resized = resized.convert("RGB")
+            buffer = io.BytesIO()
+            resized.save(buffer, format=image_format, dpi=(dpi, dpi))
+    except (OSError, ValueError):
+        return None
+    data = buffer.getvalue()
+    return data if len(data) < len(blob) else None
+
+
+class ImageCache:
+    """已解析图片的 LRU 缓存，键为 (文件签名, 目标宽度, 预缩放分辨率)
+
+    文件被修改（修改时间或大小变化）后自动重新读取。线程安全。
+    """
+
+    def __init__(self, max_entries=8, downscale_dpi=DOWNSCALE_DPI):
+        self.max_entries = max_entries
+        self.downscale_dpi = downscale_dpi
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, width_cm=None):
+        """返回 docx.image.image.Image（含图片数据与像素尺寸）；文件不存在时抛出 FileNotFoundError"""
+        signature = file_signature(path)
+        if signature is None:
+            raise FileNotFoundError(path)
+        dpi = self.downscale_dpi if PILImage is not None else None
+        key = (signature, width_cm if dpi else None, dpi)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+
+        image = Image.from_file(path)
+        smaller = _downscale(image.blob, width_cm, dpi)
+        if smaller is not None:
+            image = Image.from_blob(smaller)
+        with self._lock:
+            self.misses += 1
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return image
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+
+
+def image_part_for(package, image):
+    """返回包中与 image 内容相同的图片部件，没有时新建一个（不重新读取和解析文件）"""
+    image_parts = package.image_parts
+    for image_part in image_parts:
+        if image_part.sha1 == image.sha1:
+            return image_part
+    return image_parts._add_image_part(image)
+
+
+def add_picture(run, image, width_cm):
+    """在 run 中插入内联图片，与 run.add_picture(path, width=Cm(width_cm)) 生成的 XML 相同
+
+    同一文档中的多次插入共用一个图片部件。
+    """
+    story_part = run.part
+    image_part = image_part_for(story_part.package, image)
+    r_id = story_part.relate_to(image_part, RT.IMAGE) # Reuses the relationship if the part already has one
+    cx, cy = image.scaled_dimensions(Cm(width_cm), None)
+    inline = CT_Inline.new_pic_inline(story_part.next_id, r_id, image.filename, cx, cy)
+    run._r.add_drawing(inline)
+    return inline
+
+
+# 进程内共享的默认缓存（批量生成时每个工作进程各有一份）
+default_cache = ImageCache()
@@ -0,0 +1,315 @@
+import collections
+import importlib
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+doc_spec = importlib.import_module("07_doc_spec")
+docx_engine = importlib.import_module("08_docx_engine")
+log_sink = importlib.import_module("19_log_sink")
+style_template_cache = importlib.import_module("10_style_template_cache")
+job_control = importlib.import_module("25_job_control")
+
+# 批量导出队列：多个 (文档描述, 输出路径) 任务在进程池中并行生成，
+# 工作进程通过队列回报进度和日志，界面按固定间隔汇总显示。
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+STATE_LABELS = {QUEUED: "排队中", RUNNING: "生成中", DONE: "已完成", FAILED: "失败", CANCELLED: "已取消"}
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+def _run_job(job_id, spec_dict, doc_path, events, cancelled, template_cache_dir=None):
+    """在工作进程中生成一个文档，返回 (saved_path, error, elapsed_seconds)"""
+    start = time.perf_counter()
+    if template_cache_dir:
+        style_template_cache.default_cache.cache_dir = template_cache_dir
+    events.put((job_id, "progress", 0))
+    cancel = job_control.SharedCancelToken(cancelled, job_id) # The engine checks it between sections
+
+    def progress(value):
+        events.put((job_id, "progress", value))
+        if value < 100: cancel.check()
+
+    def log(message, level=None):
+        level = level or log_sink.guess_level(message)
+        if level != "DEBUG": # Per-section messages stay in the worker
+            events.put((job_id, "log", (message, level)))
+
+    try:
+        spec = doc_spec.DocumentSpec.from_dict(spec_dict)
+    except (ValueError, TypeError) as e:
+        return None, f"文档描述无效: {e}", time.perf_counter() - start
+    try:
+        saved_path, error = docx_engine.generate_document(spec, doc_path, log=log, progress=progress, cancel=cancel)
+    except job_control.Cancelled:
+        return None, "已取消", time.perf_counter() - start
+    return saved_path, error, time.perf_counter() - start
+
+
+class ExportJob:
+    """队列中的一个导出任务"""
+
+    def __init__(self, job_id, spec_dict, doc_path):
+        self.job_id = job_id
+        self.spec_dict = spec_dict
+        self.doc_path = doc_path
+        self.state = QUEUED
+        self.progress = 0
+        self.error = None
+        self.elapsed = None
+        self.attempts = 0
+        self.future = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.doc_path)
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+
+class ExportQueue:
+    """用 ProcessPoolExecutor 并行执行导出任务（python-docx 受 GIL 限制，多进程才能用满多核）
+
+    所有方法只在一个线程（界面主线程）中调用；工作进程的进度、日志和完成通知都经队列传回，
+    由 poll() 取出并更新任务状态。运行中的任务在引擎的进度点和章节之间检查取消标记。
+    """
+
+    def __init__(self, max_workers=None, template_cache_dir=None, log=None, busy=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.template_cache_dir = template_cache_dir
+        self.log = log or docx_engine._noop
+        self.busy = busy # busy(abs_path) 为 True 时该路径正由队列之外（如主界面生成）写入，任务暂不提交
+        self._held = set() # Job ids held back for an outside writer, resubmitted by poll()
+        self.jobs = collections.OrderedDict()
+        self._next_id = 1
+        self._executor = None
+        self._manager = None
+        self._events = None
+        self._cancelled = None
+        self._completed = queue.Queue() # Filled by future callbacks on the executor's thread
+
+    def _ensure_pool(self):
+        if self._executor is None:
+            self._manager = multiprocessing.Manager()
+            self._events = self._manager.Queue()
+            self._cancelled = self._manager.dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def add(self, spec, doc_path):
+        """加入一个任务（spec 为 DocumentSpec 或其字典形式），返回 ExportJob"""
+        spec_dict = spec.to_dict() if hasattr(spec, "to_dict") else dict(spec)
+        job = ExportJob(self._next_id, spec_dict, doc_path)
+        self._next_id += 1
+        self.jobs[job.job_id] = job
+        return job
+
+    def start(self):
+        """提交所有排队中的任务，返回提交的数量"""
+        pending = [job for job in self.jobs.values() if job.state == QUEUED and job.future is None]
+        # Two jobs writing the same file would race, so only the first one is submitted
+        busy_paths = {os.path.abspath(job.doc_path) for job in self.jobs.values() if job.future is not None and not job.finished}
+        submitted = 0
+        held = set()
+        for job in pending:
+            path = os.path.abspath(job.doc_path)
+            if path in busy_paths:
+                continue
+            if self.busy is not None and self.busy(path):
+                if job.job_id not in self._held:
+                    self.log(f"[{job.name}] 该文件正在由主界面生成，完成后再开始导出", "WARNING")
+                held.add(job.job_id)
+                continue
+            busy_paths.add(path)
+            self._submit(job)
+            submitted += 1
+        self._held = held
+        return submitted
+
+    def _submit(self, job):
+        self._ensure_pool()
+        self._cancelled.pop(job.job_id, None)
+        job.state, job.progress, job.error, job.elapsed = QUEUED, 0, None, None
+        job.attempts += 1
+        job.future = self._executor.submit(_run_job, job.job_id, job.spec_dict, job.doc_path,
+                                           self._events, self._cancelled, self.template_cache_dir)
+        job.future.add_done_callback(lambda future, job_id=job.job_id: self._completed.put((job_id, future)))
+
+    def is_busy(self, doc_path):
+        """是否有未结束的任务正在写入（或排队写入）doc_path"""
+        path = os.path.abspath(doc_path)
+        return any(os.path.abspath(job.doc_path) == path for job in self.jobs.values() if not job.finished)
+
+    def cancel(self, job_id):
+        """取消任务：尚未开始的直接撤销，运行中的在下一个检查点停止"""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job.future is None or job.future.cancel():
+            job.state = CANCELLED
+            return True
+        self._cancelled[job_id] = True
+        return True
+
+    def retry(self, job_id):
+        """重新提交失败或已取消的任务"""
+        job = self.jobs.get(job_id)
+        if job is None or job.state not in (FAILED, CANCELLED):
+            return False
+        job.future = None
+        job.state = QUEUED
+        self.start()
+        return True
+
+    def remove_finished(self):
+        for job_id in [job.job_id for job in self.jobs.values() if job.finished]:
+            del self.jobs[job_id]
+
+    def poll(self):
+        """取出工作进程的进度和完成通知，返回状态有变化的任务 id 集合"""
+        changed = set()
+        while self._events is not None:
+            try:
+                job_id, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                continue
+            if kind == "progress":
+                job.state, job.progress = RUNNING, payload
+            elif kind == "log":
+                message, level = payload
+                self.log(f"[{job.name}] {message}", level)
+            changed.add(job_id)
+
+        while True:
+            try:
+                job_id, future = self._completed.get_nowait()
+            except queue.Empty:
+                break
+            job = self.jobs.get(job_id)
+            if job is None or future is not job.future:
+                continue # Removed from the list, or a stale attempt before a retry
+            self._finish(job, future)
+            changed.add(job_id)
+        if changed or self._held:
+            self.start() # Jobs held back for a busy output path can go now
+        return changed
+
+    def _finish(self, job, future):
+        if future.cancelled():
+            job.state = CANCELLED
+            return
+        try:
+            saved_path, error, job.elapsed = future.result()
+        except Exception as e: # e.g. a worker process died
+            saved_path, error = None, f"工作进程异常: {e}"
+        if self._cancelled is not None and self._cancelled.pop(job.job_id, None) and not saved_path:
+            job.state, job.error = CANCELLED, None
+            self.log(f"[{job.name}] 已取消")
+        elif saved_path:
+            job.state, job.progress, job.error = DONE, 100, None
+        else:
+            job.state, job.error = FAILED, error
+            self.log(f"[{job.name}] 生成失败: {error}", "ERROR")
+
+    @property
+    def active(self):
+        return bool(self._held) or any(job.future is not None and not job.finished for job in self.jobs.values())
+
+    def counts(self):
+        counts = collections.Counter(job.state for job in self.jobs.values())
+        return {state: counts.get(state, 0) for state in STATE_LABELS}
+
+    def overall_progress(self):
+        """全部未取消任务的平均进度（0~100）"""
+        jobs = [job for job in self.jobs.values() if job.state != CANCELLED]
+        if not jobs:
+            return 0
+        return sum(100 if job.finished else job.progress for job in jobs) / len(jobs)
+
+    def shutdown(self):
+        """撤销排队中的任务并通知运行中的任务停止，不等待工作进程结束"""
+        for job in list(self.jobs.values()):
+            self.cancel(job.job_id)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+            self._events = self._cancelled = None
+
+
+class ExportQueueView:
+    """按固定间隔轮询 ExportQueue，把任务状态同步到 Treeview，并更新汇总进度条和状态文字"""
+
+    def __init__(self, root, tree, export_queue, progress_bar=None, status_var=None, interval_ms=200):
+        self.root = root
+        self.tree = tree
+        self.queue = export_queue
+        self.progress_bar = progress_bar
+        self.status_var = status_var
+        self.interval_ms = interval_ms
+        self._after_id = None
+
+    def start(self):
+        self.refresh()
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        self._after_id = None
+        try:
+            changed = self.queue.poll()
+            for job_id in changed:
+                self._update_row(job_id)
+            if changed:
+                self._update_summary()
+        finally:
+            if self.queue.active and self.root.winfo_exists():
+                self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def _values(self, job):
+        detail = job.error or (f"{job.elapsed:.1f}s" if job.elapsed is not None else "")
+        return (job.name, STATE_LABELS[job.state], f"{job.progress:.0f}%", detail)
+
+    def _update_row(self, job_id):
+        job = self.queue.jobs.get(job_id)
+        iid = str(job_id)
+        if job is None:
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+        elif self.tree.exists(iid):
+            self.tree.item(iid, values=self._values(job))
+        else:
+            self.tree.insert("", "end", iid=iid, values=self._values(job))
+
+    def refresh(self):
+        """全部重新同步（增删任务后调用）"""
+        current = {str(job_id) for job_id in self.queue.jobs}
+        stale = [iid for iid in self.tree.get_children("") if iid not in current]
+        if stale:
+            self.tree.delete(*stale)
+        for job_id in self.queue.jobs:
+            self._update_row(job_id)
+        self._update_summary()
+
+    def _update_summary(self):
+        if self.progress_bar is not None:
+            self.progress_bar.config(value=self.queue.overall_progress())
+        if self.status_var is not None:
+            counts = self.queue.counts()
+            self.status_var.set("，".join(f"{STATE_LABELS[state]} {count}" for state, count in counts.items() if count) or "队列为空")
+
+    def selected_job_ids(self):
+        return [int(iid) for iid in self.tree.selection()]
@@ -0,0 +1,118 @@
+import threading
+import time
+
+# 后台任务控制：取消令牌在章节之间、重试等待时检查（协作式取消），
+# JobController 保证同一个键（如输出路径）同时只有一个任务在运行。
+
+
+class Cancelled(BaseException):
+    """任务被取消；继承 BaseException，不会被 except Exception 当作普通错误吞掉"""
+
+
+class CancelToken:
+    """线程安全的取消标记，由发起方 cancel()，工作线程在检查点调用 check()"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled()
+
+    def sleep(self, seconds):
+        """代替 time.sleep 的可中断等待；等待期间被取消时抛出 Cancelled"""
+        if self._event.wait(seconds):
+            raise Cancelled()
+
+
+class SharedCancelToken:
+    """基于跨进程共享字典的取消标记（键存在即表示已取消），check() 按间隔节流以减少进程间通信"""
+
+    def __init__(self, shared, key, interval=0.2):
+        self.shared = shared
+        self.key = key
+        self.interval = interval
+        self._cancelled = False
+        self._next_check = 0.0
+
+    @property
+    def cancelled(self):
+        if not self._cancelled:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.interval
+                self._cancelled = self.key in self.shared
+        return self._cancelled
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+
+class JobController:
+    """按键管理后台线程任务（single-flight）：同一个键在运行时再次 start 会被拒绝
+
+    target(token, *args) 在守护线程中执行；on_change(key, running) 在任务开始和结束时调用，
+    调用线程分别为发起线程和工作线程，界面可通过 root.after 转回主线程更新按钮状态。
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def start(self, key, target, *args):
+        """启动任务并返回其 CancelToken；同一键已有任务在运行时返回 None"""
+        token = CancelToken()
+        with self._lock:
+            if key in self._tokens:
+                return None
+            self._tokens[key] = token
+        self._notify(key, True)
+        threading.Thread(target=self._run, args=(key, token, target, args), daemon=True).start()
+        return token
+
+    def _run(self, key, token, target, args):
+        try:
+            target(token, *args)
+        except Cancelled:
+            pass # The target reports its own cancellation if it needs to
+        finally:
+            with self._lock:
+                self._tokens.pop(key, None)
+            self._notify(key, False)
+
+    def _notify(self, key, running):
+        if self.on_change is not None:
+            self.on_change(key, running)
+
+    def is_running(self, key):
+        with self._lock:
+            return key in self._tokens
+
+    def running_keys(self, kind=None):
+        """正在运行的键；kind 不为 None 时只返回 (kind, ...) 形式且类别匹配的键"""
+        with self._lock:
+            keys = list(self._tokens)
+        if kind is None:
+            return keys
+        return [key for key in keys if isinstance(key, tuple) and key and key[0] == kind]
+
+    def cancel(self, key):
+        with self._lock:
+            token = self._tokens.get(key)
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+    def cancel_all(self, kind=None):
+        for key in self.running_keys(kind):
+            self.cancel(key)
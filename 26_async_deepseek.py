@@ -0,0 +1,540 @@
+import asyncio
+import concurrent.futures
+import email.utils
+import importlib
+import json
+import random
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+deepseek_client = importlib.import_module("11_deepseek_client")
+section_json = importlib.import_module("12_section_json")
+job_control = importlib.import_module("25_job_control")
+rate_limiter = importlib.import_module("27_rate_limiter")
+
+# 基于 asyncio 的 DeepSeek 客户端：一个后台事件循环线程承载所有请求，
+# 连接保持复用（HTTP/1.1 keep-alive），并发数由信号量限制，重试按带抖动的指数退避并遵守 Retry-After。
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 120 # 两次收到数据之间的最长等待
+MAX_RETRY_AFTER = 60 # Retry-After 超过此值时按此值等待
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, status, body=b"", retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8', 'replace')
+
+
+def parse_retry_after(value, now=None):
+    """解析 Retry-After（秒数或 HTTP 日期），返回需要等待的秒数；无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def backoff_delay(attempt, backoff_factor=0.5, max_backoff=30.0, retry_after=None):
+    """第 attempt 次（从 0 开始）失败后的等待秒数：指数退避加抖动（基准的一半到全部）；服务器给出 Retry-After 时至少等待该时长"""
+    base = min(max_backoff, backoff_factor * (2 ** attempt))
+    delay = base / 2 + random.uniform(0, base / 2)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, MAX_RETRY_AFTER))
+    return delay
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @property
+    def usable(self):
+        return not self.reader.at_eof() and not self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    """按 (scheme, host, port) 保存空闲连接，请求结束且响应读完后放回复用"""
+
+    def __init__(self, max_idle_per_host=deepseek_client.MAX_CONCURRENT_REQUESTS, connect_timeout=DEFAULT_CONNECT_TIMEOUT, ssl_context=None):
+        self.max_idle_per_host = max_idle_per_host
+        self.connect_timeout = connect_timeout
+        self.ssl_context = ssl_context
+        self._idle = {}
+        self.created = 0
+        self.reused = 0
+
+    async def acquire(self, key):
+        """返回 (连接, 是否复用)"""
+        idle = self._idle.get(key)
+        while idle:
+            conn = idle.pop()
+            if conn.usable:
+                self.reused += 1
+                return conn, True
+            conn.close()
+        scheme, host, port = key
+        ssl_context = None
+        if scheme == "https":
+            ssl_context = self.ssl_context or ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=ssl_context), self.connect_timeout)
+        self.created += 1
+        return _Connection(reader, writer), False
+
+    def release(self, key, conn):
+        idle = self._idle.setdefault(key, [])
+        if conn.usable and len(idle) < self.max_idle_per_host:
+            idle.append(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        for idle in self._idle.values():
+            for conn in idle:
+                conn.close()
+        self._idle.clear()
+
+
+class Response:
+    """HTTP 响应：状态行和头部已读取，正文按需读取；读完后连接回到连接池"""
+
+    def __init__(self, pool, key, conn, status, reason, headers, read_timeout, head_only=False):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.read_timeout = read_timeout
+        self._chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        length = headers.get("content-length")
+        self._remaining = int(length) if length is not None and not self._chunked else None
+        self._keep_alive = headers.get("connection", "").lower() != "close" and (self._chunked or self._remaining is not None)
+        self._chunk_left = 0
+        self._done = head_only or self._remaining == 0
+
+    async def _read(self, coro):
+        return await asyncio.wait_for(coro, self.read_timeout)
+
+    async def read_chunk(self):
+        """返回下一段正文字节，读完时返回 b''"""
+        if self._done:
+            return b""
+        reader = self._conn.reader
+        if self._chunked:
+            if self._chunk_left == 0:
+                size_line = await self._read(reader.readline())
+                if not size_line:
+                    raise asyncio.IncompleteReadError(b"", None)
+                self._chunk_left = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if self._chunk_left == 0:
+                    while (await self._read(reader.readline())).strip(): # Trailers end with an empty line
+                        pass
+                    self._finish()
+                    return b""
+            data = await self._read(reader.read(min(self._chunk_left, 65536)))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", self._chunk_left)
+            self._chunk_left -= len(data)
+            if self._chunk_left == 0:
+                await self._read(reader.readexactly(2)) # CRLF after the chunk data
+            return data
+        if self._remaining is None: # Body runs until the server closes the connection
+            data = await self._read(reader.read(65536))
+            if not data:
+                self._finish()
+            return data
+        data = await self._read(reader.read(min(self._remaining, 65536)))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", self._remaining)
+        self._remaining -= len(data)
+        if self._remaining == 0:
+            self._finish()
+        return data
+
+    async def read(self):
+        parts = []
+        while True:
+            data = await self.read_chunk()
+            if not data:
+                return b"".join(parts)
+            parts.append(data)
+
+    async def json(self):
+        return json.loads((await self.read()).decode('utf-8'))
+
+    async def iter_lines(self):
+        """逐行返回正文（去掉行尾换行符，bytes）"""
+        pending = b""
+        while True:
+            data = await self.read_chunk()
+            if not data:
+                break
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield line.rstrip(b"\r")
+        if pending:
+            yield pending.rstrip(b"\r")
+
+    def _finish(self):
+        self._done = True
+        self.release()
+
+    def release(self):
+        """正文读完且允许保持连接时放回连接池，否则关闭连接"""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if self._done and self._keep_alive:
+            self._pool.release(self._key, conn)
+        else:
+            conn.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+class AsyncHTTPClient:
+    """最小的 HTTP/1.1 客户端（仅支持本模块需要的功能：keep-alive、chunked、连接/读取超时分离）"""
+
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 max_idle_per_host=deepseek_client.MAX_CONCURRENT_REQUESTS, ssl_context=None):
+        self.read_timeout = read_timeout
+        self.pool = ConnectionPool(max_idle_per_host, connect_timeout, ssl_context)
+
+    async def request(self, method, url, headers=None, body=b"", read_timeout=None):
+        """发送请求并读取响应头，返回 Response；调用方读完正文（或 release）后连接才可复用"""
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        host = parts.hostname if port in (80, 443) else f"{parts.hostname}:{port}"
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host}", f"Content-Length: {len(body)}",
+                 "Connection: keep-alive", "Accept-Encoding: identity"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        request_bytes = ("\r\n".join(lines) + "\r\n\r\n").encode('utf-8') + body
+        read_timeout = read_timeout or self.read_timeout
+
+        while True:
+            conn, reused = await self.pool.acquire(key)
+            try:
+                conn.writer.write(request_bytes)
+                await conn.writer.drain()
+                status_line = await asyncio.wait_for(conn.reader.readline(), read_timeout)
+                if not status_line:
+                    raise ConnectionResetError("服务器关闭了连接")
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn.close()
+                if reused: # The server dropped an idle keep-alive connection; retry once on a fresh one
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            break
+
+        try:
+            version, status, reason = (status_line.decode('latin-1').rstrip("\r\n").split(" ", 2) + [""])[:3]
+            headers_out = {}
+            while True:
+                line = await asyncio.wait_for(conn.reader.readline(), read_timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode('latin-1').partition(":")
+                headers_out[name.strip().lower()] = value.strip()
+            if version == "HTTP/1.0":
+                headers_out.setdefault("connection", "close")
+            status = int(status)
+        except BaseException:
+            conn.close()
+            raise
+        return Response(self.pool, key, conn, status, reason, headers_out, read_timeout, head_only=method == "HEAD" or status in (204, 304))
+
+    def close(self):
+        self.pool.close()
+
+
+class AsyncDeepSeekClient:
+    """DeepSeek 标题识别的异步客户端：同一事件循环中的所有请求共享连接池和并发信号量
+
+    analyze() 返回章节列表；stream_sections() 每解析出一个章节调用 on_section。
+    json_mode 为 True 时请求 JSON 输出模式，模型不支持（返回 400/422）时该模型改用普通提示词。
+    失败（不可重试的错误或用尽重试）时抛出 AIAnalysisError。协程被取消时立即中断请求。
+    传入 limiter（rate_limiter.RateLimiter）时，每次尝试前按估算的 token 数排队等待限流器放行。
+    """
+
+    def __init__(self, api_key, api_url=deepseek_client.API_URL, max_concurrency=deepseek_client.MAX_CONCURRENT_REQUESTS,
+                 max_retries=3, backoff_factor=0.5, max_backoff=30.0,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, log=None, ssl_context=None, limiter=None):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.log = log or _noop
+        self.limiter = limiter
+        self.http = AsyncHTTPClient(connect_timeout, read_timeout, max_concurrency, ssl_context)
+        self._semaphore = None
+        self._no_json_mode = set() # Models that rejected response_format
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None: # Created on first use so it belongs to the running loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _open(self, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        response = await self.http.request("POST", self.api_url, deepseek_client.build_headers(self.api_key), body)
+        if response.status == 200:
+            return response
+        async with response:
+            detail = await response.read()
+        raise HTTPStatusError(response.status, detail, parse_retry_after(response.headers.get("retry-after")))
+
+    async def _open_analysis(self, model, text, tag, stream=False, json_mode=False):
+        """发送标题识别请求，返回 (响应, 是否使用了 JSON 输出模式)"""
+        use_json = json_mode and model not in self._no_json_mode
+        try:
+            return await self._open(deepseek_client.build_payload(model, text, stream, use_json)), use_json
+        except HTTPStatusError as e:
+            if not use_json or e.status not in (400, 422):
+                raise
+            self._no_json_mode.add(model)
+            self.log(f"{tag}: 模型 {model} 不支持 JSON 输出模式（{e.status}），改用普通模式: {e.text[:200]}", "WARNING")
+        return await self._open(deepseek_client.build_payload(model, text, stream)), False
+
+    def _json_mode_sections(self, tag, content):
+        """直接解析 JSON 输出模式的回复并按章节结构校验，返回 (章节列表, 是否完整)；无法解析时返回 None"""
+        try:
+            sections, problems = section_json.validate_sections(json.loads(content))
+        except ValueError as e: # Also covers JSONDecodeError, e.g. a reply cut off at max_tokens
+            self.log(f"{tag}: JSON 输出模式的回复无法直接使用（{e}），改用容错解析", "WARNING")
+            return None
+        for problem in problems:
+            self.log(f"{tag}: 跳过不符合章节格式的项目: {problem}", "WARNING")
+        if not sections:
+            return None
+        return sections, not problems
+
+    async def _throttle(self, tag, cost):
+        if self.limiter is not None:
+            await self.limiter.acquire(cost, lambda wait: self.log(f"{tag}: 已达到速率限制，等待 {wait:.1f} 秒（估算 {cost} token）"))
+
+    def _record_usage(self, cost, usage):
+        if self.limiter is not None:
+            self.limiter.settle(cost, rate_limiter.usage_tokens(usage))
+
+    async def _with_retries(self, tag, attempt_fn, cost=0):
+        """执行 attempt_fn(attempt)，网络错误、超时、429 和 5xx 时退避重试；每次尝试都计入限流"""
+        final_error_message = "AI分析失败，请检查网络连接和API Key。"
+        for attempt in range(self.max_retries):
+            retry_after = None
+            await self._throttle(tag, cost)
+            try:
+                async with self.semaphore:
+                    return await attempt_fn(attempt)
+            except HTTPStatusError as e:
+                if e.status not in RETRYABLE_STATUS:
+                    error_detail = e.text[:200]
+                    try: error_detail = json.loads(e.text).get("error", {}).get("message", error_detail)
+                    except (ValueError, AttributeError): pass
+                    self.log(f"{tag}: 尝试 {attempt + 1} - API客户端错误 {e.status}: {e.text[:200]}", "WARNING")
+                    raise deepseek_client.AIAnalysisError(f"AI请求失败(客户端错误)，错误码：{e.status}\n详情: {error_detail}")
+                self.log(f"{tag}: 尝试 {attempt + 1} - API服务器错误 {e.status}: {e.text[:200]}", "WARNING")
+                final_error_message = f"AI请求失败(服务器错误)，错误码：{e.status}\n详情: {e.text[:200]}..."
+                retry_after = e.retry_after
+                if e.status == 429 and self.limiter is not None: # Hold back every request sharing this key, not just this one
+                    self.limiter.pause(backoff_delay(0, self.backoff_factor, self.max_backoff, retry_after))
+            except asyncio.TimeoutError:
+                self.log(f"{tag}: 尝试 {attempt + 1} - 请求超时", "WARNING")
+                final_error_message = "网络请求超时"
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e: # ValueError: malformed HTTP or JSON
+                self.log(f"{tag}: 尝试 {attempt + 1} - 网络或请求错误: {e}", "WARNING")
+                final_error_message = f"网络或请求错误: {e}"
+
+            if attempt < self.max_retries - 1:
+                wait_time = backoff_delay(attempt, self.backoff_factor, self.max_backoff, retry_after)
+                self.log(f"{tag}: 等待 {wait_time:.2f} 秒后重试...")
+                await asyncio.sleep(wait_time)
+
+        self.log(f"{tag}: 所有 {self.max_retries} 次尝试均失败。最终错误: {final_error_message}", "ERROR")
+        raise deepseek_client.AIAnalysisError(final_error_message)
+
+    def _log_parse_report(self, tag, dropped, repaired):
+        for bad_text in dropped:
+            self.log(f"{tag}: 跳过无法解析的章节对象: {bad_text}", "WARNING")
+        for fixed_text in repaired:
+            self.log(f"{tag}: 已修复格式有误或被截断的章节对象: {fixed_text}", "WARNING")
+
+    async def analyze(self, model, text, tag="async_deepseek", json_mode=False):
+        """非流式识别一段文本，返回 (章节列表, 是否完整解析)
+
+        回复中的 JSON 有缺陷或被截断时返回能恢复的章节而不重试；一个章节都没有恢复出来时才重试。
+        """
+        cost = rate_limiter.estimate_request_tokens(deepseek_client.build_payload(model, text, json_mode=json_mode), text)
+
+        async def attempt_fn(attempt):
+            self.log(f"{tag}: 尝试 {attempt + 1}/{self.max_retries} - 开始请求模型 {model}")
+            response, use_json = await self._open_analysis(model, text, tag, json_mode=json_mode)
+            async with response:
+                result = await response.json()
+            self._record_usage(cost, result.get('usage'))
+            content = deepseek_client.response_content(result)
+            if content is None or not content.strip():
+                raise ValueError("AI未能生成有效响应内容或响应结构错误")
+            if use_json:
+                validated = self._json_mode_sections(tag, content)
+                if validated is not None:
+                    self.log(f"{tag}: 尝试 {attempt + 1} - JSON 输出模式，识别到 {len(validated[0])} 个章节。")
+                    return validated
+            parsed = section_json.parse_sections(content)
+            if not parsed.sections:
+                raise ValueError(f"AI返回的内容中没有可解析的章节JSON数组: {content[:200]}")
+            if parsed.complete:
+                self.log(f"{tag}: 尝试 {attempt + 1} - JSON解析成功，识别到 {len(parsed.sections)} 个章节。")
+            else:
+                self._log_parse_report(tag, parsed.dropped, parsed.repaired)
+                self.log(f"{tag}: 尝试 {attempt + 1} - 回复的JSON不完整，{parsed.summary()}，不再重试", "WARNING")
+            return parsed.sections, parsed.complete
+
+        return await self._with_retries(tag, attempt_fn, cost)
+
+    async def stream_sections(self, model, text, on_section, on_progress=_noop, tag="async_deepseek", json_mode=False):
+        """流式识别一段文本，每个章节对象一闭合就调用 on_section；返回 (章节列表, 是否完整解析)
+
+        已经交出章节后传输中断不再重试（重试会重复导入），直接抛出 AIAnalysisError。
+        """
+        cost = rate_limiter.estimate_request_tokens(deepseek_client.build_payload(model, text, True, json_mode), text)
+        delivered = []
+
+        async def attempt_fn(attempt):
+            parser = section_json.SectionArrayParser()
+            usage = None
+            chunk_count = 0
+            done = False
+            try:
+                response, _ = await self._open_analysis(model, text, tag, True, json_mode)
+                async with response: # The incremental parser finds the array inside {"sections": [...]} as well
+                    self.log(f"{tag}: 尝试 {attempt + 1} - 收到响应，状态码: {response.status}")
+                    async for line in response.iter_lines(): # Read to the end so the connection can be reused
+                        event = deepseek_client.parse_sse_line(line)
+                        if event is deepseek_client.SSE_DONE:
+                            done = True
+                        if done or event is None:
+                            continue
+                        item = deepseek_client.stream_delta(event)
+                        if item is None:
+                            continue
+                        delta, chunk_usage = item
+                        chunk_count += 1; usage = chunk_usage or usage
+                        new_sections = parser.feed(delta)
+                        for section_item in new_sections:
+                            delivered.append(section_item)
+                            on_section(section_item)
+                        if new_sections or chunk_count % 20 == 0:
+                            on_progress(chunk_count, len(new_sections)); chunk_count = 0
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                if delivered:
+                    for section_item in parser.finish(): # Keep the part of the last section received so far
+                        delivered.append(section_item)
+                        on_section(section_item)
+                    raise deepseek_client.AIAnalysisError(f"流式传输中断: {e}")
+                raise
+            for section_item in parser.finish(): # The reply stopped before the array was closed
+                delivered.append(section_item)
+                on_section(section_item)
+            self._log_parse_report(tag, parser.errors, parser.repaired)
+            if usage: self.log(f"{tag}: token 用量: {usage}（估算 {cost}）")
+            self._record_usage(cost, usage)
+            if not delivered:
+                raise ValueError("AI未返回有效的章节JSON数组")
+            self.log(f"{tag}: 流式接收完成，共 {len(delivered)} 个章节")
+            return list(delivered), parser.complete
+
+        return await self._with_retries(tag, attempt_fn, cost)
+
+    def close(self):
+        self.http.close()
+
+
+class AsyncLoopThread:
+    """在守护线程中运行的事件循环（与 Tk 主循环并存），其他线程通过 submit/run 提交协程"""
+
+    def __init__(self, name="ai-event-loop"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """提交协程，返回 concurrent.futures.Future（cancel() 会取消对应的任务）"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, cancel=None, poll_interval=0.1):
+        """在调用线程中等待协程结果；取消令牌被触发时取消协程并抛出 Cancelled"""
+        future = self.submit(coro)
+        while True:
+            if cancel is not None and cancel.cancelled:
+                future.cancel()
+                raise job_control.Cancelled()
+            try:
+                return future.result(timeout=poll_interval)
+            except concurrent.futures.TimeoutError:
+                continue
+
+    def call_soon(self, callback, *args):
+        self.start()
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self._thread.join(timeout=2)
+                self._thread = None
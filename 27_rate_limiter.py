@@ -0,0 +1,213 @@
+import asyncio
+import importlib
+import math
+import re
+import threading
+import time
+
+deepseek_client = importlib.import_module("11_deepseek_client")
+text_chunker = importlib.import_module("13_text_chunker")
+
+# 客户端 token 预算与限流：发送前估算请求的 token 数，超长文本直接拒绝或继续切分；
+# 同一个 API Key 的所有请求共用一个令牌桶限流器，同时限制每分钟请求数和每分钟 token 数。
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_TOKENS_PER_MINUTE = 100000
+DEFAULT_MAX_CHUNK_TOKENS = 3000 # 模型要在回复中复述正文，单块需远低于单次回复的 token 上限（8K）
+DEFAULT_MAX_INPUT_TOKENS = 200000 # 一次分析的全部文本
+
+# DeepSeek 文档给出的经验值：1 个中文字符约 0.6 token，1 个英文字符约 0.3 token
+CJK_TOKENS_PER_CHAR = 0.6
+LATIN_TOKENS_PER_CHAR = 0.3
+OTHER_TOKENS_PER_CHAR = 1.0 # 其他非 ASCII 字符（符号、表情等）按每字符 1 token 保守估计
+MESSAGE_OVERHEAD_TOKENS = 4 # 每条消息的角色和分隔标记
+OUTPUT_RATIO = 1.1 # 回复以 JSON 形式复述全部正文，另加标题和字段名
+
+_CJK = re.compile('[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+_ASCII_VISIBLE = re.compile('[\x21-\x7e]')
+_NON_ASCII = re.compile('[^\x00-\x7f]')
+
+
+class InputTooLargeError(deepseek_client.AIAnalysisError):
+    """文本或单个请求的估算 token 数超过上限，请求未发送"""
+
+
+def estimate_tokens(text):
+    """粗略估算文本的 token 数（中日韩字符与拉丁字符分别计算，空白不计），结果向上取整"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    other = len(_NON_ASCII.findall(text)) - cjk
+    latin = len(_ASCII_VISIBLE.findall(text))
+    return math.ceil(cjk * CJK_TOKENS_PER_CHAR + latin * LATIN_TOKENS_PER_CHAR + other * OTHER_TOKENS_PER_CHAR)
+
+
+def estimate_prompt_tokens(payload):
+    """估算请求体中全部消息的 token 数"""
+    return sum(estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for message in payload.get("messages", []))
+
+
+def estimate_request_tokens(payload, text):
+    """估算一次标题识别请求消耗的 token 数（提示词加上复述 text 的回复）"""
+    return estimate_prompt_tokens(payload) + math.ceil(estimate_tokens(text) * OUTPUT_RATIO)
+
+
+def plan_chunks(text, max_chunk_tokens=DEFAULT_MAX_CHUNK_TOKENS, max_input_tokens=DEFAULT_MAX_INPUT_TOKENS,
+                max_chars=text_chunker.DEFAULT_MAX_CHARS):
+    """按字符数切块后，把估算 token 数超过 max_chunk_tokens 的块继续切小
+
+    整段文本超过 max_input_tokens 时抛出 InputTooLargeError（不发送任何请求）。
+    max_input_tokens 或 max_chunk_tokens 为 0 表示不限制。
+    """
+    total = estimate_tokens(text)
+    if max_input_tokens and total > max_input_tokens:
+        raise InputTooLargeError(f"文本过长：估算约 {total} token，超过单次分析上限 {max_input_tokens} token。\n"
+                                 "请分段分析，或在 config.ini 的 [DEEPSEEK] 中调高 max_input_tokens。")
+    chunks = text_chunker.split_text(text, max_chars)
+    if not max_chunk_tokens:
+        return chunks
+    planned = []
+    pending = list(reversed(chunks))
+    while pending:
+        chunk = pending.pop()
+        tokens = estimate_tokens(chunk)
+        if tokens <= max_chunk_tokens or len(chunk) <= 1:
+            planned.append(chunk)
+            continue
+        # Scale the character budget by how far over the token budget the chunk is
+        smaller = max(1, min(len(chunk) - 1, int(len(chunk) * max_chunk_tokens / tokens)))
+        pending.extend(reversed(text_chunker.split_text(chunk, smaller, overlap_chars=0)))
+    return planned
+
+
+class TokenBucket:
+    """令牌桶：容量 capacity，每秒补充 rate 个；rate 为 0 表示不限制
+
+    reserve() 立即扣除并返回需要等待的秒数（余额可以为负），并发调用按先后顺序排队，
+    等待时间之和不会超过补充速度允许的范围。线程安全。
+    """
+
+    def __init__(self, capacity, rate, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = rate
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def refund(self, amount):
+        """归还预留但未使用的数量（amount 为负数时补扣）"""
+        if not self.rate:
+            return
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def set_rate(self, capacity, rate):
+        with self._lock:
+            self._refill(self._clock())
+            self.capacity, self.rate = capacity, rate
+            self._tokens = min(self._tokens, capacity)
+
+    @property
+    def available(self):
+        with self._lock:
+            self._refill(self._clock())
+            return self._tokens
+
+
+class RateLimiter:
+    """同时限制每分钟请求数和每分钟 token 数；服务器返回 429 时可暂停所有请求
+
+    acquire(tokens) 在事件循环中等待直到两个令牌桶都有余量；等待期间被取消会归还预留。
+    单个请求超过每分钟 token 上限时永远无法放行，直接抛出 InputTooLargeError。
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, clock=time.monotonic):
+        self._clock = clock
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0, clock)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0, clock)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.waited = 0.0 # Total seconds spent waiting, for diagnostics
+
+    def configure(self, requests_per_minute, tokens_per_minute):
+        self.requests.set_rate(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens.set_rate(tokens_per_minute, tokens_per_minute / 60.0)
+
+    def pause(self, seconds):
+        """在 seconds 秒内不放行新请求（例如收到带 Retry-After 的 429）"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def reserve(self, tokens):
+        """预留一次请求和 tokens 个 token，返回需要等待的秒数"""
+        if self.tokens.rate and tokens > self.tokens.capacity:
+            raise InputTooLargeError(f"单个请求估算约 {tokens} token，超过每分钟 token 上限 {self.tokens.capacity}，请减小分块大小。")
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        with self._lock:
+            wait = max(wait, self._paused_until - self._clock())
+        return wait
+
+    def release(self, tokens):
+        """撤销一次尚未发送的预留"""
+        self.requests.refund(1)
+        self.tokens.refund(tokens)
+
+    def settle(self, reserved, used):
+        """请求完成后按服务器报告的实际用量修正 token 桶"""
+        if used is not None:
+            self.tokens.refund(reserved - used)
+
+    async def acquire(self, tokens, on_wait=None):
+        """等待到可以发送一次消耗 tokens 的请求，返回等待的秒数"""
+        wait = self.reserve(tokens)
+        if wait <= 0:
+            return 0.0
+        if on_wait is not None:
+            on_wait(wait)
+        try:
+            await asyncio.sleep(wait)
+        except BaseException:
+            self.release(tokens)
+            raise
+        self.waited += wait
+        return wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(api_key, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+    """返回该 API Key 在本进程中共用的限流器；限额变化时就地更新，已有的预留保留"""
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = _limiters[api_key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        elif (limiter.requests.capacity, limiter.tokens.capacity) != (requests_per_minute, tokens_per_minute):
+            limiter.configure(requests_per_minute, tokens_per_minute)
+        return limiter
+
+
+def usage_tokens(usage):
+    """响应 usage 字段中的总 token 数；没有时返回 None"""
+    if not isinstance(usage, dict):
+        return None
+    total = usage.get("total_tokens")
+    if total is None and ("prompt_tokens" in usage or "completion_tokens" in usage):
+        total = (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+    return total
@@ -0,0 +1,332 @@
+import codecs
+import importlib
+import os
+import re
+import zipfile
+
+from lxml import etree
+
+heading_detector = importlib.import_module("15_heading_detector")
+
+# 大纲导入：把已有结构的 Markdown、编号纯文本和 .docx 文件在一次扫描中转换为
+# {level, title, content} 章节记录，逐个产出，不需要调用 AI，也不需要把整个文件读进内存。
+
+MAX_LEVEL = 3
+ENCODING_SAMPLE_BYTES = 64 * 1024
+TOC_HEADING_MAX_CHARS = 20 # 目录之前不超过此长度的段落视为“目 录”标题
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_P, W_T, W_TAB, W_BR, W_CR = f'{_W}p', f'{_W}t', f'{_W}tab', f'{_W}br', f'{_W}cr'
+W_TXBX = f'{_W}txbxContent'
+
+_ATX_HEADING = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+_SETEXT_UNDERLINE = re.compile(r'^ {0,3}(=+|-+)[ \t]*$')
+_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+_FRONT_MATTER_TITLE = re.compile(r'^title\s*:\s*(.*?)\s*$')
+_HEADING_STYLE_NAME = re.compile(r'^(?:heading|标题)\s*(\d)$', re.IGNORECASE)
+_TITLE_STYLE_NAMES = ('title', '标题', '文档标题')
+
+
+class ImportStats:
+    """一次导入的统计信息；heading_count 等字段名与 heading_detector.DetectionResult 相同"""
+
+    def __init__(self):
+        self.title = None           # 文档标题（Markdown front matter 的 title 或 .docx 的标题样式段落）
+        self.heading_count = 0
+        self.too_deep = 0           # 超过三级、按正文处理的标题
+        self.sequence_errors = 0    # 仅纯文本：编号不连续
+        self.ambiguous_lines = 0    # 仅纯文本：无法判断是否为标题的编号行
+        self.skipped = 0            # 跳过的目录段落
+
+    def summary(self):
+        parts = [f"标题 {self.heading_count} 个"]
+        if self.too_deep: parts.append(f"超过三级 {self.too_deep} 处（按正文导入）")
+        if self.skipped: parts.append(f"跳过目录段落 {self.skipped} 个")
+        return "，".join(parts)
+
+
+class _SectionBuilder:
+    """按顺序收集标题和正文行，产出章节；第一个标题之前的正文按 heading_detector 的规则处理"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.preamble = []
+        self.current = None
+        self.body = self.preamble
+
+    def heading(self, level, title):
+        """开始一个新章节，返回上一个已完成的章节（没有时返回 None）"""
+        self.stats.heading_count += 1
+        if self.current is not None:
+            finished = self._finish()
+        else:
+            finished = heading_detector.preamble_section(self.preamble)
+        self.body = []
+        self.current = (level, title)
+        return finished
+
+    def _finish(self):
+        level, title = self.current
+        return {'level': level, 'title': title, 'content': heading_detector._join_body(self.body)}
+
+    def close(self):
+        if self.current is not None:
+            return self._finish()
+        return heading_detector.preamble_section(self.preamble)
+
+
+def iter_markdown_sections(lines, stats=None):
+    """逐行解析 Markdown：# / ## / ### 标题（也支持 === / --- 下划线标题），代码块中的 # 不视为标题
+
+    级别按标题的相对层次计算，例如全文从 ## 开始时 ## 为一级；超过三级的标题按正文导入。
+    文件开头的 YAML front matter 被跳过，其中的 title 记入 stats.title。
+    """
+    stats = stats if stats is not None else ImportStats()
+    builder = _SectionBuilder(stats)
+    levels = []             # 当前标题路径上各级的 # 数量
+    fence = None
+    front_matter = None     # Lines of an unterminated front matter block
+    previous_blank = True
+    for index, raw_line in enumerate(lines):
+        line = raw_line.rstrip('\r\n')
+        if index == 0 and line.strip() == '---':
+            front_matter = []
+            continue
+        if front_matter is not None:
+            if line.strip() in ('---', '...'):
+                for item in front_matter:
+                    match = _FRONT_MATTER_TITLE.match(item)
+                    if match:
+                        stats.title = match.group(1).strip('\'"')
+                front_matter = None
+            else:
+                front_matter.append(line)
+            continue
+
+        fence_match = _FENCE.match(line)
+        if fence is not None or fence_match:
+            if fence is None:
+                fence = fence_match.group(1)[0] * len(fence_match.group(1))
+            elif line.strip().startswith(fence):
+                fence = None
+            builder.body.append(line)
+            previous_blank = False
+            continue
+
+        heading = None
+        match = _ATX_HEADING.match(line)
+        if match and (match.group(2) or '').strip():
+            heading = len(match.group(1)), match.group(2).strip()
+        else:
+            underline = _SETEXT_UNDERLINE.match(line)
+            if underline and not previous_blank and builder.body and builder.body[-1].strip():
+                heading = (1 if underline.group(1)[0] == '=' else 2), builder.body.pop().strip()
+
+        if heading is None:
+            builder.body.append(line)
+            previous_blank = not line.strip()
+            continue
+
+        depth, title = heading
+        while levels and levels[-1] >= depth:
+            levels.pop()
+        levels.append(depth)
+        if len(levels) > MAX_LEVEL:
+            stats.too_deep += 1
+            builder.body.append(title)
+            previous_blank = False
+            continue
+        finished = builder.heading(len(levels), title)
+        if finished is not None:
+            yield finished
+        previous_blank = True
+
+    for line in front_matter or []: # Never closed, so it was body text after all
+        builder.body.append(line)
+    finished = builder.close()
+    if finished is not None:
+        yield finished
+
+
+def iter_text_sections(lines, stats=None):
+    """逐行解析编号纯文本（一、/（一）/1./1.1 等），规则与本地标题识别相同"""
+    stats = stats if stats is not None else ImportStats()
+    return heading_detector.iter_sections((line.rstrip('\r\n') for line in lines), stats)
+
+
+def read_docx_styles(archive):
+    """读取 styles.xml，返回 {样式 id: (标题级别或 None, 类别)}，类别为 'title'、'toc' 或 None"""
+    try:
+        root = etree.fromstring(archive.read('word/styles.xml'))
+    except KeyError:
+        return {}
+    raw = {}
+    for style in root.iter(f'{_W}style'):
+        if style.get(f'{_W}type') != 'paragraph':
+            continue
+        style_id = style.get(f'{_W}styleId')
+        name = style.find(f'{_W}name')
+        name = (name.get(f'{_W}val') if name is not None else '').strip()
+        based_on = style.find(f'{_W}basedOn')
+        outline = style.find(f'{_W}pPr/{_W}outlineLvl')
+        level = _outline_level(outline)
+        match = _HEADING_STYLE_NAME.match(name)
+        if level is None and match:
+            level = int(match.group(1))
+        kind = None
+        if name.lower() in _TITLE_STYLE_NAMES or style_id in ('Title', 'DocTitleStyle'):
+            kind = 'title'
+        elif name.lower().startswith(('toc', '目录')):
+            kind = 'toc'
+        raw[style_id] = (level, kind, based_on.get(f'{_W}val') if based_on is not None else None)
+
+    resolved = {}
+    for style_id in raw:
+        level, kind, parent = raw[style_id]
+        seen = {style_id}
+        while level is None and parent in raw and parent not in seen: # Outline level is inherited through basedOn
+            seen.add(parent)
+            level, _, parent = raw[parent]
+        resolved[style_id] = (level, kind)
+    return resolved
+
+
+def _outline_level(element):
+    """w:outlineLvl 转为标题级别（0 为一级）；9 表示正文，返回 None"""
+    if element is None:
+        return None
+    try:
+        value = int(element.get(f'{_W}val'))
+    except (TypeError, ValueError):
+        return None
+    return value + 1 if 0 <= value < 9 else None
+
+
+def _paragraph_text(paragraph):
+    parts = []
+    for node in paragraph.iter(W_T, W_TAB, W_BR, W_CR):
+        if node.tag == W_T:
+            parts.append(node.text or '')
+        elif node.tag == W_TAB:
+            parts.append('\t')
+        else:
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def _has_toc_field(paragraph):
+    return (any('TOC' in (node.text or '') for node in paragraph.iter(f'{_W}instrText'))
+            or any('TOC' in (node.get(f'{_W}instr') or '') for node in paragraph.iter(f'{_W}fldSimple')))
+
+
+def iter_docx_paragraphs(archive):
+    """流式读取 .docx 正文，逐个产出 (样式 id, 段落大纲级别或 None, 段落文本, 是否含目录域)
+
+    用 iterparse 逐段解析 word/document.xml，处理完的段落立即释放，内存占用与文档长度无关。
+    """
+    with archive.open('word/document.xml') as stream:
+        for _, paragraph in etree.iterparse(stream, events=('end',), tag=W_P):
+            if next(paragraph.iterancestors(W_TXBX), None) is not None:
+                continue # Text boxes are read as part of the enclosing paragraph
+            p_pr = paragraph.find(f'{_W}pPr')
+            style_id = outline = None
+            if p_pr is not None:
+                style = p_pr.find(f'{_W}pStyle')
+                style_id = style.get(f'{_W}val') if style is not None else None
+                outline_element = p_pr.find(f'{_W}outlineLvl')
+                outline = _outline_level(outline_element)
+            item = style_id, outline, _paragraph_text(paragraph), _has_toc_field(paragraph)
+            paragraph.clear(keep_tail=True)
+            parent = paragraph.getparent()
+            if parent is not None: # Drop already processed siblings
+                while paragraph.getprevious() is not None:
+                    del parent[0]
+            yield item
+
+
+def iter_docx_sections(path, stats=None):
+    """解析已有 .docx：按标题样式（或段落大纲级别）识别一至三级标题，其余段落作为正文
+
+    标题样式的段落记为文档标题，目录段落及其前面的“目 录”标题被跳过。
+    """
+    stats = stats if stats is not None else ImportStats()
+    builder = _SectionBuilder(stats)
+    in_toc = False
+    with zipfile.ZipFile(path) as archive:
+        styles = read_docx_styles(archive)
+        for style_id, outline, text, has_toc_field in iter_docx_paragraphs(archive):
+            level, kind = styles.get(style_id, (None, None))
+            level = outline or level
+            if kind == 'toc' or has_toc_field:
+                if not in_toc and builder.current is None and builder.body and len(builder.body[-1].strip()) <= TOC_HEADING_MAX_CHARS:
+                    builder.body.pop() # The "目 录" heading right before the table of contents
+                in_toc = True
+                stats.skipped += 1
+                continue
+            in_toc = False
+            if kind == 'title' and stats.title is None and builder.current is None:
+                stats.title = text.strip()
+                continue
+            if level is None or not text.strip():
+                builder.body.append(text)
+                continue
+            if level > MAX_LEVEL:
+                stats.too_deep += 1
+                builder.body.append(text)
+                continue
+            finished = builder.heading(level, text.strip())
+            if finished is not None:
+                yield finished
+    finished = builder.close()
+    if finished is not None:
+        yield finished
+
+
+def _open_text(path):
+    """以 UTF-8 打开文本文件；开头的样本不是有效 UTF-8 时按 GB18030 读取"""
+    with open(path, 'rb') as f:
+        sample = f.read(ENCODING_SAMPLE_BYTES)
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(sample, final=False) # A character cut at the end is fine
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'gb18030'
+    return open(path, 'r', encoding=encoding, errors='replace')
+
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+TEXT_EXTENSIONS = ('.txt',)
+DOCX_EXTENSIONS = ('.docx',)
+OUTLINE_EXTENSIONS = MARKDOWN_EXTENSIONS + TEXT_EXTENSIONS + DOCX_EXTENSIONS
+
+
+def is_outline_file(path):
+    return path.lower().endswith(OUTLINE_EXTENSIONS)
+
+
+def iter_outline_file(path, stats=None):
+    """按扩展名选择解析器，逐个产出文件中的章节；不支持的格式或损坏的 .docx 抛出 ValueError"""
+    stats = stats if stats is not None else ImportStats()
+    lower = path.lower()
+    if lower.endswith(DOCX_EXTENSIONS):
+        try:
+            yield from iter_docx_sections(path, stats)
+        except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError) as e:
+            raise ValueError(f"无法解析 Word 文件 {os.path.basename(path)}: {e}")
+        return
+    if lower.endswith(MARKDOWN_EXTENSIONS):
+        parse = iter_markdown_sections
+    elif lower.endswith(TEXT_EXTENSIONS):
+        parse = iter_text_sections
+    else:
+        raise ValueError(f"不支持的大纲文件格式: {os.path.basename(path)}")
+    with _open_text(path) as f:
+        yield from parse(f, stats)
+
+
+def load_outline_spec(path):
+    """把大纲文件转换为文档描述字典（文件名取自路径，文档标题优先取文件中的标题）"""
+    stats = ImportStats()
+    sections = list(iter_outline_file(path, stats))
+    filename = os.path.splitext(os.path.basename(path))[0]
+    return {"filename": filename, "document_title": stats.title or filename, "sections": sections}
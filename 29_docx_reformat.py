@@ -0,0 +1,281 @@
+"""把已有 .docx 文件批量改为本工具的公文样式（不重建正文）
+
+用法示例:
+    python 29_docx_reformat.py legacy/ -o reformatted --config config.ini
+    python 29_docx_reformat.py legacy/ --in-place -j 8
+"""
+import argparse
+import copy
+import importlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lxml import etree
+
+doc_spec = importlib.import_module("07_doc_spec")
+docx_engine = importlib.import_module("08_docx_engine")
+streaming_docx = importlib.import_module("21_streaming_docx")
+outline_importers = importlib.import_module("28_outline_importers")
+
+# 只改写 word/styles.xml 和各部件中段落的 w:pStyle 引用：标题样式映射到一至三级标题样式，
+# 标题样式映射到 DocTitleStyle，自身带一至三级大纲级别的段落设为对应的标题样式，
+# 其余段落沿用原样式（Normal 被替换为本工具的正文样式）。
+# 正文 XML 按块流式替换，不解析、不重建文档树；其余部件原样复制。
+
+STYLES_PART = "word/styles.xml"
+HOUSE_STYLE_IDS = ("Normal", "DocTitleStyle", "Heading1Style", "Heading2Style", "Heading3Style",
+                   "Heading1", "Heading2", "Heading3", "TOC1", "TOC2", "TOC3")
+HEADING_STYLE_IDS = {1: "Heading1Style", 2: "Heading2Style", 3: "Heading3Style"}
+TITLE_STYLE_ID = "DocTitleStyle"
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_W = '{%s}' % _W_NS
+_P_STYLE = re.compile(rb'<w:pStyle\s+w:val="([^"]*)"\s*/>')
+_P_PR = re.compile(rb'<w:pPr>((?:(?!</?w:pPr[\s>/]).)*?)</w:pPr>', re.S) # Innermost pPr (a pPrChange nests the old one)
+_OUTLINE_LEVEL = re.compile(rb'<w:outlineLvl\s+w:val="(\d+)"\s*/>')
+_REFERENCE_TAGS = (f'{_W}basedOn', f'{_W}next', f'{_W}link')
+
+
+def house_styles_xml(style, log=docx_engine._noop):
+    """用样式模板构建本工具的段落样式，返回只含 HOUSE_STYLE_IDS 的 w:styles XML（字节，可传给工作进程）"""
+    template = docx_engine.new_styled_document(style, log)
+    styles = etree.Element(f'{_W}styles', nsmap={'w': _W_NS})
+    for style_element in template.styles.element.iterchildren(f'{_W}style'):
+        if style_element.get(f'{_W}styleId') in HOUSE_STYLE_IDS:
+            styles.append(copy.deepcopy(style_element))
+    return etree.tostring(styles)
+
+
+def _style_name(style_element):
+    name = style_element.find(f'{_W}name')
+    return (name.get(f'{_W}val') if name is not None else '').strip().lower()
+
+
+def merge_styles(source_xml, house_xml):
+    """把本工具的样式合并进原文档的 styles.xml，返回 (新 XML 字节, 被替换的样式 id -> 新 id)
+
+    与本工具样式同 id 或同名（如中文版 Word 中 id 为 "a" 的 Normal、id 为 "1" 的 heading 1）的原样式被移除，
+    其余样式中对它们的 basedOn/next/link 引用改为新 id。表格、列表、字符样式等保持不变。
+    """
+    root = etree.fromstring(source_xml)
+    house = etree.fromstring(house_xml)
+    house_styles = list(house.iterchildren(f'{_W}style'))
+    by_name = {_style_name(element): element.get(f'{_W}styleId') for element in house_styles}
+    house_ids = {element.get(f'{_W}styleId') for element in house_styles}
+
+    replaced = {}
+    insert_at = None
+    for element in list(root.iterchildren(f'{_W}style')):
+        if element.get(f'{_W}type') != 'paragraph':
+            continue
+        style_id = element.get(f'{_W}styleId')
+        new_id = style_id if style_id in house_ids else by_name.get(_style_name(element))
+        if new_id is None:
+            continue
+        if insert_at is None:
+            insert_at = root.index(element)
+        root.remove(element)
+        if new_id != style_id:
+            replaced[style_id] = new_id
+
+    if insert_at is None:
+        insert_at = len(root)
+    for offset, element in enumerate(house_styles):
+        root.insert(insert_at + offset, copy.deepcopy(element))
+
+    if replaced:
+        for element in root.iterchildren(f'{_W}style'):
+            for reference in element.iterchildren(*_REFERENCE_TAGS):
+                value = reference.get(f'{_W}val')
+                if value in replaced:
+                    reference.set(f'{_W}val', replaced[value])
+    return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True), replaced
+
+
+def paragraph_style_map(styles, replaced):
+    """原样式 id -> 新样式 id：标题类样式映射为标题样式，一至三级标题映射为对应的标题样式，
+    被替换的样式映射为替换它的样式；styles 为 outline_importers.read_docx_styles 的结果"""
+    mapping = dict(replaced)
+    for style_id, (level, kind) in styles.items():
+        if kind == 'title':
+            mapping[style_id] = TITLE_STYLE_ID
+        elif kind is None and level in HEADING_STYLE_IDS:
+            mapping[style_id] = HEADING_STYLE_IDS[level]
+    return {old: new for old, new in mapping.items() if old != new}
+
+
+def rewrite_part_stream(source, target, mapping, keep_ids=()):
+    """按块复制 XML 部件，只改写段落的 w:pStyle，返回改写的段落数
+
+    与 outline_importers 的规则一致，段落自身的大纲级别（w:pPr 中的 w:outlineLvl 0~2）优先于样式：
+    这样的段落设为对应的标题样式（没有 w:pStyle 时插入）；keep_ids 中的样式（标题、目录）不受影响。
+    其余段落按 mapping 替换样式 id。每块在最后一个段落开始处截断，剩余部分并入下一块，
+    因此一个段落的 w:pPr 不会被切开。
+    """
+    encoded = {old.encode('utf-8'): new.encode('utf-8') for old, new in mapping.items()}
+    keep = {style_id.encode('utf-8') for style_id in keep_ids}
+    count = 0
+
+    def replace_outline(match):
+        nonlocal count
+        inner = match.group(1)
+        outline = _OUTLINE_LEVEL.search(inner)
+        heading_id = HEADING_STYLE_IDS.get(int(outline.group(1)) + 1) if outline else None
+        if heading_id is None:
+            return match.group(0)
+        style = _P_STYLE.search(inner)
+        if style is None:
+            inner = b'<w:pStyle w:val="' + heading_id.encode('utf-8') + b'"/>' + inner # pStyle is the first child of pPr
+        elif style.group(1) in keep:
+            return match.group(0)
+        else:
+            inner = inner[:style.start()] + b'<w:pStyle w:val="' + heading_id.encode('utf-8') + b'"/>' + inner[style.end():]
+        count += 1
+        return b'<w:pPr>' + inner + b'</w:pPr>'
+
+    def replace_style(match):
+        nonlocal count
+        new_id = encoded.get(match.group(1))
+        if new_id is None:
+            return match.group(0)
+        count += 1
+        return b'<w:pStyle w:val="' + new_id + b'"/>'
+
+    def rewrite(data):
+        if b'outlineLvl' in data:
+            data = _P_PR.sub(replace_outline, data)
+        return _P_STYLE.sub(replace_style, data) if encoded else data
+
+    pending = b''
+    while True:
+        chunk = source.read(STREAM_CHUNK_BYTES)
+        data = pending + chunk
+        if not chunk:
+            target.write(rewrite(data))
+            return count
+        cut = max(data.rfind(b'<w:p>'), data.rfind(b'<w:p '))
+        if cut <= 0:
+            pending = data
+            continue
+        target.write(rewrite(data[:cut]))
+        pending = data[cut:]
+
+
+def reformat_docx(source_path, target_path, house_xml):
+    """改写一个 .docx，返回改写的段落样式引用数；target_path 可以与 source_path 相同（原地改写）"""
+    fd, temp_path = streaming_docx.new_temp_file(target_path) # Unique per run, so overlapping --in-place runs don't collide
+    try:
+        with os.fdopen(fd, 'wb') as temp_file, zipfile.ZipFile(source_path) as source:
+            styles = outline_importers.read_docx_styles(source)
+            try:
+                styles_xml = source.read(STYLES_PART)
+            except KeyError:
+                raise ValueError("文档没有 styles.xml")
+            merged_xml, replaced = merge_styles(styles_xml, house_xml)
+            mapping = paragraph_style_map(styles, replaced)
+            keep_ids = [style_id for style_id, (level, kind) in styles.items() if kind is not None]
+            rewritten = 0
+            with zipfile.ZipFile(temp_file, 'w', compression=zipfile.ZIP_DEFLATED) as target:
+                for info in source.infolist():
+                    if info.filename == STYLES_PART:
+                        target.writestr(info, merged_xml, compress_type=zipfile.ZIP_DEFLATED)
+                    elif info.filename.startswith('word/') and info.filename.endswith('.xml'):
+                        with source.open(info) as part, target.open(info.filename, 'w', force_zip64=True) as out:
+                            rewritten += rewrite_part_stream(part, out, mapping, keep_ids)
+                    else:
+                        with source.open(info) as part, target.open(info, 'w', force_zip64=True) as out:
+                            shutil.copyfileobj(part, out)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return rewritten
+
+
+def find_docx_files(paths, recursive=True):
+    """展开目录（可递归）和文件参数，返回 [(文件路径, 相对于所在输入目录的路径)]；跳过 Word 的 ~$ 临时文件"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith('.docx') and not filename.startswith('~$'):
+                        full_path = os.path.join(dirpath, filename)
+                        found.append((full_path, os.path.relpath(full_path, path)))
+                if not recursive:
+                    break
+        else:
+            found.append((path, os.path.basename(path)))
+    return found
+
+
+def reformat_job(source_path, target_path, house_xml):
+    """在工作进程中改写一个文件，返回 (source_path, target_path, error, rewritten, elapsed_seconds)"""
+    start = time.perf_counter()
+    try:
+        target_dir = os.path.dirname(target_path)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        rewritten = reformat_docx(source_path, target_path, house_xml)
+    except (OSError, ValueError, zipfile.BadZipFile, etree.XMLSyntaxError) as e:
+        return source_path, target_path, str(e), 0, time.perf_counter() - start
+    return source_path, target_path, None, rewritten, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把已有 Word 文档批量改为统一的标题和正文样式（只改样式，不重建正文）")
+    parser.add_argument("paths", nargs="+", help=".docx 文件或目录（目录下的 .docx 全部处理）")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("-o", "--output-dir", help="输出目录（保持输入目录下的相对路径）")
+    target.add_argument("--in-place", action="store_true", help="直接改写原文件")
+    parser.add_argument("--no-recursive", action="store_true", help="不处理子目录")
+    parser.add_argument("--config", default="config.ini", help="读取 DEFAULT_UI_SETTINGS 作为样式的配置文件")
+    parser.add_argument("--style", help="JSON 格式的样式覆盖文件，字段名同 config.ini")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="并行进程数（默认每个 CPU 核心一个）")
+    args = parser.parse_args(argv)
+
+    style = doc_spec.StyleSpec.from_config(args.config)
+    if args.style:
+        with open(args.style, 'r', encoding='utf-8') as f:
+            style = style.merged(json.load(f))
+
+    files = find_docx_files(args.paths, recursive=not args.no_recursive)
+    if not files:
+        print("没有找到任何 .docx 文件。", file=sys.stderr)
+        return 2
+    jobs = [(source, source if args.in_place else os.path.join(args.output_dir, relative)) for source, relative in files]
+    if not args.in_place and any(os.path.abspath(source) == os.path.abspath(target_path) for source, target_path in jobs):
+        print("输出目录与输入目录相同，请使用 --in-place 或指定其他输出目录。", file=sys.stderr)
+        return 2
+
+    house_xml = house_styles_xml(style) # Built once, shared with every worker
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"共 {len(jobs)} 个文档，使用 {workers} 个进程改写样式...")
+
+    start = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(reformat_job, source, target_path, house_xml) for source, target_path in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            source, target_path, error, rewritten, elapsed = future.result()
+            if error:
+                failures += 1
+                print(f"[{done}/{len(jobs)}] 失败 {source}: {error}", file=sys.stderr)
+            else:
+                print(f"[{done}/{len(jobs)}] {target_path}（{rewritten} 处段落样式，{elapsed:.2f}s）")
+
+    print(f"完成: 成功 {len(jobs) - failures}，失败 {failures}，总耗时 {time.perf_counter() - start:.2f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""按数据源批量套用文档模板（邮件合并）
+
+文档模板与 09_batch_generate.py 的文档描述格式相同，filename、document_title、toc_title
+以及章节的 title 和 content 中可以使用 {{字段名}} 占位符；数据源每一行（记录）生成一份文档。
+
+用法示例:
+    python 30_mail_merge.py notice_template.json recipients.csv -o output --config config.ini
+    python 30_mail_merge.py notice_template.yaml recipients.jsonl -o output -j 4
+"""
+import argparse
+import csv
+import importlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from docx import Document
+
+doc_spec = importlib.import_module("07_doc_spec")
+docx_engine = importlib.import_module("08_docx_engine")
+streaming_docx = importlib.import_module("21_streaming_docx")
+toc_builder = importlib.import_module("22_toc_builder")
+outline_importers = importlib.import_module("28_outline_importers")
+
+# 模板在加载时编译一次：每段文本切分为固定文本和字段名交替的列表，套用记录时只需按位置拼接。
+# 页面、样式、页眉、标题和目录组成的文档开头（骨架）每个进程只构建一次，每份文档从骨架字节克隆，
+# 填入标题和目录标题后，正文在流式写入的同一遍中逐章节替换占位符。
+
+PLACEHOLDER = re.compile(r'\{\{\s*([^{}]*?)\s*\}\}')
+RECORDS_PER_BATCH = 50
+DATA_EXTENSIONS = ('.csv', '.jsonl', '.json')
+
+_FILENAME_UNSAFE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+class MergeFieldError(ValueError):
+    """模板中的字段在数据源中不存在"""
+
+
+class CompiledText:
+    """编译后的模板文本：parts 中偶数位置为固定文本，奇数位置为字段名"""
+
+    def __init__(self, text):
+        self.text = text or ""
+        self.parts = PLACEHOLDER.split(self.text)
+        self.fields = tuple(self.parts[1::2])
+
+    def render(self, record, convert=str):
+        if not self.fields:
+            return self.text
+        parts = list(self.parts)
+        for i in range(1, len(parts), 2):
+            try:
+                value = record[parts[i]]
+            except KeyError:
+                raise MergeFieldError(f"数据中没有字段 '{parts[i]}'") from None
+            parts[i] = "" if value is None else convert(value)
+        return "".join(parts)
+
+
+def _filename_value(value):
+    return _FILENAME_UNSAFE.sub("_", str(value)).strip()
+
+
+class MergeTemplate:
+    """编译后的文档模板；render_spec(record) 返回套用记录后的 DocumentSpec"""
+
+    def __init__(self, spec_dict, base_style=None):
+        spec = doc_spec.DocumentSpec.from_dict(spec_dict, base_style) # Validates sections and style once
+        self.style = spec.style
+        self.filename = CompiledText(spec.filename)
+        self.document_title = CompiledText(spec.document_title)
+        self.toc_title = CompiledText(spec.toc_title)
+        self.sections = [(s['level'], CompiledText(s['title']), CompiledText(s['content'])) for s in spec.sections]
+        texts = [self.filename, self.document_title, self.toc_title] + [t for _, title, content in self.sections for t in (title, content)]
+        self.fields = sorted({field for text in texts for field in text.fields})
+
+    def check_fields(self, columns):
+        """数据源的列缺少模板字段时抛出 MergeFieldError（CSV 在读取表头后检查一次）"""
+        missing = [field for field in self.fields if field not in columns]
+        if missing:
+            raise MergeFieldError(f"数据源缺少模板字段: {', '.join(missing)}")
+
+    def iter_sections(self, record):
+        """逐个产出套用记录后的章节（在写正文的同一遍中替换，不预先生成整份章节列表）"""
+        for level, title, content in self.sections:
+            yield {'level': level, 'title': title.render(record), 'content': content.render(record)}
+
+    def render_head(self, record):
+        """返回 (文件名, 文档标题, 目录标题)；文件名中的字段值去掉路径分隔符等不能用于文件名的字符"""
+        return (self.filename.render(record, _filename_value), self.document_title.render(record),
+                self.toc_title.render(record))
+
+    def render_spec(self, record):
+        filename, document_title, toc_title = self.render_head(record)
+        return doc_spec.DocumentSpec(filename, document_title, toc_title, list(self.iter_sections(record)), self.style)
+
+
+class MergeSkeleton:
+    """已含页面、样式、页眉、空的文档标题和目录的文档开头，保存为 .docx 字节后供每份文档克隆"""
+
+    def __init__(self, style, log=docx_engine._noop):
+        self.style = style
+        placeholder = doc_spec.DocumentSpec("", "", "", style=style)
+        doc, toc_paragraph = docx_engine.build_document_head(placeholder, log)
+        body = list(doc.element.body)
+        self._title_index = body.index(doc.paragraphs[0]._p)
+        self._toc_title_index = body.index(toc_paragraph._p) - 1
+        self._toc_index = body.index(toc_paragraph._p)
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        self.blob = buffer.getvalue()
+
+    def new_document(self, document_title, toc_title):
+        """克隆骨架并填入标题，返回 (document, 目录域段落)"""
+        doc = Document(io.BytesIO(self.blob))
+        paragraphs = {p._p: p for p in doc.paragraphs}
+        body = list(doc.element.body)
+        title_p = paragraphs[body[self._title_index]]
+        if document_title:
+            title_p.add_run(document_title) # Same XML as add_paragraph(text, style)
+        toc_title_run = paragraphs[body[self._toc_title_index]].runs[0]
+        if toc_title:
+            toc_title_run.text = toc_title
+        return doc, paragraphs[body[self._toc_index]]
+
+
+def render_document(template, skeleton, record, doc_path, log=docx_engine._noop, cancel=None):
+    """套用一条记录生成并保存文档，返回 (doc_path, None) 或 (None, error_message)"""
+    try:
+        _, document_title, toc_title = template.render_head(record)
+        doc, toc_paragraph = skeleton.new_document(document_title, toc_title)
+        toc = toc_builder.TocBuilder(template.style)
+        streaming_docx.save_streaming(doc, doc_path,
+                                      lambda writer: docx_engine.write_user_document_content(writer, template.iter_sections(record), log, toc, cancel),
+                                      finalize=lambda document: toc.render(toc_paragraph))
+        return doc_path, None
+    except MergeFieldError as e:
+        return None, str(e)
+    except Exception as e:
+        log(f"错误: {str(e)}")
+        return None, f"生成文档时发生错误:\n{str(e)}"
+
+
+def iter_records(path):
+    """逐条读取数据源（.csv 首行为表头；.jsonl 每行一个对象；.json 为对象数组），产出 (行号, 记录字典)
+
+    CSV 按 UTF-8 读取，不是有效 UTF-8 时按 GB18030（Excel 中文版导出的默认编码）读取；空行跳过。
+    """
+    lower = path.lower()
+    if lower.endswith('.csv'):
+        with outline_importers._open_text(path) as f:
+            reader = csv.DictReader(f)
+            for record in reader:
+                if any(value for value in record.values() if isinstance(value, str)):
+                    yield reader.line_num, record
+        return
+    if lower.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for line_num, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_num, _record_dict(json.loads(line), path, line_num)
+        return
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"JSON 数据源应为对象数组: {path}")
+    for index, item in enumerate(data, 1):
+        yield index, _record_dict(item, path, index)
+
+
+def _record_dict(item, path, position):
+    if not isinstance(item, dict):
+        raise ValueError(f"数据源 {path} 第 {position} 条不是对象")
+    return item
+
+
+def read_columns(path):
+    """CSV 数据源的表头（用于提前检查模板字段）；其他格式返回 None"""
+    if not path.lower().endswith('.csv'):
+        return None
+    with outline_importers._open_text(path) as f:
+        return next(csv.reader(f), [])
+
+
+_skeletons = {} # Per worker process: style -> MergeSkeleton
+
+
+def render_batch(template_dict, base_style_dict, records, output_dir, verbose=False):
+    """在工作进程中套用一批记录，返回 [(行号, doc_path, error, elapsed_seconds)]；骨架在每个进程中只构建一次"""
+    template = MergeTemplate(template_dict, doc_spec.StyleSpec.from_dict(base_style_dict))
+    key = json.dumps(template.style.to_dict(), sort_keys=True, ensure_ascii=False, default=str)
+    skeleton = _skeletons.get(key)
+    if skeleton is None:
+        skeleton = _skeletons[key] = MergeSkeleton(template.style)
+    results = []
+    for line_num, filename, record in records:
+        start = time.perf_counter()
+        log = (lambda msg, level=None, name=filename: print(f"[{name}] {msg}", flush=True)) if verbose else docx_engine._noop
+        doc_path, error = render_document(template, skeleton, record, os.path.join(output_dir, f"{filename}.docx"), log)
+        results.append((line_num, doc_path, error, time.perf_counter() - start))
+    return results
+
+
+def plan_records(template, data_path):
+    """读取全部记录并确定输出文件名，返回 ([(行号, 文件名, 记录)], [(行号, 错误)])
+
+    模板文件名不含字段时按序号区分；套用后文件名为空或与前面的记录重复的记录记为错误。
+    """
+    columns = read_columns(data_path)
+    if columns is not None:
+        template.check_fields(columns)
+    planned, errors, seen = [], [], set()
+    for index, (line_num, record) in enumerate(iter_records(data_path), 1):
+        try:
+            filename = template.filename.render(record, _filename_value)
+        except MergeFieldError as e:
+            errors.append((line_num, str(e))); continue
+        if not template.filename.fields:
+            filename = f"{filename}_{index:04d}"
+        if not filename:
+            errors.append((line_num, "套用后的文件名为空")); continue
+        if filename.lower() in seen:
+            errors.append((line_num, f"文件名与前面的记录重复: {filename}")); continue
+        seen.add(filename.lower())
+        planned.append((line_num, filename, record))
+    return planned, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用 CSV/JSONL 数据源批量套用含 {{字段}} 占位符的文档模板生成 Word 文档")
+    parser.add_argument("template", help="文档模板（.json/.yaml/.yml，格式同文档描述，只取第一个文档）")
+    parser.add_argument("data", help="数据源（.csv 首行为字段名，.jsonl 每行一个对象，.json 对象数组）")
+    parser.add_argument("-o", "--output-dir", default=".", help="输出目录（默认当前目录）")
+    parser.add_argument("--config", default="config.ini", help="读取 DEFAULT_UI_SETTINGS 作为基础样式的配置文件")
+    parser.add_argument("--style", help="JSON 格式的样式覆盖文件，字段名同 config.ini")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="并行进程数（默认每个 CPU 核心一个）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出每个文档的详细生成日志")
+    args = parser.parse_args(argv)
+
+    base_style = doc_spec.StyleSpec.from_config(args.config)
+    if args.style:
+        with open(args.style, 'r', encoding='utf-8') as f:
+            base_style = base_style.merged(json.load(f))
+
+    try:
+        template_dicts = doc_spec.load_spec_file(args.template)
+        if not template_dicts:
+            raise ValueError("模板文件中没有文档描述")
+        template = MergeTemplate(template_dicts[0], base_style)
+        planned, errors = plan_records(template, args.data)
+    except (OSError, ValueError, RuntimeError, csv.Error) as e:
+        print(f"读取模板或数据源失败: {e}", file=sys.stderr)
+        return 2
+    for line_num, error in errors:
+        print(f"跳过第 {line_num} 行: {error}", file=sys.stderr)
+    if not planned:
+        print("数据源中没有可生成的记录。", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    base_style_dict = base_style.to_dict()
+    workers = max(1, min(args.workers, len(planned)))
+    batch_size = max(1, min(RECORDS_PER_BATCH, -(-len(planned) // workers)))
+    batches = [planned[i:i + batch_size] for i in range(0, len(planned), batch_size)]
+    print(f"模板字段: {', '.join(template.fields) or '（无）'}")
+    print(f"共 {len(planned)} 份文档，使用 {workers} 个进程生成...")
+
+    start = time.perf_counter()
+    failures = len(errors)
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_batch, template_dicts[0], base_style_dict, batch, args.output_dir, args.verbose)
+                   for batch in batches]
+        for future in as_completed(futures):
+            for line_num, doc_path, error, elapsed in future.result():
+                done += 1
+                if error:
+                    failures += 1
+                    print(f"[{done}/{len(planned)}] 失败 第 {line_num} 行: {error}", file=sys.stderr)
+                else:
+                    print(f"[{done}/{len(planned)}] {doc_path} ({elapsed:.2f}s)")
+
+    print(f"完成: 成功 {len(planned) + len(errors) - failures}，失败 {failures}，总耗时 {time.perf_counter() - start:.2f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""文档生成基准测试：合成不同规模的章节列表，分阶段计时并记录峰值内存和输出大小
+
+用法示例:
+    python 31_bench_generation.py --sections 100 1000 10000 -o bench.json
+    python 31_bench_generation.py --sections 1000 --latin-ratio 0 0.5 --compare bench.json
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+import zipfile
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录进程内存峰值
+    resource = None
+
+import docx
+from docx import Document
+
+doc_spec = importlib.import_module("07_doc_spec")
+docx_engine = importlib.import_module("08_docx_engine")
+style_template_cache = importlib.import_module("10_style_template_cache")
+streaming_docx = importlib.import_module("21_streaming_docx")
+toc_builder = importlib.import_module("22_toc_builder")
+
+# 各阶段单独计时（每个阶段重复 repeat 次，取中位数），另做一遍 tracemalloc 记录各阶段的 Python 内存峰值
+# （开启 tracemalloc 会明显变慢，所以不与计时同时进行；lxml 元素树由 C 代码分配，不计入，
+# 因此每个用例结束时另外记录进程的常驻内存峰值）。结果写成 JSON，可用 --compare 与之前的结果对比。
+
+RESULTS_VERSION = 1
+DEFAULT_REGRESSION_THRESHOLD = 0.15 # 中位数变慢超过 15% 视为退化
+MIN_COMPARE_SECONDS = 0.005 # 太短的阶段受计时噪声影响大，不参与退化判断
+
+_CJK_TEXT = ("为进一步加强和规范各项工作现就有关事项通知如下各单位要高度重视认真组织落实按照统一部署"
+             "结合实际制定具体方案明确责任分工确保各项任务按期完成工作中遇到的问题请及时报告")
+_CJK_PUNCTUATION = "，。；、"
+_LATIN_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+class CorpusSpec:
+    """合成语料的参数：章节数、最大标题深度、每节段落数、每段字符数、拉丁字符比例"""
+
+    def __init__(self, sections, depth=3, paragraphs=3, paragraph_chars=120, latin_ratio=0.0, seed=0):
+        self.sections = sections
+        self.depth = depth
+        self.paragraphs = paragraphs
+        self.paragraph_chars = paragraph_chars
+        self.latin_ratio = latin_ratio
+        self.seed = seed
+
+    @property
+    def name(self):
+        return (f"s{self.sections}-d{self.depth}-p{self.paragraphs}x{self.paragraph_chars}"
+                f"-latin{int(round(self.latin_ratio * 100))}")
+
+    def to_dict(self):
+        return {"sections": self.sections, "depth": self.depth, "paragraphs": self.paragraphs,
+                "paragraph_chars": self.paragraph_chars, "latin_ratio": self.latin_ratio, "seed": self.seed}
+
+
+def _synthetic_text(rng, chars, latin_ratio):
+    """约 chars 个字符的文本；latin_ratio 为拉丁字符（英文单词和空格）所占比例"""
+    parts, length = [], 0
+    while length < chars:
+        if rng.random() < latin_ratio:
+            word = "".join(rng.choice(_LATIN_LETTERS) for _ in range(rng.randint(3, 9))) + " "
+        else:
+            start = rng.randrange(len(_CJK_TEXT) - 8)
+            word = _CJK_TEXT[start:start + rng.randint(2, 8)]
+            if rng.random() < 0.15:
+                word += rng.choice(_CJK_PUNCTUATION)
+        parts.append(word)
+        length += len(word)
+    return "".join(parts)[:chars].strip() + "。"
+
+
+def synthesize_sections(corpus):
+    """按语料参数生成章节列表（相同参数和 seed 生成的内容完全相同）
+
+    标题级别随机游走：下一个标题最多比上一个深一级，深度不超过 corpus.depth（超过 3 级的按正文样式写入）。
+    """
+    rng = random.Random(corpus.seed)
+    sections, level = [], 1
+    for i in range(corpus.sections):
+        level = rng.randint(1, min(level + 1, corpus.depth)) if i else 1
+        title = f"{i + 1}. " + _synthetic_text(rng, rng.randint(6, 20), corpus.latin_ratio).rstrip("。")
+        content = "\n\n".join(_synthetic_text(rng, corpus.paragraph_chars, corpus.latin_ratio) for _ in range(corpus.paragraphs))
+        sections.append({'level': level, 'title': title, 'content': content})
+    return sections
+
+
+def _paragraph_count(sections):
+    return sum(1 + sum(1 for part in section['content'].split("\n\n") if part.strip()) for section in sections)
+
+
+def _styled_document(style):
+    return docx_engine.new_styled_document(style, template_cache=style_template_cache.StyleTemplateCache())
+
+
+def phase_runners(spec, work_dir):
+    """返回 [(阶段名, setup, run)]：setup() 准备输入（不计时），run(prepared) 为被测部分
+
+    阶段对应生成流程中的各个函数；generate_document 和 DocxWriter.generate_document 为端到端耗时
+    （样式模板已缓存，与图形界面中连续生成文档的情况相同）。
+    """
+    style = spec.style
+    sections = spec.sections
+    doc_path = os.path.join(work_dir, "bench.docx")
+
+    def build_styles(_):
+        document = Document()
+        docx_engine.setup_page(document)
+        docx_engine.create_document_styles(document, style)
+
+    def write_content(document):
+        docx_engine.add_user_document_content(document, sections, toc=toc_builder.TocBuilder(style))
+
+    def render_toc(prepared):
+        toc, toc_paragraph = prepared
+        toc.render(toc_paragraph)
+
+    def prepare_toc():
+        document, toc_paragraph = docx_engine.build_document_head(spec)
+        toc = toc_builder.TocBuilder(style)
+        docx_engine.add_user_document_content(document, sections, toc=toc)
+        return toc, toc_paragraph
+
+    def streaming_save(prepared):
+        document, toc_paragraph = prepared
+        toc = toc_builder.TocBuilder(style)
+        streaming_docx.save_streaming(document, doc_path, lambda writer: docx_engine.write_user_document_content(writer, sections, toc=toc),
+                                      finalize=lambda d: toc.render(toc_paragraph))
+
+    def generate(_):
+        saved_path, error = docx_engine.generate_document(spec, doc_path)
+        if error:
+            raise RuntimeError(error)
+
+    def docx_writer_generate(prepared):
+        saved_path, error = prepared.generate_document(work_dir, "bench_writer", spec.document_title, spec.toc_title)
+        if error:
+            raise RuntimeError(error)
+
+    def prepare_docx_writer():
+        content_manager = importlib.import_module("04_content_manager").ContentManager()
+        content_manager.import_sections(sections)
+        return importlib.import_module("05_docx_writer").DocxWriter(style, content_manager, docx_engine._noop, docx_engine._noop)
+
+    return [
+        ("create_style", lambda: None, build_styles),
+        ("styled_template_clone", lambda: None, lambda _: docx_engine.new_styled_document(style)),
+        ("add_toc", lambda: _styled_document(style), lambda document: docx_engine.add_toc(document, spec.toc_title, style)),
+        ("add_user_document_content", lambda: _styled_document(style), write_content),
+        ("toc_render", prepare_toc, render_toc),
+        ("streaming_save", lambda: docx_engine.build_document_head(spec), streaming_save),
+        ("generate_document", lambda: None, generate),
+        ("DocxWriter.generate_document", prepare_docx_writer, docx_writer_generate),
+    ]
+
+
+def _time_phase(setup, run, repeat):
+    timings = []
+    for _ in range(repeat):
+        prepared = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(prepared)
+        timings.append(time.perf_counter() - start)
+        del prepared
+    return {"median": statistics.median(timings), "min": min(timings), "max": max(timings), "runs": timings}
+
+
+def _peak_memory(setup, run):
+    prepared = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(prepared)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _max_rss_bytes():
+    """进程至今的常驻内存峰值（字节）；不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Linux reports kilobytes, macOS bytes
+
+
+def run_case(corpus, repeat=3, measure_memory=True, phases=None, log=print):
+    """对一组语料参数运行全部（或 phases 指定的）阶段，返回结果字典"""
+    sections = synthesize_sections(corpus)
+    spec = doc_spec.DocumentSpec("bench", "基准测试文档", "目 录", sections, doc_spec.StyleSpec())
+    result = {"case": corpus.name, "corpus": corpus.to_dict(), "paragraphs": _paragraph_count(sections),
+              "characters": sum(len(s['title']) + len(s['content']) for s in sections), "phases": {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        docx_engine.new_styled_document(spec.style) # Warm the shared template cache, as in a running GUI session
+        for name, setup, run in phase_runners(spec, work_dir):
+            if phases and name not in phases:
+                continue
+            timing = _time_phase(setup, run, repeat)
+            if measure_memory:
+                timing["peak_memory_bytes"] = _peak_memory(setup, run)
+            result["phases"][name] = timing
+            log(f"  {name:<30} {timing['median'] * 1000:10.1f} ms"
+                + (f"  峰值内存 {timing['peak_memory_bytes'] / 1048576:8.1f} MB" if measure_memory else ""))
+        output_path = os.path.join(work_dir, "bench.docx")
+        if not os.path.exists(output_path):
+            docx_engine.generate_document(spec, output_path)
+        with zipfile.ZipFile(output_path) as archive:
+            result["document_xml_bytes"] = archive.getinfo(streaming_docx.DOCUMENT_PART).file_size
+        result["output_bytes"] = os.path.getsize(output_path)
+    result["max_rss_bytes"] = _max_rss_bytes() # Cumulative for the process: run large cases separately for per-case numbers
+    log(f"  输出 {result['output_bytes'] / 1024:.1f} KB（document.xml {result['document_xml_bytes'] / 1024:.1f} KB），"
+        f"{result['paragraphs']} 段")
+    return result
+
+
+def environment_info():
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "python_docx": getattr(docx, "__version__", "unknown"), "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(), "cpu_count": os.cpu_count()}
+
+
+def compare_results(baseline, current, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """按用例和阶段比较中位数耗时，返回 [(用例, 阶段, 基线秒数, 当前秒数, 变化比例)] 中变慢超过 threshold 的项"""
+    baseline_cases = {case["case"]: case for case in baseline.get("results", [])}
+    regressions = []
+    for case in current.get("results", []):
+        old_case = baseline_cases.get(case["case"])
+        if old_case is None:
+            continue
+        for phase, timing in case["phases"].items():
+            old = old_case["phases"].get(phase)
+            if old is None or max(old["median"], timing["median"]) < MIN_COMPARE_SECONDS:
+                continue
+            change = timing["median"] / old["median"] - 1 if old["median"] else 0.0
+            if change > threshold:
+                regressions.append((case["case"], phase, old["median"], timing["median"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="文档生成基准测试（合成语料，分阶段计时）")
+    parser.add_argument("--sections", nargs="+", type=int, default=[100, 1000], help="章节数（默认 100 1000）")
+    parser.add_argument("--depth", nargs="+", type=int, default=[3], help="标题最大深度（默认 3）")
+    parser.add_argument("--paragraphs", nargs="+", type=int, default=[3], help="每节正文段落数（默认 3）")
+    parser.add_argument("--paragraph-chars", nargs="+", type=int, default=[120], help="每段字符数（默认 120）")
+    parser.add_argument("--latin-ratio", nargs="+", type=float, default=[0.0], help="拉丁字符比例 0~1（默认 0，即全中文）")
+    parser.add_argument("--seed", type=int, default=0, help="合成语料的随机种子")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每个阶段重复次数，取中位数（默认 3）")
+    parser.add_argument("--phase", action="append", help="只运行指定阶段（可重复）")
+    parser.add_argument("--no-memory", action="store_true", help="不测量峰值内存")
+    parser.add_argument("-o", "--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比，变慢超过阈值时返回 1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="退化阈值（默认 0.15，即 15%%）")
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore") # DocxWriter looks styles up by id, which emits a deprecation warning per paragraph
+    cases = [CorpusSpec(sections, depth, paragraphs, chars, latin, args.seed)
+             for sections in args.sections for depth in args.depth for paragraphs in args.paragraphs
+             for chars in args.paragraph_chars for latin in args.latin_ratio]
+    results = {"version": RESULTS_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+               "environment": environment_info(), "repeat": args.repeat, "results": []}
+    for corpus in cases:
+        print(f"{corpus.name}:")
+        results["results"].append(run_case(corpus, args.repeat, not args.no_memory, args.phase))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        for case, phase, old, new, change in regressions:
+            print(f"变慢: {case} {phase} {old * 1000:.1f} ms -> {new * 1000:.1f} ms（{change:+.0%}）")
+        if regressions:
+            return 1
+        print(f"与 {args.compare} 相比没有超过 {args.threshold:.0%} 的退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 文档生成流程的分阶段计时：每个阶段（span）记录墙钟时间、CPU 时间和计数（段落、文字块、写入字节等），
+# 阶段可以嵌套。进度条按已完成的工作量推进：plan() 为顶层阶段预估工作量（单位约为写一个正文段落的耗时），
+# 阶段内部可用 advance() 报告进度，阶段结束时补足剩余的预估量。
+
+# 各阶段的预估工作量，按 31_bench_generation.py 的测量结果折算为“正文段落”单位
+TEMPLATE_UNITS = 700 # 页面设置、样式和页眉（未命中模板缓存）
+TEMPLATE_CACHED_UNITS = 175 # 从缓存的模板克隆（约为重新构建的四分之一）
+TEMPLATE_MAX_SHARE = 0.1 # 模板阶段内部没有进度，最多占总进度的 10%，进度主要随正文和保存推进
+HEAD_UNITS = 50 # 文档标题和目录域
+TOC_ENTRY_UNITS = 4 # 每个目录条目
+SAVE_BASE_UNITS = 300 # 序列化和压缩模板部件
+SAVE_PARAGRAPH_UNITS = 1.5 # 每个正文段落的压缩写入
+
+COUNT_LABELS = {"paragraphs": "段落", "runs": "文字块", "sections": "章节", "entries": "条目",
+                "bytes": "输出字节", "body_bytes": "正文 XML 字节", "styles": "样式", "cached": "缓存命中"}
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+class Span:
+    """一个计时阶段；counts 为该阶段的计数，units 为该阶段在进度中的预估工作量（未计划的阶段为 0）"""
+
+    def __init__(self, timer, name, parent=None, units=0):
+        self.timer = timer
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.units = units
+        self.done = 0
+        self.counts = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    @property
+    def path(self):
+        return f"{self.parent.path}/{self.name}" if self.parent is not None else self.name
+
+    def add(self, key, amount=1):
+        self.counts[key] = self.counts.get(key, 0) + amount
+
+    def advance(self, units):
+        """报告完成了 units 个工作量（由最近的有预估工作量的上层阶段计入进度）"""
+        self.timer._advance(self, units)
+
+    def to_dict(self):
+        return {"name": self.name, "path": self.path, "depth": self.depth, "wall_seconds": round(self.wall, 6),
+                "cpu_seconds": round(self.cpu, 6), "counts": dict(self.counts)}
+
+
+class PipelineTimer:
+    """记录嵌套的计时阶段并据此驱动进度回调（progress 接收 0~100 的整数，只在百分比增加时调用）
+
+    CPU 时间使用 time.thread_time()，只统计生成所在线程，图形界面线程的开销不计入。
+    """
+
+    def __init__(self, progress=_noop):
+        self.progress = progress
+        self.spans = []
+        self._stack = []
+        self._planned = {}
+        self._total_units = 0
+        self._done_units = 0
+        self._reported = -1
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._started_cpu = time.thread_time()
+
+    def plan(self, **units):
+        """为顶层阶段预估工作量，例如 plan(template=700, body=2000)"""
+        self._planned.update(units)
+        self._total_units = sum(self._planned.values())
+
+    @contextmanager
+    def span(self, name, **counts):
+        parent = self._stack[-1] if self._stack else None
+        span = Span(self, name, parent, self._planned.get(name, 0) if parent is None else 0)
+        span.counts.update(counts)
+        self.spans.append(span)
+        self._stack.append(span)
+        start_cpu = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.wall = time.perf_counter() - start
+            span.cpu = time.thread_time() - start_cpu
+            self._stack.pop()
+            if span.units > span.done:
+                self._advance(span, span.units - span.done)
+
+    def _advance(self, span, units):
+        while span is not None and not span.units:
+            span = span.parent
+        if span is None:
+            return
+        units = min(units, span.units - span.done)
+        if units <= 0:
+            return
+        with self._lock:
+            span.done += units
+            self._done_units += units
+            percent = int(self._done_units * 100 / self._total_units) if self._total_units else 0
+            if percent <= self._reported:
+                return
+            self._reported = percent
+        self.progress(percent)
+
+    def finish(self):
+        """所有阶段完成：进度补到 100"""
+        if self._reported < 100:
+            self._reported = 100
+            self.progress(100)
+
+    @property
+    def wall(self):
+        return time.perf_counter() - self._started
+
+    def to_dict(self, **extra):
+        data = {"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "wall_seconds": round(self.wall, 6),
+                "cpu_seconds": round(time.thread_time() - self._started_cpu, 6),
+                "spans": [span.to_dict() for span in self.spans]}
+        data.update(extra)
+        return data
+
+    def summary_lines(self, max_depth=2):
+        """适合写入执行日志的耗时汇总（每行一个阶段，嵌套阶段缩进；深于 max_depth 的阶段不列出）"""
+        lines = [f"耗时统计: 总计 {self.wall * 1000:.1f} ms，CPU {(time.thread_time() - self._started_cpu) * 1000:.1f} ms"]
+        for span in self.spans:
+            if span.depth > max_depth:
+                continue
+            counts = "，".join(f"{COUNT_LABELS.get(key, key)} {value}" for key, value in span.counts.items())
+            lines.append(f"  {'  ' * span.depth}{span.name:<{28 - 2 * span.depth}} {span.wall * 1000:9.1f} ms"
+                         f"  CPU {span.cpu * 1000:9.1f} ms" + (f"  ({counts})" if counts else ""))
+        return lines
+
+    def append_json(self, path, **extra):
+        """把本次计时作为一行 JSON 追加到 path（JSON Lines，便于多次生成的结果对比）"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.to_dict(**extra), ensure_ascii=False) + "\n")
+
+
+def expected_paragraphs(sections):
+    """估算章节写入的正文段落数（标题一段，正文每个非空行一段），用于预估进度"""
+    return sum(1 + sum(1 for line in (section.get('content') or "").splitlines() if line.strip()) for section in sections)
+
+
+def plan_generation(timer, sections, toc_levels=3, template_cached=False):
+    """按章节规模为 generate_document 的各阶段预估工作量；template_cached 为样式模板是否已缓存"""
+    paragraphs = expected_paragraphs(sections)
+    headings = sum(1 for section in sections if isinstance(section.get('level'), int) and 1 <= section['level'] <= toc_levels)
+    units = {"head": HEAD_UNITS, "body": paragraphs, "toc_entries": headings * TOC_ENTRY_UNITS,
+             "save": SAVE_BASE_UNITS + int(paragraphs * SAVE_PARAGRAPH_UNITS)}
+    rest = sum(units.values())
+    template = TEMPLATE_CACHED_UNITS if template_cached else TEMPLATE_UNITS
+    timer.plan(template=min(template, int(rest * TEMPLATE_MAX_SHARE / (1 - TEMPLATE_MAX_SHARE))), **units)